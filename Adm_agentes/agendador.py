@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Número de análises executadas ao mesmo tempo (vagas de modelo/CPU)
+CAPACIDADE = int(os.getenv("AGENDADOR_CAPACIDADE", "2"))
+
+# Trabalhos encerrados mantidos para o relatório (o monitor roda indefinidamente)
+CONCLUIDOS_MANTIDOS = int(os.getenv("AGENDADOR_CONCLUIDOS", "200"))
+
+# Classes de prioridade: menor valor = mais urgente
+PRIORIDADES = {"urgente": 0, "normal": 1, "baixa": 2}
+
+
+class Trabalho:
+    """Uma análise submetida ao agendador e as medições de fila e execução."""
+    def __init__(self, documentos: List[str], prioridade: str, solicitante: str, ordem: int):
+        if prioridade not in PRIORIDADES:
+            raise ValueError(f"Prioridade inválida: {prioridade} (use {', '.join(PRIORIDADES)})")
+        self.id = uuid.uuid4().hex[:8]
+        self.documentos = list(documentos)
+        self.prioridade = prioridade
+        self.solicitante = solicitante
+        self.ordem = ordem
+        self.status = "na fila"
+        self.enviado_em = time.monotonic()
+        self.tempo_fila = 0.0
+        self.tempo_execucao = 0.0
+        self.preempcoes = 0
+        self.contexto = None
+        self.tarefa: Optional[asyncio.Task] = None
+        self._liberado = asyncio.Event()
+        self._inicio_espera = self.enviado_em
+        self._inicio_fatia = None
+
+    @property
+    def nivel(self) -> int:
+        return PRIORIDADES[self.prioridade]
+
+    def relatorio(self) -> Dict[str, Any]:
+        return {
+            "trabalho": self.id,
+            "solicitante": self.solicitante,
+            "prioridade": self.prioridade,
+            "documentos": self.documentos,
+            "status": self.status,
+            "tempo_fila_segundos": round(self.tempo_fila, 3),
+            "tempo_execucao_segundos": round(self.tempo_execucao, 3),
+            "preempcoes": self.preempcoes,
+        }
+
+
+class AgendadorAnalises:
+    """
+    Executa várias análises ao mesmo tempo com `capacidade` vagas.
+
+    A próxima vaga vai para o trabalho da classe de prioridade mais urgente;
+    dentro da mesma classe, para o solicitante que menos tempo de vaga usou
+    até agora (fair share), e por fim por ordem de chegada. Um trabalho em
+    execução cede a vaga entre um agente e outro quando há na fila um
+    trabalho de prioridade mais alta e nenhuma vaga livre; ele volta para a
+    fila e retoma do agente seguinte.
+
+    `executar(documentos, agentes, antes_de_cada_agente)` é a função de
+    análise (executar_analise_documentos); cada trabalho usa um conjunto de
+    agentes emprestado do `pool` (agentes.pool.PoolAgentes) do início ao fim.
+    O conjunto é obtido antes da vaga: só trabalhos com conjunto entram na
+    fila de vagas, então um trabalho preemptado (que fica com o seu) nunca
+    espera por uma vaga ocupada por um trabalho que espera por um conjunto.
+    Para que um trabalho urgente possa preemptar com todas as vagas
+    ocupadas, o pool precisa de mais conjuntos que `capacidade`; com o pool
+    esgotado, ele espera a devolução de um conjunto.
+    """
+    def __init__(self, executar: Callable[..., Awaitable[Any]], pool, capacidade: int = CAPACIDADE):
+        if capacidade < 1:
+            raise ValueError("capacidade deve ser pelo menos 1")
+        self.executar = executar
+        self.pool = pool
+        if getattr(pool, "maximo", capacidade + 1) <= capacidade:
+            logger.warning("O pool tem %d conjuntos de agentes para %d vagas: com todas as vagas ocupadas, "
+                           "trabalhos urgentes esperam um conjunto ser devolvido em vez de preemptar",
+                           pool.maximo, capacidade)
+        self.capacidade = capacidade
+        self.fila: List[Trabalho] = []
+        self.em_execucao: List[Trabalho] = []
+        self.concluidos: deque = deque(maxlen=CONCLUIDOS_MANTIDOS)
+        self.uso_por_solicitante: Dict[str, float] = {}
+        self._contador = 0
+
+    def enviar(self, documentos: List[str], prioridade: str = "normal", solicitante: str = "padrao") -> Trabalho:
+        """Coloca uma análise na fila e retorna o trabalho; aguarde `trabalho.tarefa` pelo contexto final."""
+        self._contador += 1
+        trabalho = Trabalho(documentos, prioridade, solicitante, self._contador)
+        trabalho.tarefa = asyncio.create_task(self._executar(trabalho))
+        trabalho.tarefa.add_done_callback(lambda tarefa: self._ao_terminar(trabalho, tarefa))
+        logger.info("Trabalho %s enviado (%s, %s): %s", trabalho.id, prioridade, solicitante, trabalho.documentos)
+        return trabalho
+
+    def _ao_terminar(self, trabalho: Trabalho, tarefa: asyncio.Task):
+        """
+        Registra a falha de um trabalho que ninguém aguarda (modo monitor) e solta
+        a referência ao contexto da análise, com os logs e os resultados dela.
+        """
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            erro = tarefa.exception()
+            logger.error("Trabalho %s falhou: %s", trabalho.id, erro, exc_info=(type(erro), erro, erro.__traceback__))
+        trabalho.contexto = None
+
+    def _uso(self, solicitante: str) -> float:
+        """Tempo de vaga já usado pelo solicitante, incluindo as fatias em andamento."""
+        agora = time.monotonic()
+        return self.uso_por_solicitante.get(solicitante, 0.0) + sum(
+            agora - t._inicio_fatia for t in self.em_execucao if t.solicitante == solicitante
+        )
+
+    def _despachar(self):
+        """Entrega as vagas livres aos melhores trabalhos da fila."""
+        while self.fila and len(self.em_execucao) < self.capacidade:
+            proximo = min(self.fila, key=lambda t: (t.nivel, self._uso(t.solicitante), t.ordem))
+            self.fila.remove(proximo)
+            agora = time.monotonic()
+            proximo.tempo_fila += agora - proximo._inicio_espera
+            proximo._inicio_fatia = agora
+            proximo.status = "em execução"
+            self.em_execucao.append(proximo)
+            proximo._liberado.set()
+
+    async def _adquirir(self, trabalho: Trabalho):
+        trabalho._liberado.clear()
+        trabalho._inicio_espera = time.monotonic()
+        self.fila.append(trabalho)
+        self._despachar()
+        try:
+            await trabalho._liberado.wait()
+        except asyncio.CancelledError:
+            if trabalho in self.fila:
+                self.fila.remove(trabalho)
+            # A vaga pode ter sido concedida junto com o cancelamento
+            self._liberar(trabalho)
+            raise
+
+    def _liberar(self, trabalho: Trabalho):
+        if trabalho in self.em_execucao:
+            fatia = time.monotonic() - trabalho._inicio_fatia
+            trabalho.tempo_execucao += fatia
+            self.uso_por_solicitante[trabalho.solicitante] = self.uso_por_solicitante.get(trabalho.solicitante, 0.0) + fatia
+            self.em_execucao.remove(trabalho)
+        self._despachar()
+
+    def _deve_ceder(self, trabalho: Trabalho) -> bool:
+        return len(self.em_execucao) >= self.capacidade and any(t.nivel < trabalho.nivel for t in self.fila)
+
+    async def _ponto_de_preempcao(self, trabalho: Trabalho, contexto, agente: str):
+        """Chamado pela análise antes de cada agente."""
+        if trabalho.contexto is None:
+            trabalho.contexto = contexto
+            contexto.adicionar_log("Agendador", "fila",
+                                   f"Trabalho {trabalho.id} ({trabalho.prioridade}, {trabalho.solicitante}) "
+                                   f"aguardou {trabalho.tempo_fila:.1f}s na fila")
+        if not self._deve_ceder(trabalho):
+            return
+        trabalho.preempcoes += 1
+        trabalho.status = "preemptado"
+        contexto.adicionar_log("Agendador", "preempção",
+                               f"Trabalho {trabalho.id} cedeu a vaga antes de {agente} para um trabalho mais urgente")
+        self._liberar(trabalho)
+        await self._adquirir(trabalho)
+        contexto.adicionar_log("Agendador", "retomada", f"Trabalho {trabalho.id} retomado em {agente}")
+
+    async def _executar(self, trabalho: Trabalho):
+        agentes = await self.pool.adquirir()
+        try:
+            await self._adquirir(trabalho)
+        except BaseException:
+            await self.pool.devolver(agentes)
+            raise
+        # O tempo de fila conta desde o envio, incluindo a espera pelo conjunto de agentes
+        trabalho.tempo_fila = trabalho._inicio_fatia - trabalho.enviado_em
+        try:
+            async def antes_de_cada_agente(contexto, agente):
+                await self._ponto_de_preempcao(trabalho, contexto, agente)
+
+            trabalho.contexto = await self.executar(documentos=trabalho.documentos, agentes=agentes,
+                                                    antes_de_cada_agente=antes_de_cada_agente)
+            trabalho.status = "concluído"
+            return trabalho.contexto
+        except asyncio.CancelledError:
+            trabalho.status = "cancelado"
+            raise
+        except Exception:
+            trabalho.status = "falhou"
+            raise
+        finally:
+            await self.pool.devolver(agentes)
+            self._liberar(trabalho)
+            self.concluidos.append(trabalho)
+            logger.info("Trabalho %s %s: %s", trabalho.id, trabalho.status, trabalho.relatorio())
+
+    def relatorio(self) -> List[Dict[str, Any]]:
+        """Situação de todos os trabalhos, com o tempo de fila de cada um."""
+        return [t.relatorio() for t in self.em_execucao + self.fila + list(self.concluidos)]
+
+
+def prioridade_do_lote(documentos: List[str]) -> str:
+    """Lotes com algum documento com "urgente" no nome passam na frente dos demais."""
+    return "urgente" if any("urgente" in doc.lower() for doc in documentos) else "normal"
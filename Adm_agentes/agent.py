@@ -4,6 +4,9 @@ from dotenv import load_dotenv
 import logging
 import asyncio
 import json
+import time
+import argparse
+import atexit
 
 # Importa as classes dos agentes
 from agentes.contradicao import AgenteContradicao
@@ -12,72 +15,245 @@ from agentes.ambiguidade import AgenteAmbiguidade
 from agentes.adm import AgenteAdm
 
 # Importa apenas as ferramentas que o orquestrador realmente usa
-from tools.ferramentas import list_pdfs
+from tools.ferramentas import list_documentos, selecionar_documentos, reter_documentos, liberar_documentos
 from agentes.base import ContextoAnalise
+from agentes.cache_contexto import obter_cache
+from agentes.pool import PoolAgentes, medir_sobrecarga
+from agentes.validacao import interpretar_json
+from tools.referencias import expandir_resultados
+from monitor import MonitorDocumentos
+from repositorio import obter_repositorio
+from agendador import AgendadorAnalises, prioridade_do_lote, CAPACIDADE
+import tools.perfil as perfil
+import agentes.prompts as prompts
 
 load_dotenv()
 Path("logs").mkdir(exist_ok=True)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 logger = logging.getLogger("FluxoAgentes")
 
-async def executar_analise_documentos():
+# Prazo (em segundos) de uma execução completa do fluxo; 0 desativa o limite.
+PRAZO_EXECUCAO = float(os.getenv("PRAZO_EXECUCAO", "3600"))
+
+def criar_agentes() -> list:
+    """Instancia os agentes na ordem em que devem ser executados."""
+    return [
+        AgenteContradicao(),
+        AgenteOrtografia(),
+        AgenteAmbiguidade(),
+        AgenteAdm()
+    ]
+
+# Conjuntos de agentes (e runners) reaproveitados entre as análises
+POOL_AGENTES = PoolAgentes(criar_agentes)
+
+async def executar_analise_documentos(documentos: list = None, agentes: list = None, prazo_execucao: float = None,
+                                      antes_de_cada_agente=None):
     """
     Orquestra a execução sequencial dos agentes. A lógica de processamento
     de documentos agora é delegada para a ferramenta 'obter_dados_processados'
     que será chamada pelo primeiro agente.
+
+    Args:
+        documentos (list): Documentos a analisar. Se None, analisa todos os documentos de BASE_PATH.
+        agentes (list): Agentes já instanciados, para reaproveitá-los entre execuções.
+        prazo_execucao (float): Tempo máximo da execução inteira (padrão PRAZO_EXECUCAO).
+        antes_de_cada_agente: Corrotina opcional chamada com (contexto, nome do agente) antes de
+            cada agente; o agendador a usa para ceder a vaga. O tempo gasto nela não conta no prazo.
     """
-    contexto = ContextoAnalise()
+    contexto = ContextoAnalise(repositorio=obter_repositorio())
+    prazo_execucao = PRAZO_EXECUCAO if prazo_execucao is None else prazo_execucao
+    limite = time.monotonic() + prazo_execucao if prazo_execucao else None
     
     # Etapa 1: Apenas verificar se há documentos.
     try:
-        documentos = list_pdfs()
+        with perfil.etapa("list_documentos"):
+            documentos = list(documentos) if documentos is not None else list_documentos()
         if not documentos:
-            raise FileNotFoundError("Nenhum PDF encontrado para análise.")
+            raise FileNotFoundError("Nenhum documento encontrado para análise.")
         
         contexto.documentos = documentos
+        contexto.abrir_execucao(documentos)
+        # As ferramentas dos agentes passam a enxergar apenas estes documentos
+        selecionar_documentos(documentos)
+        reter_documentos(documentos)
         contexto.adicionar_log("Sistema", "Verificação Inicial", f"{len(documentos)} documentos encontrados: {documentos}")
         
     except Exception as e:
+        contexto.status = "falhou"
+        if contexto.execucao_id is None:
+            # A falha também fica registrada no repositório, em uma execução sem documentos
+            try:
+                contexto.abrir_execucao(documentos or [])
+            except Exception as erro_repositorio:
+                logger.warning(f"Não foi possível abrir a execução no repositório: {erro_repositorio}")
         contexto.adicionar_log("Sistema", "Erro Fatal na Preparação", f"Falha ao verificar documentos: {e}")
         # Salvar logs e sair se não houver documentos
         await salvar_arquivos_finais(contexto)
         return contexto
 
-    # Etapa 2: Instanciar e executar agentes em sequência.
+    # Etapa 2: Executar os agentes em sequência.
     # O primeiro agente (Contradicao) será responsável por invocar 'obter_dados_processados'.
-    agentes_para_executar = [
-        AgenteContradicao(),
-        AgenteOrtografia(),
-        AgenteAmbiguidade(),
-        AgenteAdm()
-    ]
+    # Sem agentes informados, um conjunto já construído é emprestado do pool.
+    emprestados = agentes is None
+    if emprestados:
+        inicio = time.monotonic()
+        agentes = await POOL_AGENTES.adquirir()
+        contexto.adicionar_log("Sistema", "agentes", f"Conjunto de agentes obtido do pool em {1000 * (time.monotonic() - inicio):.1f}ms")
+
+    try:
+        for agente_obj in agentes:
+            if antes_de_cada_agente is not None:
+                pausa = time.monotonic()
+                await antes_de_cada_agente(contexto, agente_obj.nome)
+                if limite is not None:
+                    limite += time.monotonic() - pausa
+            restante = limite - time.monotonic() if limite is not None else None
+            if restante is not None and restante <= 0:
+                contexto.registrar_timeout("Sistema", "execucao", prazo_execucao)
+                contexto.status = "tempo esgotado"
+                contexto.adicionar_log(agente_obj.nome, "Erro Fatal", "Prazo da execução esgotado antes do agente iniciar")
+                break
+            try:
+                # A lógica de retentativa está dentro do método executar do agente.
+                # O prazo restante da execução cancela o agente, inclusive durante as retentativas.
+                await asyncio.wait_for(agente_obj.executar(contexto), timeout=restante)
+            except asyncio.TimeoutError:
+                contexto.registrar_timeout("Sistema", "execucao", prazo_execucao)
+                contexto.status = "tempo esgotado"
+                contexto.adicionar_log(agente_obj.nome, "Erro Fatal", "Agente cancelado: prazo da execução esgotado")
+                break
+            except Exception as e:
+                contexto.status = "falhou"
+                contexto.adicionar_log(agente_obj.nome, "Erro Fatal", f"Agente falhou após todas as tentativas: {e}")
+                break # Interrompe o fluxo principal
+    finally:
+        if emprestados:
+            await POOL_AGENTES.devolver(agentes)
+        # Os prefixos de cache desta análise não servem às próximas (que trazem outro
+        # corpus); os que outra análise em andamento ainda usa ficam registrados
+        cache = obter_cache()
+        if cache is not None:
+            await cache.liberar(contexto.id_eventos)
 
-    for agente_obj in agentes_para_executar:
-        try:
-            # A lógica de retentativa está dentro do método executar do agente.
-            await agente_obj.executar(contexto)
-        except Exception as e:
-            contexto.adicionar_log(agente_obj.nome, "Erro Fatal", f"Agente falhou após todas as tentativas: {e}")
-            break # Interrompe o fluxo principal
-    
     # Etapa 3: Salvar logs e resultados finais.
-    await salvar_arquivos_finais(contexto)
+    try:
+        with perfil.etapa("salvar_arquivos_finais"):
+            await salvar_arquivos_finais(contexto)
+    finally:
+        # Os resultados já foram expandidos: os índices em memória destes documentos
+        # podem ser descartados se nenhuma outra análise em andamento os usa
+        await asyncio.to_thread(liberar_documentos, documentos)
+    selecionar_documentos(None)
 
     return contexto
 
+async def monitorar_documentos(intervalo: float = None, espera: float = None, processar_existentes: bool = False,
+                              concorrencia: int = None):
+    """
+    Mantém o processo ativo observando a pasta de documentos. Cada lote de documentos
+    novos ou modificados vira um trabalho no agendador, sem reprocessar o restante
+    da pasta; até `concorrencia` lotes são analisados ao mesmo tempo e lotes com
+    documentos "urgente" passam na frente.
+    """
+    parametros = {"processar_existentes": processar_existentes}
+    if intervalo is not None:
+        parametros["intervalo"] = intervalo
+    if espera is not None:
+        parametros["espera"] = espera
+    monitor = MonitorDocumentos(**parametros)
+
+    # Cada lote usa um conjunto de agentes do pool, reaproveitado pelos lotes seguintes
+    agendador = AgendadorAnalises(executar_analise_documentos, POOL_AGENTES,
+                                  capacidade=concorrencia or CAPACIDADE)
+
+    async def analisar_lote(lote):
+        agendador.enviar(lote, prioridade=prioridade_do_lote(lote), solicitante="monitor")
+
+    await monitor.monitorar(analisar_lote)
+
 async def salvar_arquivos_finais(contexto: ContextoAnalise):
-    """Função auxiliar para salvar os logs e resultados."""
+    """
+    Fecha a execução no repositório e exporta os arquivos JSON de sempre.
+    Logs e resultados já foram gravados no banco durante a execução; sem
+    execução aberta (falha na preparação), os arquivos saem do próprio contexto.
+    """
     try:
+        if contexto.repositorio is not None and contexto.execucao_id is not None:
+            if contexto.status == "iniciado":
+                contexto.status = "concluido"
+            contexto.repositorio.finalizar_execucao(contexto.execucao_id, contexto.status)
+            contexto.repositorio.exportar_json(contexto.execucao_id)
+            logger.info(f"Logs e resultados finais foram salvos (execução {contexto.execucao_id}).")
+            return
+        # Sem repositório, os logs estão no arquivo JSON Lines do gravador (o
+        # contexto só guarda os LOGS_EM_MEMORIA mais recentes)
+        if contexto.gravador is not None:
+            logs = contexto.gravador.eventos(contexto.id_eventos)
+        else:
+            logs = list(contexto.logs)
         with open("logs/execucao_analise.json", "w", encoding="utf-8") as f:
-            json.dump(contexto.logs, f, ensure_ascii=False, indent=2)
+            json.dump(logs, f, ensure_ascii=False, indent=2)
+        # Os agentes respondem com referências (ID do parágrafo + intervalo);
+        # aqui elas são expandidas de volta para documento, localização e trecho.
+        resultados = {
+            agente: interpretar_json(resultado) or resultado
+            for agente, resultado in contexto.resultados.items()
+        }
         with open("resultados_analise_final.json", "w", encoding="utf-8") as f:
-            json.dump(contexto.resultados, f, ensure_ascii=False, indent=2)
+            json.dump(expandir_resultados(resultados), f, ensure_ascii=False, indent=2)
         logger.info("Logs e resultados finais foram salvos.")
     except Exception as e:
         logger.warning(f"Não foi possível salvar logs ou resultados: {e}")
 
 # Ponto de entrada
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Análise de resoluções com agentes ADK.")
+    parser.add_argument("--monitorar", action="store_true", help="Observa a pasta de documentos e analisa novos documentos em lotes.")
+    parser.add_argument("--intervalo", type=float, default=None, help="Intervalo entre varreduras da pasta (segundos).")
+    parser.add_argument("--espera", type=float, default=None, help="Tempo sem alterações antes de liberar um lote (segundos).")
+    parser.add_argument("--processar-existentes", action="store_true", help="No modo monitor, analisa também os documentos já presentes.")
+    parser.add_argument("--medir-sobrecarga", type=int, metavar="N", default=None, help="Mede a preparação por trabalho com e sem o pool de agentes (N trabalhos) e sai.")
+    parser.add_argument("--concorrencia", type=int, default=None, help="No modo monitor, quantos lotes são analisados ao mesmo tempo.")
+    parser.add_argument("--perfil", action="store_true", help="Amostra CPU e espera por etapa e grava flame graphs (formato folded) e o resumo em logs/.")
+    parser.add_argument("--prompts", action="store_true", help="Mostra os tokens da instrução compilada de cada agente e o orçamento, e sai.")
+    parser.add_argument("--perfil-intervalo", type=float, default=None, help="Intervalo entre amostras do perfil (segundos).")
+    args = parser.parse_args()
+
+    if args.perfil:
+        perfil.iniciar(args.perfil_intervalo)
+
+        def _salvar_perfil():
+            arquivos = perfil.parar()
+            if arquivos:
+                print(f"Perfil gravado: {arquivos['resumo']} (flame graphs: {arquivos['cpu']}, {arquivos['espera']})")
+
+        # Grava o perfil também quando o processo sai por SystemExit ou Ctrl+C (modo monitor)
+        atexit.register(_salvar_perfil)
+
+    if args.prompts:
+        # Criar os agentes compila as instruções e confere cada uma com o orçamento
+        try:
+            criar_agentes()
+        except prompts.OrcamentoPromptExcedido as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+        for item in prompts.relatorio():
+            print(f"{item['agente']:<20} {item['tokens']:>6} tokens ({item['contagem']}, {item['modelo']}), "
+                  f"orçamento {item['orcamento']}, seções: {', '.join(item['secoes'])}")
+        raise SystemExit(0)
+
+    if args.medir_sobrecarga:
+        print(json.dumps(asyncio.run(medir_sobrecarga(criar_agentes, args.medir_sobrecarga)), ensure_ascii=False, indent=2))
+        raise SystemExit(0)
+
+    if args.monitorar:
+        try:
+            asyncio.run(monitorar_documentos(args.intervalo, args.espera, args.processar_existentes, args.concorrencia))
+        except KeyboardInterrupt:
+            print("\nMonitoramento encerrado.")
+        raise SystemExit(0)
+
     contexto_final = asyncio.run(executar_analise_documentos())
     if "Erro Fatal" in str(contexto_final.logs[-1]):
          print("\n❌ Falha na execução do fluxo de análise.")
@@ -85,6 +261,14 @@ if __name__ == "__main__":
          print("\n✅ Análise concluída com sucesso.")
 
 # Definição do root_agent para compatibilidade com ADK
-# O AgenteAdm é o último e consolida tudo, sendo o candidato natural.
-agente_adm_final = AgenteAdm()
-root_agent = agente_adm_final.adk_agent
\ No newline at end of file
+# O AgenteAdm é o último e consolida tudo, sendo o candidato natural; ele vem
+# de um conjunto do pool, que fica aquecido para a primeira análise.
+# O conjunto só é construído no primeiro acesso a `root_agent`: com o método
+# spawn (Windows, macOS) cada processo de conversão reimporta este módulo, e
+# não deve construir agentes.
+def __getattr__(nome):
+    if nome == "root_agent":
+        global root_agent
+        root_agent = POOL_AGENTES.agente_raiz()
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
\ No newline at end of file
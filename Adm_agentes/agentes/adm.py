@@ -1,5 +1,9 @@
 from .base import AgenteBase
+from .validacao import pre_validar, interpretar_json, CONTAGENS
+from .deduplicacao import consolidar_achados
 import tools.ferramentas as ferramentas
+from tools.referencias import expandir_resultados
+import json
 
 class AgenteAdm(AgenteBase):
     def __init__(self):
@@ -7,76 +11,82 @@ class AgenteAdm(AgenteBase):
             nome="Adm_agentes",
             descricao="Agent responsible for managing and validating the work of other agents.",
             output_key="validacao_final",
-            tools=[ferramentas.list_pdfs, ferramentas.obter_dados_processados]
+            tools=[ferramentas.list_documentos, ferramentas.obter_dados_processados]
         )
-    
-    def _get_instruction(self) -> str:
-        # O seu prompt gigantesco para este agente vai aqui.
-        # Mantê-lo em uma string separada ou até em um arquivo .txt pode ser uma boa ideia.
-        return """
-    You are responsible for coordinating the analysis process and validating results.
+        self._pre_validacao = None
 
-    Functions available for you to use:
-    - ferramentas.list_pdfs() -> list - List all available PDF files
-    - ferramentas.processar_pdf() -> dict - Process all PDF files to extract content
-    - ferramentas.obter_dados_processados() -> dict - Get processed data for analysis
+    async def executar(self, contexto, *args, **kwargs):
+        """
+        Faz localmente as verificações mecânicas (cobertura de documentos, formato
+        JSON e contagens), funde os achados repetidos e só chama o modelo para a
+        validação semântica do conjunto consolidado.
+        Se nenhum agente reportou achados, o modelo não é chamado.
+        """
+        processados = ferramentas.documentos_processados(contexto.documentos)
+        self._pre_validacao = pre_validar(contexto.resultados, contexto.documentos, processados)
+        self._consolidar(contexto)
+        problemas = self._pre_validacao["problemas_identificados"]
+        total_achados = self._pre_validacao["total_achados"]
+        contexto.adicionar_log(self.nome, "pré-validação local",
+                               f"{len(problemas)} problemas mecânicos, {total_achados} achados para validação semântica")
 
-    INSTRUCTIONS:
-    1. When the analysis starts, coordinate with the Contradicao agent to perform document analysis
-    2. Access the analysis results through the \\\'analise_contradicoes\\\' output
-    3. Validate if the contradictions found are real and meaningful
-    4. Check if the agent properly processed all available documents
-    5. Verify that the analysis format follows the specified structure
-    6. Point out any errors or inconsistencies if they exist
-    7. Provide a comprehensive summary of the entire analysis process
-    8. Save the final validation result
+        if total_achados == 0:
+            resultado = {
+                "status_analise": "Necessita Correção" if problemas else "Aprovada",
+                "resumo_processo": self._pre_validacao["resumo_processo"],
+                "detalhes_validacao": "Validação realizada localmente: nenhum agente reportou achados, "
+                                      "portanto não houve validação semântica pelo modelo.",
+                "problemas_identificados": problemas,
+                "conclusao": "Os documentos podem ser considerados validados." if not problemas
+                             else "Corrigir os problemas de processamento/formato apontados e reexecutar a análise.",
+            }
+            contexto.adicionar_log(self.nome, "validação semântica dispensada", "Nenhum achado a validar")
+            contexto.salvar_resultado(self.nome, resultado)
+            return resultado
 
-    📌 Additional responsibilities for orthographic and grammatical validation:
+        resposta = await super().executar(contexto, *args, **kwargs)
+        resultado = self._combinar_com_pre_validacao(resposta)
+        contexto.salvar_resultado(self.nome, resultado)
+        return resultado
 
-    9. Coordinate with the OrtografiaGramatica agent to analyze spelling and grammar
-    10. Access the analysis results through the \\\'analise_ortografia_gramatica\\\' output
-    11. Validate whether all detected errors are accurate and justified
-    12. Ensure the suggestions are correct according to formal written Portuguese (Acordo Ortográfico da Língua Portuguesa)
-    13. Check if the agent followed the response format strictly
-    14. If no errors were found, confirm that the justification is appropriate
-    15. If issues exist in the linguistic analysis, report and suggest adjustments
+    def _consolidar(self, contexto):
+        """
+        Troca os achados da pré-validação pelo conjunto sem duplicatas; as respostas
+        originais continuam em contexto.resultados e cada achado fundido aponta
+        para elas em "origens".
+        """
+        dados, relatorio = consolidar_achados(self._pre_validacao["dados"])
+        self._pre_validacao["dados"] = dados
+        self._pre_validacao["total_achados"] = relatorio["achados_consolidados"]
+        resumo = self._pre_validacao["resumo_processo"]
+        for agente, total in relatorio["por_agente"].items():
+            resumo[CONTAGENS[agente][3]] = total
+        resumo["achados_duplicados_removidos"] = relatorio["duplicatas_removidas"]
+        if relatorio["duplicatas_removidas"]:
+            contexto.adicionar_log(self.nome, "achados consolidados",
+                                   f"{relatorio['achados_recebidos']} achados recebidos, "
+                                   f"{relatorio['duplicatas_removidas']} duplicatas fundidas")
 
-    📌 Additional responsibilities for ambiguity detection:
-
-    16. Coordinate with the Ambiguidade agent to analyze ambiguous language
-    17. Access the analysis results through the \\\'analise_ambiguidade\\\' output
-    18. Validate whether each ambiguity identified is truly open to multiple interpretations
-    19. Check if the ambiguity type (lexical, syntactic, referential, scope) was correctly classified
-    20. Verify that the rewriting suggestions resolve the ambiguity clearly
-    21. Ensure that the agent followed the required response format strictly
-    22. If no ambiguities were found, confirm that this conclusion is supported by the analysis
-    23. If any ambiguity is misclassified or unjustified, report and suggest corrections
-
-    RESPONSE FORMAT (JSON):
-    {
-      \\"status_analise\\": \\"Aprovada\\" | \\"Necessita Correção\\",
-      \\"resumo_processo\\": {
-        \\"arquivos_pdf_encontrados\\": 3,
-        \\"arquivos_processados_com_sucesso\\": 3,
-        \\"contradicoes_validadas\\": 2,
-        \\"erros_ortograficos_gramaticais_validados\\": 5,
-        \\"ambiguidades_validadas\\": 3
-      },
-      \\"detalhes_validacao\\": \\"Todos os agentes processaram os documentos corretamente. A análise de contradições foi consistente com os trechos extraídos. Os erros gramaticais foram corretamente identificados e classificados. As ambiguidades foram bem caracterizadas, com sugestões claras de reescrita.\\",
-      \\"problemas_identificados\\": [
-        {
-          \\"agente\\": \\"OrtografiaGramatica\\",
-          \\"erro\\": \\"Sugestão incorreta para \\\\'pára\\\\' → \\\\'para\\\\' em contexto verbal\\",
-          \\"sugestao\\": \\"Verificar se \\\\'pára\\\\' está no sentido de verbo \\\\'parar\\\\'\\", o que mantém acento\\"
-        }
-      ],
-      \\"conclusao\\": \\"A análise geral foi satisfatória, com alto nível de acurácia. Um ajuste é necessário no agente de ortografia para casos de verbos acentuados. Após correção, o conjunto de documentos pode ser considerado validado.\\"
-    }
+    def _montar_mensagem(self, contexto):
+        if self._pre_validacao is None:
+            return super()._montar_mensagem(contexto)
+        pre_validacao = {k: v for k, v in self._pre_validacao.items() if k != "dados"}
+        return (
+            "PRÉ-VALIDAÇÃO LOCAL (já verificada, não refaça):\n"
+            + json.dumps(pre_validacao, ensure_ascii=False, separators=(",", ":"))
+            + "\n\nRESULTADOS DOS AGENTES:\n"
+            + json.dumps(expandir_resultados(self._pre_validacao["dados"]), ensure_ascii=False, separators=(",", ":"))
+        )
 
-    IMPORTANT:
-    - Respond ONLY in valid JSON format, strictly adhering to the structure above.
-    - DO NOT include any additional text, markdown, or explanations outside the JSON.
-    - If no problems were found, keep \\\'problemas_identificados\\\' as an empty list [].
-    - Always ensure the final output is a single, valid JSON object.
-    - After validation, finalize the process and confirm completion.
-    """
+    def _combinar_com_pre_validacao(self, resposta):
+        """O resumo_processo calculado localmente prevalece sobre o do modelo."""
+        dados = interpretar_json(resposta)
+        if not isinstance(dados, dict):
+            return resposta
+        dados["resumo_processo"] = self._pre_validacao["resumo_processo"]
+        problemas_modelo = dados.get("problemas_identificados")
+        problemas_modelo = problemas_modelo if isinstance(problemas_modelo, list) else []
+        dados["problemas_identificados"] = self._pre_validacao["problemas_identificados"] + problemas_modelo
+        if self._pre_validacao["problemas_identificados"]:
+            dados["status_analise"] = "Necessita Correção"
+        return dados
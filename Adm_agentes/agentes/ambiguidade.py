@@ -1,88 +1,12 @@
-from .base import AgenteBase
+from .linguistico import AgenteLinguistico
 import tools.ferramentas as ferramentas
 
-class AgenteAmbiguidade(AgenteBase):
+class AgenteAmbiguidade(AgenteLinguistico):
     def __init__(self):
         super().__init__(
             nome="Ambiguidade",
             descricao="Agent responsible for analyzing ambiguities in resolutions.",
             output_key="analise_ambiguidade",
-            tools=[ferramentas.list_pdfs, ferramentas.obter_dados_processados]
+            tools=[ferramentas.list_documentos, ferramentas.obter_dados_processados,
+                   ferramentas.localizar_paragrafo, ferramentas.buscar_dispositivo]
         )
-
-    def _get_instruction(self) -> str:
-        # O seu prompt gigantesco para este agente vai aqui.
-        # Mantê-lo em uma string separada ou até em um arquivo .txt pode ser uma boa ideia.
-        return f"""
-    You are a specialist in identifying ambiguities in technical and legal documents.
-
-    Functions available for you to use:
-    - ferramentas.list_pdfs() -> list - List all available PDF files
-    - ferramentas.obter_dados_processados() -> dict - Get processed data for analysis
-
-    INSTRUCTIONS:
-
-    calm down, you don\\'t need to rush, you have all the time in the world to analyze the documents.
-
-    1. Use obter_dados_processados() to get all document content processed
-    2. Analyze the extracted text looking for ambiguous expressions that may cause interpretation issues
-
-    🔍 ANALYSIS METHODOLOGY:
-        1. Read the text carefully, sentence by sentence
-        2. Identify phrases or expressions that may have **more than one possible meaning**
-        3. Evaluate whether the ambiguity arises from:
-           - Lexical ambiguity (word with multiple meanings)
-           - Syntactic ambiguity (unclear sentence structure)
-           - Referential ambiguity (unclear pronoun or subject reference)
-           - Scope ambiguity (unclear which part of the sentence an element applies to)
-           - Implicit assumptions or missing information
-        4. Suggest how the sentence could be rewritten to eliminate ambiguity
-        5. Be precise and objective
-
-    📘 WHAT IS AN AMBIGUITY?
-
-    Ambiguity occurs when a sentence or phrase allows **two or more possible interpretations**, causing uncertainty or confusion. It is problematic in legal, technical, and regulatory documents because it can lead to **misinterpretations, legal loopholes, or conflicting understandings**.
-
-    🔁 Types of ambiguity:
-    - **Lexical ambiguity:** \\"banco\\" (could be a financial institution or a bench)
-    - **Syntactic ambiguity:** \\"O gerente demitiu o funcionário com problemas\\" → Who has the problems? The manager or the employee?
-    - **Referential ambiguity:** \\"Foi decidido que ele será o responsável.\\" → Who is \\"ele\\"?
-    - **Scope ambiguity:** \\"Todos os usuários não precisam preencher o formulário.\\" → Does it mean no user or only some?
-
-    ✅ Non-ambiguous example:
-    \\"O gerente demitiu o funcionário que causava problemas técnicos.\\"  
-    → Specific and clear.
-
-    🚫 Ambiguous example:
-    \\"O engenheiro relatou ao chefe que ele estava com dificuldades.\\"  
-    → \\"Ele\\" refers to who? The engineer or the boss?\\"
-
-    6. Focus only on **ambiguity of meaning**, not grammar or contradiction
-    7. If no ambiguity is found, clearly state that no ambiguous expressions were detected
-    8. Be objective and clear in your explanations
-    9. When finished, transfer your results to Adm_agentes for validation
-
-    RESPONSE FORMAT (JSON):
-    {{
-      \\"ambiguidade\\": true|false,
-      \\"documentos_analisados\\": [\\"arquivo1.pdf\\", \\"arquivo2.pdf\\"],
-      \\"numero_ambiguidades\\": 0|1|2|...,
-      \\"ambiguidades\\": [
-        {{
-          \\"documento\\": \\"resolucao_2025.pdf\\",
-          \\"localizacao\\": \\"Artigo 5, Parágrafo 2\\",
-          \\"trecho\\": \\"O responsável deverá entregar o relatório ao diretor com urgência.\\",
-          \\"tipo\\": \\"Referencial\\",
-          \\"explicacao\\": \\"Não está claro se \\\\'urgência\\\\' se aplica ao responsável ou ao diretor.\\",
-          \\"sugestao_reescrita\\": \\"O responsável deverá entregar com urgência o relatório ao diretor.\\"
-        }}
-      ],
-      \\"observacao\\": \\"Nenhuma ambiguidade foi identificada nos documentos analisados.\\" (apenas se ambiguidade == false)
-    }}
-
-    IMPORTANT:
-    - Respond ONLY in valid JSON format, strictly adhering to the structure above.
-    - DO NOT include any additional text, mark
-    (Content truncated due to size limit. Use line ranges to read in chunks)"""
-
-
@@ -1,26 +1,76 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+import os
 from google.adk.agents import Agent # ou LlmAgent, se preferir ser explícito
 import time
+import uuid
 import asyncio
 import logging
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional, Deque
 from datetime import datetime
 
+from .hedge import PoliticaHedge
+from .registro import obter_gravador
+from .pool import ExecutorADK
+from .modelos import RoteadorModelos
+from .cache_contexto import obter_cache, definir_documentos
+from .validacao import modelo_resposta, interpretar_resposta
+from .prompts import compilar_instrucao
+from tools.perfil import etapa
+from tools.ferramentas import tamanho_estimado
+
 logger = logging.getLogger("FluxoAgentes")
 
+# Prazo (em segundos) de cada tentativa de um agente; 0 desativa o limite.
+PRAZO_TENTATIVA_AGENTE = float(os.getenv("PRAZO_TENTATIVA_AGENTE", "600"))
+# Quantas entradas de log cada ContextoAnalise mantém em memória (as mais recentes)
+LOGS_EM_MEMORIA = int(os.getenv("LOGS_EM_MEMORIA", "1000"))
+# Passa o esquema de resposta de cada agente ao modelo como restrição de saída
+# estruturada (output_schema do ADK) e interpreta/repara o JSON localmente
+SAIDA_ESTRUTURADA = os.getenv("SAIDA_ESTRUTURADA", "1").lower() in ("1", "true", "sim")
+
+
+class TempoEsgotado(Exception):
+    """Lançada quando um agente esgota todas as tentativas por excesso de tempo."""
+
+
+class RespostaInvalida(Exception):
+    """Resposta do modelo sem JSON aproveitável mesmo após o reparo local."""
+
+# Trechos de mensagens de erro do Gemini que justificam nova tentativa (com o próximo modelo da cadeia)
+ERROS_RECUPERAVEIS = ("INTERNAL", "UNAVAILABLE", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "overloaded")
+
 class AgenteBase(ABC):
     """
     Superclasse abstrata para todos os agentes de análise de documentos.
     """
+    # Agentes que leem o texto dos documentos (e não só o que vem na mensagem)
+    # recebem o corpus no prefixo do cache de contexto
+    le_corpus = False
+
     def __init__(self, nome: str, descricao: str, output_key: str, tools: list, sub_agents: list = None):
         self.nome = nome
+        # Hedge de requisições lentas; desligado a menos que HEDGE_ATIVO esteja definido
+        self.politica_hedge = PoliticaHedge.do_agente(nome)
+        # Modelo de cada chamada escolhido pelo tamanho da entrada, com substitutos em caso de falha
+        self.roteador = RoteadorModelos.para(nome)
+        # Nomes das ferramentas, usados também na seção de ferramentas da instrução
+        self.ferramentas = [getattr(f, "name", None) or f.__name__ for f in tools]
         # A criação do agente permanece a mesma
         self.adk_agent = self._criar_agente_adk(nome, descricao, output_key, tools, sub_agents)
+        # Runner e serviço de sessões criados uma vez e reaproveitados em todas as chamadas
+        self.executor = ExecutorADK(self.adk_agent)
+        # Cópias do agente (e runners) para os demais modelos, criadas quando usadas
+        self.executores = {self.adk_agent.model: self.executor}
+        # Uso do cache de contexto nas chamadas da execução atual do agente
+        self._uso_cache: List[Dict[str, Any]] = []
 
-    @abstractmethod
     def _get_instruction(self) -> str:
-        """Método que cada subclasse implementa para fornecer seu prompt."""
-        pass
+        """
+        Instrução do agente, compilada do registro de prompts (agentes/prompts.py).
+        Falha com OrcamentoPromptExcedido se passar do orçamento de tokens do agente.
+        """
+        return compilar_instrucao(self.nome, self.ferramentas, self.roteador.modelo_inicial).texto
 
     def _criar_agente_adk(self, nome, descricao, output_key, tools, sub_agents) -> Agent:
         """Cria a instância do Agent do Google ADK."""
@@ -28,11 +78,13 @@ class AgenteBase(ABC):
         from google.adk.agents import LlmAgent 
         
         agent_params = {
-            "model": "gemini-2.5-flash",
+            "model": self.roteador.modelo_inicial,
             "name": nome,
             "description": descricao,
             "instruction": self._get_instruction(),
             "tools": tools,
+            # Aplica o cache de contexto (instrução + corpus) antes de cada chamada ao modelo
+            "before_model_callback": self._antes_do_modelo,
         }
         # A classe Agent genérica é usada para orquestração com sub_agents
         # A LlmAgent é para execução direta de prompt.
@@ -42,59 +94,193 @@ class AgenteBase(ABC):
             agent_params["output_key"] = output_key
             return Agent(**agent_params)
         else:
-            # Para agentes que executam um prompt, usamos LlmAgent
+            # Para agentes que executam um prompt, usamos LlmAgent.
+            # Com output_schema, o ADK restringe a resposta ao esquema: direto na
+            # configuração do modelo ou, quando o modelo não aceita esquema junto
+            # com ferramentas, pela ferramenta set_model_response.
+            esquema = modelo_resposta(nome) if SAIDA_ESTRUTURADA else None
+            if esquema is not None:
+                agent_params["output_schema"] = esquema
             return LlmAgent(**agent_params)
 
 
-    async def executar(self, contexto, max_retries=3, delay=5):
+    def _montar_mensagem(self, contexto):
+        """
+        Monta a entrada enviada ao agente ADK. Subclasses podem sobrescrever
+        para incluir dados pré-calculados localmente.
+        """
+        return contexto.documentos
+
+    def _tamanho_entrada(self, contexto, mensagem) -> int:
+        """
+        Tamanho usado no roteamento de modelo. Quando a mensagem é só a lista de
+        documentos, o agente lê o texto pelas ferramentas e o que pesa é o corpus,
+        ainda que os documentos não tenham sido processados (ver tamanho_estimado).
+        """
+        tamanho = len(mensagem) if isinstance(mensagem, str) else len(str(mensagem))
+        if mensagem is contexto.documentos:
+            tamanho = max(tamanho, tamanho_estimado(contexto.documentos))
+        return tamanho
+
+    async def _antes_do_modelo(self, callback_context, llm_request):
+        cache = obter_cache()
+        if cache is not None and self.le_corpus:
+            uso = await cache.preparar(llm_request)
+            if uso is not None:
+                self._uso_cache.append(uso)
+        return None
+
+    def _executor(self, modelo: str) -> ExecutorADK:
+        """Runner do agente configurado com `modelo`."""
+        if modelo not in self.executores:
+            self.executores[modelo] = ExecutorADK(self.adk_agent.clone(update={"model": modelo}))
+        return self.executores[modelo]
+
+    async def _executar_tentativa(self, contexto, mensagem, modelo: str):
+        """
+        Executa uma única chamada ao agente ADK e extrai o resultado final.
+        Retorna (resultado, duracao_em_segundos).
+        """
+        inicio = time.monotonic()
+        # ===============================================================
+        # O agente é invocado pelo Runner, em uma sessão própria desta chamada
+        with etapa(f"agente:{self.nome}:{modelo}"):
+            resultado_generator = self._executor(modelo).executar(mensagem, contexto.execucao_id)
+            resultado = []
+            try:
+                async for event in resultado_generator:
+                    resultado.append(event)
+            finally:
+                # Garante que o stream seja fechado também quando a tarefa é cancelada (ex.: hedge perdedor)
+                if hasattr(resultado_generator, "aclose"):
+                    await resultado_generator.aclose()
+        # O resultado final pode ser o último evento ou uma agregação de todos os eventos, dependendo da necessidade.
+        # Por enquanto, vamos salvar a lista de todos os eventos.
+        # Se você precisar de um resultado específico, como o texto final, precisará extraí-lo aqui.
+        # Exemplo: resultado_final = resultado[-1].content.parts[0].text if resultado and resultado[-1].content.parts else None
+        # ===============================================================
+
+        # Extrair o resultado final do último evento ou de uma agregação
+        final_result = None
+        if resultado:
+            # Supondo que o resultado relevante esteja no último evento e seja um Content com texto
+            # Adapte esta lógica conforme a estrutura real dos seus eventos
+            last_event = resultado[-1]
+            if hasattr(last_event, 'content') and hasattr(last_event.content, 'parts') and last_event.content.parts:
+                for part in last_event.content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        final_result = part.text
+                        break
+                    elif hasattr(part, 'function_response') and part.function_response:
+                        final_result = part.function_response
+                        break
+                    # Adicione outras condições para extrair o resultado conforme necessário
+
+        return final_result, time.monotonic() - inicio
+
+    async def _executar_com_hedge(self, contexto, mensagem, cadeia: List[str], indice: int):
+        """
+        Executa a chamada ao modelo aplicando a política de hedge, se houver.
+        Se a chamada principal passar do limiar de latência, dispara uma cópia
+        com o próximo modelo da cadeia e fica com a que terminar primeiro,
+        cancelando a outra. Retorna (resultado, modelo que respondeu).
+        """
+        modelo = cadeia[indice]
+        politica = self.politica_hedge
+        if politica is None:
+            resultado, _ = await self._executar_tentativa(contexto, mensagem, modelo)
+            return resultado, modelo
+
+        politica.registrar_requisicao()
+        inicio = time.monotonic()
+        principal = asyncio.create_task(self._executar_tentativa(contexto, mensagem, modelo))
+        tarefas = {principal: modelo}
+        pendentes = set(tarefas)
+        try:
+            limiar = politica.limiar(modelo)
+            if limiar is not None:
+                concluidas, _ = await asyncio.wait(pendentes, timeout=limiar)
+                if not concluidas and politica.pode_disparar():
+                    politica.registrar_hedge()
+                    substituto = cadeia[min(indice + 1, len(cadeia) - 1)]
+                    contexto.adicionar_log(self.nome, "hedge", f"Chamada passou de {limiar:.1f}s; disparando requisição duplicada com {substituto}")
+                    tarefa = asyncio.create_task(self._executar_tentativa(contexto, mensagem, substituto))
+                    tarefas[tarefa] = substituto
+                    pendentes.add(tarefa)
+
+            ultimo_erro = None
+            while pendentes:
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in concluidas:
+                    if tarefa.exception() is not None:
+                        ultimo_erro = tarefa.exception()
+                        continue
+                    resultado, duracao = tarefa.result()
+                    politica.registrar_latencia(tarefas[tarefa], duracao)
+                    if principal in pendentes:
+                        # A principal perdeu: entra no histórico com o tempo que já levou
+                        politica.registrar_latencia(modelo, time.monotonic() - inicio)
+                    return resultado, tarefas[tarefa]
+            raise ultimo_erro
+        finally:
+            # Cancela a requisição perdedora (ou todas, se a execução foi cancelada)
+            for tarefa in pendentes:
+                tarefa.cancel()
+            if pendentes:
+                await asyncio.gather(*pendentes, return_exceptions=True)
+
+    async def executar(self, contexto, max_retries=3, delay=5, prazo_tentativa=None):
         """
         Executa o agente com lógica de retentativas, usando a sintaxe de chamada correta.
+
+        Cada tentativa é limitada por `prazo_tentativa` segundos (padrão
+        PRAZO_TENTATIVA_AGENTE). Uma tentativa que estoura o prazo é cancelada,
+        fechando o stream do run_async, e conta como falha recuperável.
+
+        O modelo é escolhido pelo roteador conforme o tamanho da entrada (ver
+        _tamanho_entrada); cada falha recuperável passa para o próximo modelo da cadeia.
         """
+        prazo = PRAZO_TENTATIVA_AGENTE if prazo_tentativa is None else prazo_tentativa
+        definir_documentos(contexto.documentos, contexto.id_eventos)
+        mensagem = self._montar_mensagem(contexto)
+        tamanho = self._tamanho_entrada(contexto, mensagem)
+        cadeia, faixa = self.roteador.cadeia(tamanho)
+        contexto.adicionar_log(self.nome, "modelo", f"{cadeia[0]} para entrada de {tamanho} caracteres ({faixa}); substitutos: {cadeia[1:]}")
         retries = 0
         while retries < max_retries:
+            indice = min(retries, len(cadeia) - 1)
             try:
-                contexto.adicionar_log(self.nome, "iniciando", f"Tentativa {retries + 1}/{max_retries}")
-                
-                # ===============================================================
-                # AQUI ESTÁ A CORREÇÃO CRUCIAL
-                # Trocamos .run() por () para invocar o agente
-                resultado_generator = self.adk_agent.run_async(contexto.documentos)
-                resultado = []
-                async for event in resultado_generator:
-                    resultado.append(event)
-                # O resultado final pode ser o último evento ou uma agregação de todos os eventos, dependendo da necessidade.
-                # Por enquanto, vamos salvar a lista de todos os eventos.
-                # Se você precisar de um resultado específico, como o texto final, precisará extraí-lo aqui.
-                # Exemplo: resultado_final = resultado[-1].content.parts[0].text if resultado and resultado[-1].content.parts else None
-                # ===============================================================
-                
-                # Extrair o resultado final do último evento ou de uma agregação
-                final_result = None
-                if resultado:
-                    # Supondo que o resultado relevante esteja no último evento e seja um Content com texto
-                    # Adapte esta lógica conforme a estrutura real dos seus eventos
-                    last_event = resultado[-1]
-                    if hasattr(last_event, 'content') and hasattr(last_event.content, 'parts') and last_event.content.parts:
-                        for part in last_event.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                final_result = part.text
-                                break
-                            elif hasattr(part, 'function_response') and part.function_response:
-                                final_result = part.function_response
-                                break
-                            # Adicione outras condições para extrair o resultado conforme necessário
+                contexto.adicionar_log(self.nome, "iniciando", f"Tentativa {retries + 1}/{max_retries} com {cadeia[indice]}")
 
+                final_result, modelo = await asyncio.wait_for(self._executar_com_hedge(contexto, mensagem, cadeia, indice), timeout=prazo or None)
+
+                contexto.adicionar_log(self.nome, "modelo usado", modelo)
+                self._registrar_uso_cache(contexto)
+                final_result = self._interpretar_saida(contexto, final_result, ultima=retries >= max_retries - 1)
                 contexto.salvar_resultado(self.nome, final_result)
                 return final_result # Sucesso, retorna o resultado
 
+            except asyncio.TimeoutError:
+                retentar = retries < max_retries - 1
+                contexto.registrar_timeout(self.nome, "tentativa", prazo, tentativa=retries + 1, retentar=retentar)
+                if not retentar:
+                    raise TempoEsgotado(f"Agente {self.nome} excedeu o prazo de {prazo:g}s em {max_retries} tentativas.")
+                self._registrar_fallback(contexto, cadeia, indice)
+                await asyncio.sleep(delay)
+                retries += 1
+
             except Exception as e:
                 error_message = str(e)
-                contexto.adicionar_log(self.nome, "erro", f"Falha na execução: {error_message}")
+                contexto.adicionar_log(self.nome, "erro", f"Falha na execução com {cadeia[indice]}: {error_message}")
                 
-                # A lógica de retentativa continua a mesma
-                if "INTERNAL" in error_message and "500" in error_message and retries < max_retries - 1:
-                    contexto.adicionar_log(self.nome, "aviso", f"Erro interno (500). Tentando novamente em {delay}s...")
-                    time.sleep(delay)
+                # Erros do servidor (500, 503, 429...) e respostas sem JSON aproveitável
+                # são recuperáveis, de preferência com outro modelo
+                recuperavel = isinstance(e, RespostaInvalida) or any(trecho in error_message for trecho in ERROS_RECUPERAVEIS)
+                if recuperavel and retries < max_retries - 1:
+                    contexto.adicionar_log(self.nome, "aviso", f"Erro recuperável. Tentando novamente em {delay}s...")
+                    self._registrar_fallback(contexto, cadeia, indice)
+                    # asyncio.sleep não bloqueia o loop e pode ser cancelado pelo prazo da execução
+                    await asyncio.sleep(delay)
                     retries += 1
                 else:
                     # Se não for um erro recuperável, lança a exceção para o orquestrador
@@ -103,16 +289,84 @@ class AgenteBase(ABC):
         # Se o loop terminar, significa que todas as tentativas falharam
         raise Exception(f"Agente {self.nome} falhou após {max_retries} tentativas.")
 
+    def _interpretar_saida(self, contexto, resultado, ultima: bool = False):
+        """
+        Converte a resposta de agentes com esquema de saída em objeto, reparando
+        localmente o JSON malformado. Só uma resposta irreparável custa nova
+        tentativa; na última, o texto bruto é mantido para a pré-validação do
+        AgenteAdm apontar o problema.
+        """
+        if not SAIDA_ESTRUTURADA or modelo_resposta(self.nome) is None:
+            return resultado
+        # Resposta de ferramenta como último evento (ex.: set_model_response sem o evento final)
+        if hasattr(resultado, "response") and not isinstance(resultado, (str, dict)):
+            resultado = resultado.response
+        dados, reparos = interpretar_resposta(resultado)
+        if dados is not None:
+            if reparos:
+                contexto.adicionar_log(self.nome, "json reparado", ", ".join(reparos))
+            return dados
+        if ultima:
+            contexto.adicionar_log(self.nome, "aviso", "Resposta sem JSON válido mesmo após o reparo local; mantida como texto")
+            return resultado
+        raise RespostaInvalida(f"Resposta sem JSON válido ({', '.join(reparos) or 'nenhum objeto JSON encontrado'})")
+
+    def _registrar_uso_cache(self, contexto):
+        if not self._uso_cache:
+            return
+        criados = sum(1 for uso in self._uso_cache if uso["estado"] == "criado")
+        contexto.adicionar_log(self.nome, "cache de contexto",
+                               f"{len(self._uso_cache)} chamadas com prefixo em cache (~{self._uso_cache[-1]['tokens']} tokens), "
+                               f"{criados} registro(s) novo(s)")
+        self._uso_cache = []
+
+    def _registrar_fallback(self, contexto, cadeia: List[str], indice: int):
+        if indice + 1 < len(cadeia):
+            contexto.adicionar_log(self.nome, "fallback", f"{cadeia[indice]} → {cadeia[indice + 1]}")
+
 
 
 
 class ContextoAnalise:
-    """Armazena estado compartilhado entre agentes"""
-    def __init__(self):
+    """
+    Armazena estado compartilhado entre agentes.
+
+    Os logs têm um único destino durável: com um `repositorio` (ver
+    repositorio.RepositorioResultados), a fila de gravação do banco da
+    execução aberta por abrir_execucao, que também recebe os resultados, sem
+    esperar o SQLite no loop de eventos; sem repositório, o arquivo JSON Lines
+    do `gravador` (em segundo plano). Em memória ficam só os LOGS_EM_MEMORIA
+    mais recentes da execução.
+    """
+    def __init__(self, repositorio=None, gravador=None):
         self.documentos: List[str] = []
         self.resultados: Dict[str, Any] = {}
-        self.logs: List[Dict[str, Any]] = []
+        self.logs: Deque[Dict[str, Any]] = deque(maxlen=LOGS_EM_MEMORIA)
+        self.timeouts: List[Dict[str, Any]] = []
         self.status = "iniciado"
+        self.repositorio = repositorio
+        if gravador is None and repositorio is None:
+            gravador = obter_gravador()
+        self.gravador = gravador if repositorio is None else None
+        self.execucao_id: Optional[str] = None
+        # Identifica esta análise no arquivo do gravador e nos prefixos do cache de contexto
+        # (ambos compartilhados pelas análises)
+        self.id_eventos = uuid.uuid4().hex
+
+    def abrir_execucao(self, documentos: List[str]):
+        """Abre a execução no repositório e grava nela os logs registrados antes da abertura."""
+        self.execucao_id = self.repositorio.iniciar_execucao(documentos)
+        for log in list(self.logs):
+            self._persistir("registrar_log", log)
+
+    def _persistir(self, metodo: str, *args):
+        """Grava no repositório; uma falha de escrita não interrompe a análise."""
+        if self.repositorio is None or self.execucao_id is None:
+            return
+        try:
+            getattr(self.repositorio, metodo)(self.execucao_id, *args)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar no repositório de resultados: {e}")
     
     def adicionar_log(self, agente: str, acao: str, detalhes: str = ""):
         log = {
@@ -122,11 +376,33 @@ class ContextoAnalise:
             "detalhes": detalhes
         }
         self.logs.append(log)
-        logger.info(f"[{agente}] {acao} → {detalhes}")
+        if self.gravador is not None:
+            self.gravador.registrar({"execucao": self.id_eventos, **log})
+        else:
+            self._persistir("registrar_log", log)
+        logger.info("[%s] %s → %s", agente, acao, detalhes)
     
+    def registrar_timeout(self, agente: str, escopo: str, prazo: float, tentativa: int = None, retentar: bool = False):
+        """
+        Registra um prazo estourado. `escopo` indica o que expirou
+        ("tentativa" ou "execucao") e `retentar` se haverá nova tentativa.
+        """
+        registro = {
+            "timestamp": datetime.now().isoformat(),
+            "agente": agente,
+            "escopo": escopo,
+            "prazo_segundos": prazo,
+            "tentativa": tentativa,
+            "retentar": retentar
+        }
+        self.timeouts.append(registro)
+        sufixo = "; nova tentativa será feita" if retentar else "; sem novas tentativas"
+        self.adicionar_log(agente, "timeout", f"Prazo de {prazo:g}s excedido ({escopo}){sufixo}")
+
     def salvar_resultado(self, agente: str, resultado: Any):
         self.resultados[agente] = resultado
-        self.adicionar_log(agente, "análise concluída", f"Resultados armazenados")
+        self._persistir("registrar_resultado", agente, resultado)
+        self.adicionar_log(agente, "análise concluída", "Resultados armazenados")
     
     def obter_resultado(self, agente: str):
         return self.resultados.get(agente)
\ No newline at end of file
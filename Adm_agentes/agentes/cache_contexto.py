@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import contextvars
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from tools.referencias import paragrafos_dos_documentos, tabelas_dos_documentos
+
+logger = logging.getLogger("FluxoAgentes")
+
+# "gemini" usa o cache de contexto da API; "local" é o substituto sem provedor
+# (mesma interface, para desenvolvimento e testes); "desligado" desativa.
+MODO_CACHE = os.getenv("CACHE_CONTEXTO", "desligado").lower()
+CACHE_TTL = int(os.getenv("CACHE_CONTEXTO_TTL", "3600"))
+# Prefixos menores que isto não compensam (o Gemini 2.5 exige pelo menos 2048 tokens)
+CACHE_MIN_TOKENS = int(os.getenv("CACHE_CONTEXTO_MIN_TOKENS", "2048"))
+
+PREAMBULO_CORPUS = "Processed documents (same content as obter_dados_processados(); there is no need to call it):\n"
+
+# Documentos e execução da análise em andamento, definidos pelo agente antes de chamar o modelo
+_DOCUMENTOS = contextvars.ContextVar("documentos_cache_contexto", default=None)
+
+
+def definir_documentos(documentos: List[str], execucao: Optional[str] = None):
+    _DOCUMENTOS.set((list(documentos), execucao) if documentos else None)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira (4 caracteres por token), suficiente para o limite mínimo."""
+    return len(texto) // 4
+
+
+def corpus_dos_documentos(documentos: List[str]) -> str:
+    """Texto processado dos documentos (parágrafos e tabelas com IDs) em JSON compacto."""
+    por_documento = {doc: {"documento": doc, "paragrafos": [], "tabelas": []} for doc in documentos}
+    for paragrafo in paragrafos_dos_documentos(documentos):
+        por_documento[paragrafo["documento"]]["paragrafos"].append(
+            {"id": paragrafo["id"], "loc": paragrafo["localizacao"], "texto": paragrafo["texto"]})
+    for tabela in tabelas_dos_documentos(documentos):
+        por_documento[tabela["documento"]]["tabelas"].append(
+            {"id": tabela["id"], "loc": tabela["localizacao"], "texto": tabela["texto"]})
+    corpus = [d for d in por_documento.values() if d["paragrafos"] or d["tabelas"]]
+    return json.dumps(corpus, ensure_ascii=False, separators=(",", ":")) if corpus else ""
+
+
+def _texto_instrucao(config) -> str:
+    instrucao = getattr(config, "system_instruction", None)
+    if instrucao is None:
+        return ""
+    if isinstance(instrucao, str):
+        return instrucao
+    partes = getattr(instrucao, "parts", None) or []
+    return "".join(getattr(p, "text", "") or "" for p in partes)
+
+
+def _nomes_ferramentas(config) -> List[str]:
+    nomes = []
+    for ferramenta in getattr(config, "tools", None) or []:
+        for declaracao in getattr(ferramenta, "function_declarations", None) or []:
+            nomes.append(declaracao.name)
+    return sorted(nomes)
+
+
+class CacheContexto(ABC):
+    """
+    Registra uma única vez o prefixo comum das chamadas (instrução do agente,
+    ferramentas e corpus dos documentos) e o reaproveita nas chamadas
+    seguintes: retentativas, lotes de frases e execuções com os mesmos
+    documentos. O prefixo é identificado pelo hash de modelo, instrução,
+    ferramentas e corpus, e vale por `ttl` segundos ou até a última análise
+    que o usa terminar (`liberar`, chamado ao fim de cada análise com a
+    execução dela): análises concorrentes dos mesmos documentos compartilham
+    o prefixo sem que uma o remova no meio da outra.
+
+    `preparar` é chamado com o LlmRequest do ADK antes de cada chamada ao modelo
+    (before_model_callback) e o ajusta para usar o prefixo registrado. O corpus
+    e o hash dele são calculados uma vez por execução.
+    """
+    def __init__(self, ttl: int = CACHE_TTL, min_tokens: int = CACHE_MIN_TOKENS):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        # chave -> (identificador, validade, execuções que usam o prefixo)
+        self.registros: Dict[str, Tuple[str, float, set]] = {}
+        # execução -> (corpus, hash do corpus)
+        self._corpora: Dict[str, Tuple[str, str]] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _corpus(self, documentos: List[str], execucao: Optional[str]) -> Tuple[str, str]:
+        """Corpus dos documentos e seu hash, memorizados por execução."""
+        if execucao is not None and execucao in self._corpora:
+            return self._corpora[execucao]
+        corpus = corpus_dos_documentos(documentos)
+        memorizado = (corpus, hashlib.sha1(corpus.encode("utf-8")).hexdigest())
+        # Sem corpus os documentos ainda não foram processados: calcula de novo na próxima chamada
+        if execucao is not None and corpus:
+            self._corpora[execucao] = memorizado
+        return memorizado
+
+    @abstractmethod
+    async def _criar(self, modelo: str, config, corpus: str, chave: str) -> str:
+        """Registra o prefixo e retorna seu identificador."""
+
+    @abstractmethod
+    def _aplicar(self, llm_request, identificador: str, corpus: str):
+        """Faz a requisição usar o prefixo registrado."""
+
+    async def _remover(self, identificador: str):
+        pass
+
+    async def preparar(self, llm_request) -> Optional[Dict[str, Any]]:
+        """
+        Aplica o cache à requisição. Retorna {"estado": "criado"|"reutilizado",
+        "tokens": estimativa do prefixo} ou None quando a chamada segue sem cache.
+        """
+        analise = _DOCUMENTOS.get()
+        if analise is None or llm_request.config is None:
+            return None
+        documentos, execucao = analise
+        corpus, hash_corpus = self._corpus(documentos, execucao)
+        instrucao = _texto_instrucao(llm_request.config)
+        tokens = estimar_tokens(instrucao) + estimar_tokens(corpus)
+        if not corpus or tokens < self.min_tokens:
+            return None
+        modelo = llm_request.model or ""
+        chave = hashlib.sha1("\x00".join(
+            [modelo, instrucao, ",".join(_nomes_ferramentas(llm_request.config)), hash_corpus]
+        ).encode("utf-8")).hexdigest()[:20]
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            registro = self.registros.get(chave)
+            # Margem de um minuto para não usar um cache prestes a expirar
+            if registro is not None and registro[1] - 60 > time.monotonic():
+                estado = "reutilizado"
+            else:
+                try:
+                    identificador = await self._criar(modelo, llm_request.config, corpus, chave)
+                except Exception as e:
+                    logger.warning("Não foi possível criar o cache de contexto (%s): %s", modelo, e)
+                    return None
+                registro = (identificador, time.monotonic() + self.ttl, set())
+                self.registros[chave] = registro
+                estado = "criado"
+            if execucao is not None:
+                registro[2].add(execucao)
+        self._aplicar(llm_request, registro[0], corpus)
+        return {"estado": estado, "tokens": tokens}
+
+    async def liberar(self, execucao: Optional[str] = None):
+        """
+        Encerra o uso dos prefixos pela `execucao` e remove os que nenhuma outra
+        execução usa (sem execução informada, remove todos).
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._corpora.pop(execucao, None)
+            if execucao is None:
+                self._corpora.clear()
+            registros = {}
+            for chave, registro in list(self.registros.items()):
+                registro[2].discard(execucao)
+                if execucao is None or not registro[2]:
+                    registros[chave] = self.registros.pop(chave)
+        for identificador, _, _ in registros.values():
+            try:
+                await self._remover(identificador)
+            except Exception as e:
+                logger.warning("Não foi possível remover o cache de contexto %s: %s", identificador, e)
+
+
+class CacheLocal(CacheContexto):
+    """
+    Substituto local: nada é enviado ao provedor; o corpus é inserido no
+    início da conversa de cada requisição, como o cache faria do lado do
+    servidor. Serve para exercitar o fluxo e as métricas sem a API.
+    """
+    async def _criar(self, modelo, config, corpus, chave):
+        return f"local/{chave}"
+
+    def _aplicar(self, llm_request, identificador, corpus):
+        from google.genai import types
+
+        llm_request.contents.insert(0, types.Content(role="user", parts=[types.Part(text=PREAMBULO_CORPUS + corpus)]))
+
+
+class CacheGemini(CacheContexto):
+    """
+    Cache de contexto da API Gemini (client.caches). A instrução, as
+    ferramentas e o corpus ficam no cache; a requisição passa a enviar só
+    `cached_content` e a conversa própria da chamada.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cliente = None
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            from google import genai
+            self._cliente = genai.Client()
+        return self._cliente
+
+    async def _criar(self, modelo, config, corpus, chave):
+        from google.genai import types
+
+        cache = await self.cliente.aio.caches.create(
+            model=modelo,
+            config=types.CreateCachedContentConfig(
+                display_name=f"adm-agentes-{chave}",
+                system_instruction=config.system_instruction,
+                tools=config.tools or None,
+                tool_config=config.tool_config,
+                contents=[types.Content(role="user", parts=[types.Part(text=PREAMBULO_CORPUS + corpus)])],
+                ttl=f"{self.ttl}s",
+            ),
+        )
+        logger.info("Cache de contexto %s criado para %s", cache.name, modelo)
+        return cache.name
+
+    def _aplicar(self, llm_request, identificador, corpus):
+        # A API não aceita instrução nem ferramentas junto com cached_content;
+        # o ADK continua executando as ferramentas pelo tools_dict da requisição.
+        llm_request.config.cached_content = identificador
+        llm_request.config.system_instruction = None
+        llm_request.config.tools = None
+        llm_request.config.tool_config = None
+
+    async def _remover(self, identificador):
+        await self.cliente.aio.caches.delete(name=identificador)
+
+
+_CACHE: Optional[CacheContexto] = None
+
+
+def obter_cache() -> Optional[CacheContexto]:
+    """Cache do processo conforme CACHE_CONTEXTO, ou None se desligado."""
+    global _CACHE
+    if _CACHE is None and MODO_CACHE in ("gemini", "local"):
+        _CACHE = CacheGemini() if MODO_CACHE == "gemini" else CacheLocal()
+    return _CACHE
@@ -1,89 +1,63 @@
 from .base import AgenteBase
 import tools.ferramentas as ferramentas
+from tools.referencias import paragrafos_dos_documentos
+from tools.candidatos import gerar_candidatos
+import json
+import os
+
+# Triagem local de candidatos a contradição antes da chamada ao modelo:
+# - "desligado": o modelo analisa todo o texto, como antes
+# - "filtrar": o modelo recebe só os melhores candidatos; sem candidatos, faz a análise completa
+# - "pular": como "filtrar", mas sem candidatos o modelo não é chamado
+MODO_CANDIDATOS = os.getenv("CANDIDATOS_MODO", "filtrar")
+LIMITE_CANDIDATOS = int(os.getenv("CANDIDATOS_LIMITE", "20"))
 
 class AgenteContradicao(AgenteBase):
+    # Compara trechos de todo o texto, inclusive fora dos candidatos
+    le_corpus = True
+
     def __init__(self):
         super().__init__(
             nome="Contradicao",
             descricao="Agent responsible for analyzing contradictions in resolutions.",
             output_key="analise_contradicoes",
-            tools=[ferramentas.list_pdfs, ferramentas.obter_dados_processados]
+            tools=[ferramentas.list_documentos, ferramentas.obter_dados_processados,
+                   ferramentas.localizar_paragrafo, ferramentas.buscar_dispositivo,
+                   ferramentas.consultar_valores, ferramentas.obter_paragrafos]
         )
+        self._candidatos = None
 
-    def _get_instruction(self) -> str:
-        # O seu prompt gigantesco para este agente vai aqui.
-        # Mantê-lo em uma string separada ou até em um arquivo .txt pode ser uma boa ideia.
-        return f"""
-    You are a specialist in finding contradictions in documents.
-    
-    Functions available for you to use:
-    - ferramentas.list_pdfs() -> list - List all available PDF files
-    - ferramentas.obter_dados_processados() -> dict - Get processed data for analysis
-  
-    INSTRUCTIONS:
-
-    calm down, you don\\'t need to rush, you have all the time in the world to analyze the documents.
+    async def executar(self, contexto, *args, **kwargs):
+        self._candidatos = None
+        if MODO_CANDIDATOS == "desligado":
+            return await super().executar(contexto, *args, **kwargs)
 
-    1. Use obter_dados_processados() to get all document content processed
-    2. Analyze the extracted text looking for contradictions between resolutions
-        ANALYSIS METHODOLOGY:
-        1. Group texts by similar themes/subjects
-        2. Compare statements within each group
-        3. Identify conflicting statements
-        4. Check if the context is really comparable
-        5. Document contradictions found
-    
-    3. Contradictions can be within one document or across multiple documents
-    4. Check all resolutions between all processed documents
-    
-    5. What is a contradiction?
-        In the context of document analysis by AI models, a contradiction occurs when two or more documents (or resolutions) make directly opposing claims about the same subject or topic within a comparable context.
-        Key considerations for contradiction detection:
-        Contextual alignment is essential: The AI must evaluate the semantic context, not just perform keyword matching.
-        Topic consistency: Both statements must refer to the same topic or entity. Differences across unrelated subjects do not constitute a contradiction.
-        Temporal and conditional scope: Dates, conditions, and specific circumstances must also align. Contradictions only exist when both statements apply to the same time frame and scenario.
-        Example scenario for AI contradiction detection:
-        Document A: \\"The water tariff will increase in July 2025.\\"
-        Document B: \\"The water tariff will decrease in July 2025.\\"
-        → This represents a clear contradiction: same topic, same time frame, opposite claims.
-        Non-contradiction example (different topics):
-        Document A: \\"The water tariff will increase in July 2025.\\"
-        Document B: \\"Wastewater treatment charges will decrease in July 2025.\\"
-        → No contradiction: different topics.
+        # A extração fica em cache, então a chamada da ferramenta pelo modelo depois sai barata
+        await ferramentas.obter_dados_processados_cancelavel()
+        candidatos = gerar_candidatos(paragrafos_dos_documentos(contexto.documentos), limite=LIMITE_CANDIDATOS)
+        contexto.adicionar_log(self.nome, "triagem local", f"{len(candidatos)} candidatos a contradição")
 
-    6. Cite the specific excerpts from the documents where contradictions occur
-    7. Focus only on content contradictions, not grammar errors or formatting issues
-    8. If no contradictions are found, clearly state that no contradictions were detected
-    9. Be objective and clear in your responses
-    10. When activated, perform your analysis without waiting for additional instructions
-    11. Save your analysis results in the output for validation by Adm_agentes
-    12. When you finish your job, transfer to OrtografiaGramatica 
+        if candidatos:
+            self._candidatos = candidatos
+        elif MODO_CANDIDATOS == "pular":
+            resultado = {
+                "contradicao": False,
+                "documentos_analisados": list(contexto.documentos),
+                "numero_contradicoes": 0,
+                "contradicoes": [],
+                "observacao": "Nenhuma contradição foi encontrada: a triagem local não identificou "
+                              "pares de trechos candidatos, e o modelo não foi acionado."
+            }
+            contexto.adicionar_log(self.nome, "análise pelo modelo dispensada", "Nenhum candidato encontrado")
+            contexto.salvar_resultado(self.nome, resultado)
+            return resultado
+        return await super().executar(contexto, *args, **kwargs)
 
-    RESPONSE FORMAT (JSON):
-    {{
-      \\"contradicao\\": true|false,
-      \\"documentos_analisados\\": [\\"arquivo1.pdf\\", \\"arquivo2.pdf\\", ...],
-      \\"numero_contradicoes\\": 0|1|2|...,
-      \\"contradicoes\\": [
-        {{
-          \\"documento_1\\": \\"nome_do_documento_1.pdf\\",
-          \\"localizacao_1\\": \\"Seção 3, Parágrafo 2\\",
-          \\"trecho_1\\": \\"O valor será reduzido a partir de janeiro de 2025.\\",
-          \\"documento_2\\": \\"nome_do_documento_2.pdf\\",
-          \\"localizacao_2\\": \\"Cláusula 5, Item B\\",
-          \\"trecho_2\\": \\"O valor será aumentado a partir de janeiro de 2025.\\",
-          \\"explicacao\\": \\"Ambos os documentos tratam do mesmo valor e período, mas indicam direções opostas (redução vs aumento), caracterizando uma contradição direta.\\"
-        }}
-      ],
-      \\"observacao\\": \\"Nenhuma contradição foi encontrada entre os documentos analisados.\\" (apenas se contradicao == false)
-    }}
-
-    IMPORTANT:
-    - Respond ONLY in valid JSON format, strictly adhering to the structure above.
-    - DO NOT include any additional text, explanations, markdown, or formatting outside the JSON.
-    - When contradicao is false, include \\\'observacao\\\' explaining no contradictions were found.
-    - Always call obter_dados_processados() first to get the processed data
-    - Thoroughly analyze all available text content
-    - Save your complete analysis for validation by Adm_agentes
-    - After generating the JSON, transfer to OrtografiaGramatica
-    """
+    def _montar_mensagem(self, contexto):
+        if not self._candidatos:
+            return super()._montar_mensagem(contexto)
+        return (
+            f"DOCUMENTOS: {json.dumps(contexto.documentos, ensure_ascii=False)}\n"
+            "CANDIDATOS A CONTRADIÇÃO (triagem local, do mais ao menos provável):\n"
+            + json.dumps(self._candidatos, ensure_ascii=False, separators=(",", ":"))
+        )
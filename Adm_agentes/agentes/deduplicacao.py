@@ -0,0 +1,241 @@
+import os
+import re
+import random
+import hashlib
+import unicodedata
+from typing import Any, Dict, List, Tuple
+
+from tools.referencias import EXPANSOES, expandir_achado
+from tools.sentencas import obter_sentenca
+from .validacao import CONTAGENS
+
+# Similaridade de Jaccard (estimada pelo MinHash) a partir da qual dois achados
+# no mesmo local são considerados o mesmo achado
+DEDUP_LIMIAR = float(os.getenv("DEDUP_LIMIAR", "0.7"))
+# Funções de hash da assinatura MinHash e bandas do LSH (DEDUP_PERMUTACOES
+# precisa ser múltiplo de DEDUP_BANDAS). Com 64/16, pares com Jaccard 0,7 viram
+# candidatos em ~99% dos casos e pares com 0,3 em menos de 13%.
+DEDUP_PERMUTACOES = int(os.getenv("DEDUP_PERMUTACOES", "64"))
+DEDUP_BANDAS = int(os.getenv("DEDUP_BANDAS", "16"))
+# Tamanho dos shingles de caracteres; trechos menores viram um shingle só
+TAMANHO_SHINGLE = 4
+
+# Achados de agentes diferentes que podem ser o mesmo problema: (agente de
+# origem, agente que fica com o achado) -> padrão que o achado de origem precisa
+# conter para ser fundido. Um erro de ortografia comum dentro de uma frase
+# ambígua continua sendo um achado separado.
+FUSOES_ENTRE_AGENTES = {
+    ("OrtografiaGramatica", "Ambiguidade"): re.compile(r"ambigu|ambígu"),
+}
+
+# Campos (tipo, sugestão) que distinguem achados do mesmo agente no mesmo
+# trecho: quando o trecho cai no parágrafo inteiro, dois erros diferentes do
+# mesmo parágrafo têm o mesmo texto citado. Só são fundidos se o tipo for igual
+# e as sugestões passarem do limiar. Uma contradição já é identificada pelo par
+# de trechos.
+CAMPOS_IDENTIDADE = {
+    "OrtografiaGramatica": ("tipo_erro", "sugestao_correcao"),
+    "Ambiguidade": ("tipo", "sugestao_reescrita"),
+}
+
+_PRIMO = (1 << 61) - 1
+_sorteio = random.Random(20240917)
+_COEFICIENTES = [(_sorteio.randrange(1, _PRIMO), _sorteio.randrange(0, _PRIMO)) for _ in range(DEDUP_PERMUTACOES)]
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos, pontuação nem espaços repetidos."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", texto).split())
+
+
+def shingles(texto: str, tamanho: int = TAMANHO_SHINGLE) -> set:
+    texto = normalizar(texto)
+    if len(texto) <= tamanho:
+        return {texto}
+    return {texto[i:i + tamanho] for i in range(len(texto) - tamanho + 1)}
+
+
+def assinatura_minhash(conjunto: set) -> Tuple[int, ...]:
+    valores = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in conjunto]
+    return tuple(min((a * v + b) % _PRIMO for v in valores) for a, b in _COEFICIENTES)
+
+
+def similaridade(assinatura_1: Tuple[int, ...], assinatura_2: Tuple[int, ...]) -> float:
+    """Estimativa da similaridade de Jaccard entre os conjuntos de shingles."""
+    return sum(x == y for x, y in zip(assinatura_1, assinatura_2)) / len(assinatura_1)
+
+
+def _paragrafo_base(referencia_id: Any) -> str:
+    """Frases ("<parágrafo>-s<n>") são localizadas pelo parágrafo que as contém."""
+    sentenca = obter_sentenca(referencia_id) if isinstance(referencia_id, str) else None
+    return sentenca["paragrafo"] if sentenca is not None else str(referencia_id)
+
+
+def _local_e_texto(agente: str, achado: dict) -> Tuple[Any, str]:
+    """
+    Chave de local (parágrafo, ou o par de parágrafos de uma contradição, sem
+    ordem) e texto dos trechos citados, reconstituídos a partir dos IDs.
+    """
+    _, referencias = EXPANSOES[agente]
+    expandido = expandir_achado(achado, referencias)
+    locais, trechos = [], []
+    for sufixo, _, _, campo_trecho in referencias:
+        locais.append(_paragrafo_base(achado.get(f"paragrafo{sufixo}")))
+        # Sem o parágrafo indexado, o intervalo de caracteres faz as vezes do trecho
+        trechos.append(str(expandido.get(campo_trecho)
+                           or f"{achado.get(f'inicio{sufixo}')}:{achado.get(f'fim{sufixo}')}"))
+    # Uma contradição (A, B) repetida como (B, A) é o mesmo achado
+    ordem = sorted(range(len(locais)), key=lambda i: (locais[i], trechos[i]))
+    return tuple(locais[i] for i in ordem), " \x00 ".join(trechos[i] for i in ordem)
+
+
+def _descricao(achado: dict) -> str:
+    """Campos descritivos do achado (tipo, justificativa, explicação) em minúsculas."""
+    return " ".join(str(v).lower() for k, v in achado.items()
+                    if isinstance(v, str) and k in ("tipo_erro", "tipo", "justificativa", "explicacao"))
+
+
+def _identidade(agente: str, achado: dict) -> Tuple[str, Any]:
+    """Tipo normalizado e assinatura MinHash da sugestão do achado (ver CAMPOS_IDENTIDADE)."""
+    if agente not in CAMPOS_IDENTIDADE:
+        return "", None
+    campo_tipo, campo_sugestao = CAMPOS_IDENTIDADE[agente]
+    sugestao = normalizar(str(achado.get(campo_sugestao) or ""))
+    return normalizar(str(achado.get(campo_tipo) or "")), assinatura_minhash(shingles(sugestao)) if sugestao else None
+
+
+def _mesmo_achado(item_1: dict, item_2: dict, limiar: float) -> bool:
+    """Dois achados do mesmo agente com trechos semelhantes só se fundem se também tiverem o mesmo tipo e sugestão."""
+    tipo_1, sugestao_1 = item_1["identidade"]
+    tipo_2, sugestao_2 = item_2["identidade"]
+    if tipo_1 != tipo_2:
+        return False
+    if sugestao_1 is None or sugestao_2 is None:
+        return sugestao_1 is sugestao_2
+    return similaridade(sugestao_1, sugestao_2) >= limiar
+
+
+def _pode_fundir(origem: List[dict], destino: List[dict]) -> bool:
+    """
+    Um grupo de achados de outro agente só é fundido se todos os seus achados
+    descrevem o problema do agente de destino (ver FUSOES_ENTRE_AGENTES).
+    """
+    padrao = FUSOES_ENTRE_AGENTES.get((origem[0]["agente"], destino[0]["agente"]))
+    return padrao is not None and all(padrao.search(_descricao(item["achado"])) for item in origem)
+
+
+def consolidar_achados(dados: Dict[str, Any], limiar: float = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Funde achados repetidos das respostas já interpretadas dos agentes (retentativas,
+    lotes de frases e agentes que apontam o mesmo trecho).
+
+    Os achados são comparados só dentro do mesmo local (parágrafo ou par de
+    parágrafos): os trechos viram shingles de caracteres normalizados, o LSH
+    sobre as assinaturas MinHash propõe os pares candidatos e os que passam de
+    `limiar` são agrupados. Achados do mesmo agente precisam ainda ter o mesmo
+    tipo e sugestões semelhantes (ver CAMPOS_IDENTIDADE). Cada grupo fica com o primeiro achado (ou o do agente
+    de destino, em FUSOES_ENTRE_AGENTES), acrescido de "origens": a lista de
+    {"agente", "indice"} de todos os achados fundidos nele, com os índices das
+    respostas originais.
+
+    Returns:
+        (dados consolidados, relatório com achados recebidos, consolidados,
+        duplicatas removidas e o total por agente)
+    """
+    limiar = DEDUP_LIMIAR if limiar is None else limiar
+    itens: List[dict] = []
+    for agente, (campo_lista, _) in EXPANSOES.items():
+        resultado = dados.get(agente)
+        achados = resultado.get(campo_lista) if isinstance(resultado, dict) else None
+        if not isinstance(achados, list):
+            continue
+        for indice, achado in enumerate(achados):
+            if not isinstance(achado, dict):
+                continue
+            local, texto = _local_e_texto(agente, achado)
+            itens.append({"agente": agente, "indice": indice, "achado": achado, "local": local,
+                          "assinatura": assinatura_minhash(shingles(texto)),
+                          "identidade": _identidade(agente, achado)})
+
+    # Union-find sobre os pares candidatos do LSH
+    pai = list(range(len(itens)))
+
+    def raiz(i: int) -> int:
+        while pai[i] != i:
+            pai[i] = pai[pai[i]]
+            i = pai[i]
+        return i
+
+    linhas = max(1, DEDUP_PERMUTACOES // DEDUP_BANDAS)
+    baldes: Dict[tuple, List[int]] = {}
+    for n, item in enumerate(itens):
+        for banda in range(DEDUP_BANDAS):
+            fatia = item["assinatura"][banda * linhas:(banda + 1) * linhas]
+            baldes.setdefault((item["local"], banda, fatia), []).append(n)
+    pares = set()
+    for membros in baldes.values():
+        for posicao, i in enumerate(membros):
+            for j in membros[posicao + 1:]:
+                pares.add((i, j))
+    similares = [(i, j) for i, j in sorted(pares)
+                 if similaridade(itens[i]["assinatura"], itens[j]["assinatura"]) >= limiar]
+
+    # Primeiro as repetições do mesmo agente; depois os grupos de agentes
+    # diferentes, para que um achado não entre em outro agente por transitividade
+    for i, j in similares:
+        if itens[i]["agente"] == itens[j]["agente"] and _mesmo_achado(itens[i], itens[j], limiar):
+            pai[raiz(j)] = raiz(i)
+
+    def membros_de(r: int, agente: str) -> List[dict]:
+        return [item for n, item in enumerate(itens) if raiz(n) == r and item["agente"] == agente]
+
+    for i, j in similares:
+        ri, rj = raiz(i), raiz(j)
+        if ri == rj or itens[i]["agente"] == itens[j]["agente"]:
+            continue
+        # Grupos já fundidos são comparados só pelos achados do agente de cada lado
+        grupo_i, grupo_j = membros_de(ri, itens[i]["agente"]), membros_de(rj, itens[j]["agente"])
+        if _pode_fundir(grupo_i, grupo_j) or _pode_fundir(grupo_j, grupo_i):
+            pai[rj] = ri
+
+    grupos: Dict[int, List[int]] = {}
+    for n in range(len(itens)):
+        grupos.setdefault(raiz(n), []).append(n)
+
+    consolidados: Dict[str, List[Tuple[int, dict]]] = {agente: [] for agente in EXPANSOES}
+    for membros in grupos.values():
+        agentes_grupo = {itens[n]["agente"] for n in membros}
+        destinos = [d for (o, d) in FUSOES_ENTRE_AGENTES if o in agentes_grupo and d in agentes_grupo]
+        escolhido = next((n for n in membros if itens[n]["agente"] in destinos), membros[0])
+        achado = dict(itens[escolhido]["achado"])
+        if len(membros) > 1:
+            achado["origens"] = [{"agente": itens[n]["agente"], "indice": itens[n]["indice"]} for n in membros]
+        consolidados[itens[escolhido]["agente"]].append((itens[escolhido]["indice"], achado))
+
+    saida = dict(dados)
+    por_agente = {}
+    for agente, (campo_lista, _) in EXPANSOES.items():
+        resultado = dados.get(agente)
+        if not isinstance(resultado, dict) or not isinstance(resultado.get(campo_lista), list):
+            continue
+        campo_bool, campo_contagem, _, _ = CONTAGENS[agente]
+        achados = [a for _, a in sorted(consolidados[agente], key=lambda par: par[0])]
+        resultado = dict(resultado, **{campo_lista: achados})
+        if campo_contagem in resultado:
+            resultado[campo_contagem] = len(achados)
+        if campo_bool in resultado:
+            resultado[campo_bool] = bool(achados)
+        saida[agente] = resultado
+        por_agente[agente] = len(achados)
+
+    total = sum(por_agente.values())
+    relatorio = {
+        "achados_recebidos": len(itens),
+        "achados_consolidados": total,
+        "duplicatas_removidas": len(itens) - total,
+        "por_agente": por_agente,
+    }
+    return saida, relatorio
+
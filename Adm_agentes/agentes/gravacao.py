@@ -0,0 +1,91 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict
+
+logger = logging.getLogger("FluxoAgentes")
+
+# "gravar" salva os eventos de cada chamada ao modelo; "reproduzir" os devolve
+# sem chamar o modelo; vazio desativa.
+MODO_GRAVACAO = os.getenv("ADK_GRAVACAO_MODO", "").lower()
+PASTA_GRAVACOES = os.getenv("ADK_GRAVACAO_PASTA", os.path.join("logs", "gravacoes"))
+# Escala do tempo na reprodução: 1 = tempo original, 0.1 = dez vezes mais rápido, 0 = sem espera
+ESCALA_REPRODUCAO = float(os.getenv("ADK_REPRODUCAO_ESCALA", "1"))
+
+
+def chave_chamada(agente: str, texto: str) -> str:
+    """Identifica uma chamada pelo agente e pela mensagem enviada (determinística entre execuções)."""
+    return hashlib.sha1(f"{agente}\x00{texto}".encode("utf-8")).hexdigest()[:16]
+
+
+def caminho_gravacao(agente: str, texto: str, pasta: str = None) -> str:
+    return os.path.join(pasta or PASTA_GRAVACOES, f"{agente}-{chave_chamada(agente, texto)}.jsonl.gz")
+
+
+def _serializar(evento: Any) -> Dict[str, Any]:
+    if hasattr(evento, "model_dump"):
+        return evento.model_dump(mode="json", exclude_none=True, exclude_defaults=True)
+    return {"repr": repr(evento)}
+
+
+class GravacaoEventos:
+    """
+    Grava os eventos de uma chamada em JSON Lines compactado (gzip).
+
+    A primeira linha é o cabeçalho (agente, chave, data); cada linha seguinte
+    é {"t": segundos desde o início da chamada, "e": evento serializado}.
+    O arquivo só aparece com o nome final quando a chamada termina.
+    """
+    def __init__(self, agente: str, texto: str, pasta: str = None):
+        self.caminho = caminho_gravacao(agente, texto, pasta)
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        self._temporario = f"{self.caminho}.{os.getpid()}.{id(self)}.tmp"
+        self._arquivo = gzip.open(self._temporario, "wt", encoding="utf-8")
+        self._inicio = time.monotonic()
+        self._escrever({"agente": agente, "chave": chave_chamada(agente, texto),
+                        "criado_em": datetime.now().isoformat()})
+
+    def _escrever(self, linha: Dict[str, Any]):
+        self._arquivo.write(json.dumps(linha, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def registrar(self, evento: Any):
+        self._escrever({"t": round(time.monotonic() - self._inicio, 4), "e": _serializar(evento)})
+
+    def concluir(self, completa: bool):
+        """Fecha o arquivo; chamadas interrompidas (erro, prazo, hedge perdedor) são descartadas."""
+        self._arquivo.close()
+        if completa:
+            os.replace(self._temporario, self.caminho)
+        else:
+            os.remove(self._temporario)
+
+
+async def reproduzir(agente: str, texto: str, escala: float = None, pasta: str = None) -> AsyncIterator[Any]:
+    """
+    Devolve os eventos gravados para a mesma chamada, respeitando os intervalos
+    originais multiplicados por `escala` (padrão ADK_REPRODUCAO_ESCALA).
+
+    Raises:
+        FileNotFoundError: se não houver gravação para esta chamada.
+    """
+    from google.adk.events import Event
+
+    escala = ESCALA_REPRODUCAO if escala is None else escala
+    caminho = caminho_gravacao(agente, texto, pasta)
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Sem gravação para {agente} com esta mensagem ({os.path.basename(caminho)})")
+    inicio = time.monotonic()
+    with gzip.open(caminho, "rt", encoding="utf-8") as f:
+        next(f)  # cabeçalho
+        for linha in f:
+            registro = json.loads(linha)
+            if escala:
+                espera = registro["t"] * escala - (time.monotonic() - inicio)
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            yield Event.model_validate(registro["e"])
@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+# Uma política por nome de agente, compartilhada pelos conjuntos do pool de
+# agentes: o histórico de latências se acumula entre análises e instâncias
+_POLITICAS: Dict[str, "PoliticaHedge"] = {}
+_TRAVA_POLITICAS = threading.Lock()
+
+
+class PoliticaHedge:
+    """
+    Política de requisições duplicadas ("hedged requests") para um agente.
+
+    Guarda as latências recentes das chamadas, separadas por modelo, e, quando
+    uma chamada passa do percentil configurado para o seu modelo, autoriza o
+    disparo de uma segunda chamada com a mesma mensagem (o agente usa o
+    próximo modelo da cadeia). O orçamento `fracao_maxima` limita quantas
+    chamadas podem ser duplicadas em relação ao total, para que o hedge não
+    vire carga extra.
+    """
+    def __init__(self, percentil: float = 0.95, janela: int = 100, min_amostras: int = 20,
+                 fracao_maxima: float = 0.1):
+        if not 0 < percentil < 1:
+            raise ValueError("percentil deve estar entre 0 e 1")
+        if not 0 <= fracao_maxima <= 1:
+            raise ValueError("fracao_maxima deve estar entre 0 e 1")
+        self.percentil = percentil
+        self.min_amostras = min_amostras
+        self.fracao_maxima = fracao_maxima
+        self.janela = janela
+        self.latencias: Dict[str, deque] = {}
+        self.total_requisicoes = 0
+        self.total_hedges = 0
+
+    @classmethod
+    def do_ambiente(cls) -> Optional["PoliticaHedge"]:
+        """Cria a política a partir das variáveis HEDGE_*; retorna None se o hedge estiver desligado."""
+        if os.getenv("HEDGE_ATIVO", "0").lower() not in ("1", "true", "sim"):
+            return None
+        return cls(
+            percentil=float(os.getenv("HEDGE_PERCENTIL", "0.95")),
+            janela=int(os.getenv("HEDGE_JANELA", "100")),
+            min_amostras=int(os.getenv("HEDGE_MIN_AMOSTRAS", "20")),
+            fracao_maxima=float(os.getenv("HEDGE_FRACAO_MAXIMA", "0.1")),
+        )
+
+    @classmethod
+    def do_agente(cls, agente: str) -> Optional["PoliticaHedge"]:
+        """Política compartilhada pelas instâncias do agente `agente` (None com o hedge desligado)."""
+        with _TRAVA_POLITICAS:
+            if agente not in _POLITICAS:
+                _POLITICAS[agente] = cls.do_ambiente()
+            return _POLITICAS[agente]
+
+    def registrar_latencia(self, modelo: str, segundos: float):
+        """
+        Registra a duração de uma chamada ao `modelo`. A chamada principal que
+        perde para o hedge entra com o tempo até ser cancelada (um limite
+        inferior da latência real), para não sumir justamente a cauda lenta.
+        """
+        self.latencias.setdefault(modelo, deque(maxlen=self.janela)).append(segundos)
+
+    def registrar_requisicao(self):
+        self.total_requisicoes += 1
+
+    def limiar(self, modelo: str) -> Optional[float]:
+        """Latência (s) do `modelo` a partir da qual vale duplicar a chamada, ou None sem histórico suficiente."""
+        latencias = self.latencias.get(modelo, ())
+        if len(latencias) < self.min_amostras:
+            return None
+        ordenadas = sorted(latencias)
+        indice = min(len(ordenadas) - 1, int(self.percentil * len(ordenadas)))
+        return ordenadas[indice]
+
+    def pode_disparar(self) -> bool:
+        """Verifica se mais um hedge cabe no orçamento de tráfego duplicado."""
+        if self.total_requisicoes == 0:
+            return False
+        return (self.total_hedges + 1) / self.total_requisicoes <= self.fracao_maxima
+
+    def registrar_hedge(self):
+        self.total_hedges += 1
@@ -0,0 +1,82 @@
+from .base import AgenteBase
+from .validacao import CONTAGENS, interpretar_json
+import tools.ferramentas as ferramentas
+from tools.sentencas import sentencas_dos_documentos, filtrar_novas, achados_anteriores, marcar_analisadas, lotes
+from tools.referencias import texto_sentencas
+import json
+import os
+
+# Número máximo de frases enviadas ao modelo em cada chamada
+LOTE_SENTENCAS = int(os.getenv("LOTE_SENTENCAS", "150"))
+# Pula as frases que o agente já analisou em execuções anteriores, repetindo os
+# achados registrados para elas
+PULAR_SENTENCAS_ANALISADAS = os.getenv("PULAR_SENTENCAS_ANALISADAS", "1").lower() in ("1", "true", "sim")
+
+
+class AgenteLinguistico(AgenteBase):
+    """
+    Base dos agentes que leem o texto frase a frase (OrtografiaGramatica e Ambiguidade).
+
+    As frases vêm da segmentação feita uma única vez na extração; o agente as
+    recebe em lotes com IDs de frase e cada lote é uma chamada ao modelo. Os
+    resultados dos lotes são somados em uma única resposta, junto dos achados
+    já registrados para as frases inalteradas que não foram reenviadas.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lote_atual = None
+
+    async def executar(self, contexto, *args, **kwargs):
+        await ferramentas.obter_dados_processados_cancelavel()
+        sentencas = sentencas_dos_documentos(contexto.documentos)
+        total = len(sentencas)
+        anteriores = []
+        if PULAR_SENTENCAS_ANALISADAS:
+            novas = filtrar_novas(self.nome, sentencas)
+            ids_novas = {s["id"] for s in novas}
+            anteriores = achados_anteriores(self.nome, [s for s in sentencas if s["id"] not in ids_novas])
+            sentencas = novas
+        contexto.adicionar_log(self.nome, "frases",
+                               f"{len(sentencas)} de {total} frases a analisar ({total - len(sentencas)} inalteradas, "
+                               f"{len(anteriores)} achados anteriores mantidos)")
+
+        campo_bool, campo_contagem, campo_lista, _ = CONTAGENS[self.nome]
+        consolidado = {
+            campo_bool: False,
+            "documentos_analisados": list(contexto.documentos),
+            campo_contagem: 0,
+            campo_lista: list(anteriores),
+        }
+        for lote in lotes(sentencas, LOTE_SENTENCAS):
+            self._lote_atual = lote
+            try:
+                resposta = interpretar_json(await super().executar(contexto, *args, **kwargs))
+            finally:
+                self._lote_atual = None
+            achados = resposta.get(campo_lista) if isinstance(resposta, dict) else None
+            if not isinstance(achados, list):
+                contexto.adicionar_log(self.nome, "aviso", "Resposta do lote sem a lista de achados; lote não marcado como analisado")
+                continue
+            consolidado[campo_lista].extend(achados)
+            marcar_analisadas(self.nome, lote, achados)
+
+        consolidado[campo_contagem] = len(consolidado[campo_lista])
+        consolidado[campo_bool] = bool(consolidado[campo_lista])
+        if not consolidado[campo_lista]:
+            consolidado["observacao"] = (
+                "Nenhum problema foi encontrado nas frases analisadas."
+                if sentencas else "Nenhuma frase nova ou alterada desde a última análise."
+            )
+        contexto.salvar_resultado(self.nome, consolidado)
+        return consolidado
+
+    def _montar_mensagem(self, contexto):
+        if self._lote_atual is None:
+            return super()._montar_mensagem(contexto)
+        # Os textos das frases são lidos do armazém só para o lote enviado
+        frases = [{"id": s["id"], "texto": texto}
+                  for s, texto in zip(self._lote_atual, texto_sentencas(self._lote_atual))]
+        return (
+            f"DOCUMENTOS: {json.dumps(contexto.documentos, ensure_ascii=False)}\n"
+            "FRASES:\n" + json.dumps(frases, ensure_ascii=False, separators=(",", ":"))
+        )
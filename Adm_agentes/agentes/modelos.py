@@ -0,0 +1,75 @@
+import os
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("FluxoAgentes")
+
+MODELO_PADRAO = os.getenv("MODELO_PADRAO", "gemini-2.5-flash")
+
+# Rotas por agente: faixas (limite de caracteres da entrada, cadeia de modelos),
+# da menor para a maior; a última faixa (limite None) vale para qualquer tamanho.
+# O primeiro modelo da cadeia é o escolhido e os seguintes são os substitutos,
+# usados em ordem quando uma chamada falha ou demora além do limiar do hedge.
+ROTAS_PADRAO: Dict[str, List[Tuple[Optional[int], List[str]]]] = {
+    # Validação semântica sobre achados já pré-validados localmente
+    "Adm_agentes": [
+        (None, ["gemini-2.5-flash-lite", "gemini-2.5-flash"]),
+    ],
+    # Lotes de frases
+    "OrtografiaGramatica": [
+        (20000, ["gemini-2.5-flash-lite", "gemini-2.5-flash"]),
+        (None, ["gemini-2.5-flash", "gemini-2.5-flash-lite"]),
+    ],
+    "Ambiguidade": [
+        (20000, ["gemini-2.5-flash", "gemini-2.5-flash-lite"]),
+        (None, ["gemini-2.5-flash", "gemini-2.5-pro"]),
+    ],
+    # Comparação entre documentos: entradas grandes pedem o modelo maior
+    "Contradicao": [
+        (60000, ["gemini-2.5-flash", "gemini-2.5-pro"]),
+        (None, ["gemini-2.5-pro", "gemini-2.5-flash"]),
+    ],
+}
+
+
+def _carregar_rotas() -> Dict[str, List[Tuple[Optional[int], List[str]]]]:
+    """
+    Rotas padrão, sobrescritas por agente pela variável ROTAS_MODELOS (JSON), ex.:
+    {"Contradicao": [[60000, ["gemini-2.5-flash"]], [null, ["gemini-2.5-pro"]]]}
+    """
+    rotas = dict(ROTAS_PADRAO)
+    bruto = os.getenv("ROTAS_MODELOS")
+    if bruto:
+        try:
+            for agente, faixas in json.loads(bruto).items():
+                rotas[agente] = [(limite, list(cadeia)) for limite, cadeia in faixas]
+        except (ValueError, TypeError) as e:
+            logger.warning("ROTAS_MODELOS inválido, usando as rotas padrão: %s", e)
+    return rotas
+
+
+ROTAS = _carregar_rotas()
+
+
+class RoteadorModelos:
+    """Escolhe a cadeia de modelos de um agente pelo tamanho da entrada de cada chamada."""
+    def __init__(self, faixas: List[Tuple[Optional[int], List[str]]]):
+        self.faixas = faixas or [(None, [MODELO_PADRAO])]
+
+    @classmethod
+    def para(cls, agente: str) -> "RoteadorModelos":
+        return cls(ROTAS.get(agente))
+
+    @property
+    def modelo_inicial(self) -> str:
+        """Modelo da menor faixa; é o modelo com que o agente ADK é construído."""
+        return self.faixas[0][1][0]
+
+    def cadeia(self, tamanho: int) -> Tuple[List[str], str]:
+        """Retorna (cadeia de modelos, descrição da faixa) para uma entrada de `tamanho` caracteres."""
+        for limite, cadeia in self.faixas:
+            if limite is None or tamanho <= limite:
+                return cadeia, (f"até {limite} caracteres" if limite is not None else "sem limite")
+        limite, cadeia = self.faixas[-1]
+        return cadeia, f"acima de {limite} caracteres"
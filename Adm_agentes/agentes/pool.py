@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from . import gravacao
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Nome da aplicação nas sessões do ADK
+APP_NAME = os.getenv("ADK_APP_NAME", "Adm_agentes")
+# Máximo de conjuntos de agentes mantidos pelo pool (um por análise simultânea)
+POOL_MAXIMO = int(os.getenv("POOL_AGENTES_MAXIMO", "4"))
+
+
+class ExecutorADK:
+    """
+    Runner e serviço de sessões de um agente ADK, criados uma única vez.
+
+    Cada chamada abre uma sessão própria, identificada pela execução
+    (`sessao_prefixo`), e a remove ao final: chamadas de análises diferentes,
+    retentativas e requisições duplicadas do hedge nunca compartilham histórico.
+
+    Com ADK_GRAVACAO_MODO=gravar os eventos de cada chamada são salvos (ver
+    agentes.gravacao); com "reproduzir" eles são devolvidos da gravação, sem
+    sessão nem chamada ao modelo.
+    """
+    def __init__(self, adk_agent, usuario: str = "analise"):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+
+        self.nome = adk_agent.name
+        self.usuario = usuario
+        self.modo_gravacao = gravacao.MODO_GRAVACAO
+        self.sessoes = InMemorySessionService()
+        self.runner = Runner(app_name=APP_NAME, agent=adk_agent, session_service=self.sessoes)
+        self.chamadas = 0
+        self.tempo_sessoes = 0.0
+
+    @staticmethod
+    def _texto(mensagem: Any) -> str:
+        return mensagem if isinstance(mensagem, str) else json.dumps(mensagem, ensure_ascii=False)
+
+    async def executar(self, mensagem: Any, sessao_prefixo: Optional[str] = None) -> AsyncIterator[Any]:
+        """Envia a mensagem em uma sessão nova e repassa os eventos do runner."""
+        from google.genai import types
+
+        texto = self._texto(mensagem)
+        if self.modo_gravacao == "reproduzir":
+            async for evento in gravacao.reproduzir(self.nome, texto):
+                yield evento
+            return
+
+        inicio = time.monotonic()
+        sessao_id = f"{sessao_prefixo or 'avulsa'}-{uuid.uuid4().hex[:8]}"
+        await self.sessoes.create_session(app_name=APP_NAME, user_id=self.usuario, session_id=sessao_id)
+        self.tempo_sessoes += time.monotonic() - inicio
+        self.chamadas += 1
+        eventos = self.runner.run_async(user_id=self.usuario, session_id=sessao_id,
+                                        new_message=types.Content(role="user", parts=[types.Part(text=texto)]))
+        registro = gravacao.GravacaoEventos(self.nome, texto) if self.modo_gravacao == "gravar" else None
+        completa = False
+        try:
+            async for evento in eventos:
+                if registro is not None:
+                    registro.registrar(evento)
+                yield evento
+            completa = True
+        finally:
+            if registro is not None:
+                registro.concluir(completa)
+            await eventos.aclose()
+            await self.sessoes.delete_session(app_name=APP_NAME, user_id=self.usuario, session_id=sessao_id)
+
+
+class PoolAgentes:
+    """
+    Conjuntos de agentes (com seus runners) já construídos, reaproveitados
+    entre análises.
+
+    `adquirir` entrega um conjunto livre, cria um novo se ainda couber no
+    limite `maximo` ou espera a devolução de outro; `devolver` o torna
+    disponível de novo. O tempo gasto para obter cada conjunto é guardado em
+    `metricas()`, separando as aquisições a quente (conjunto pronto) das a
+    frio (conjunto construído na hora).
+    """
+    def __init__(self, criar_agentes: Callable[[], list], maximo: int = POOL_MAXIMO):
+        self.criar_agentes = criar_agentes
+        self.maximo = max(1, maximo)
+        self.livres: List[list] = []
+        self.total_criados = 0
+        self._disponivel: Optional[asyncio.Condition] = None
+        self._aquisicoes: Dict[str, List[float]] = {"quente": [], "frio": []}
+
+    def _construir(self) -> list:
+        agentes = self.criar_agentes()
+        self.total_criados += 1
+        return agentes
+
+    def aquecer(self, quantidade: int = 1) -> "PoolAgentes":
+        """Constrói conjuntos antecipadamente, fora do caminho das análises."""
+        while self.total_criados < min(quantidade, self.maximo):
+            self.livres.append(self._construir())
+        return self
+
+    def agente_raiz(self):
+        """Agente ADK exposto como root_agent (o AgenteAdm de um conjunto do pool)."""
+        self.aquecer(1)
+        conjunto = self.livres[0] if self.livres else self._construir()
+        return conjunto[-1].adk_agent
+
+    async def adquirir(self) -> list:
+        if self._disponivel is None:
+            self._disponivel = asyncio.Condition()
+        inicio = time.monotonic()
+        async with self._disponivel:
+            while not self.livres and self.total_criados >= self.maximo:
+                await self._disponivel.wait()
+            if self.livres:
+                agentes, tipo = self.livres.pop(), "quente"
+            else:
+                agentes, tipo = self._construir(), "frio"
+        self._aquisicoes[tipo].append(time.monotonic() - inicio)
+        return agentes
+
+    async def devolver(self, agentes: list):
+        if self._disponivel is None:
+            self._disponivel = asyncio.Condition()
+        async with self._disponivel:
+            self.livres.append(agentes)
+            self._disponivel.notify()
+
+    def metricas(self) -> Dict[str, Any]:
+        def resumo(valores):
+            return {
+                "aquisicoes": len(valores),
+                "media_ms": round(1000 * sum(valores) / len(valores), 3) if valores else None,
+            }
+        return {"conjuntos_criados": self.total_criados, "livres": len(self.livres),
+                "quente": resumo(self._aquisicoes["quente"]), "frio": resumo(self._aquisicoes["frio"])}
+
+
+async def medir_sobrecarga(criar_agentes: Callable[[], list], trabalhos: int = 20) -> Dict[str, Any]:
+    """
+    Mede a preparação por trabalho, sem chamar o modelo: construindo agentes e
+    runners a cada trabalho (como antes do pool) e reaproveitando-os do pool
+    (só a sessão é criada e removida por chamada).
+    """
+    async def preparar(agentes: list, trabalho: int):
+        for agente in agentes:
+            executor = agente.executor
+            sessao_id = f"medicao{trabalho}"
+            await executor.sessoes.create_session(app_name=APP_NAME, user_id=executor.usuario, session_id=sessao_id)
+            await executor.sessoes.delete_session(app_name=APP_NAME, user_id=executor.usuario, session_id=sessao_id)
+
+    inicio = time.perf_counter()
+    for n in range(trabalhos):
+        await preparar(criar_agentes(), n)
+    sem_pool = (time.perf_counter() - inicio) / trabalhos
+
+    pool = PoolAgentes(criar_agentes, maximo=1).aquecer(1)
+    inicio = time.perf_counter()
+    for n in range(trabalhos):
+        agentes = await pool.adquirir()
+        await preparar(agentes, n)
+        await pool.devolver(agentes)
+    com_pool = (time.perf_counter() - inicio) / trabalhos
+
+    return {
+        "trabalhos": trabalhos,
+        "sem_pool_ms": round(1000 * sem_pool, 3),
+        "com_pool_ms": round(1000 * com_pool, 3),
+        "reducao": round(sem_pool / com_pool, 1) if com_pool else None,
+    }
@@ -0,0 +1,393 @@
+import os
+import json
+import hashlib
+import logging
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache_contexto import estimar_tokens
+from .validacao import CONTAGENS
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Instruções dos agentes montadas a partir de um registro único de seções.
+# Cada agente declara em MODELOS_PROMPT a sequência das suas partes: nomes de
+# seções compartilhadas (SECOES, incluídas uma única vez por instrução) ou
+# texto próprio. A lista de ferramentas sai das ferramentas realmente
+# passadas ao agente e o exemplo de resposta é serializado com json.dumps, sem
+# aspas escapadas. A instrução compilada fica em cache no processo e o número
+# de tokens de cada uma é conferido com o orçamento do agente na criação dele.
+
+# Tokens máximos da instrução de cada agente, sobrescritos por ORCAMENTOS_PROMPT (JSON), ex.:
+# {"Contradicao": 1500}
+ORCAMENTOS_PADRAO = {
+    "Contradicao": 1400,
+    "OrtografiaGramatica": 900,
+    "Ambiguidade": 1100,
+    "Adm_agentes": 900,
+}
+
+# Uma linha (ou mais) por ferramenta, pelo nome da função em tools/ferramentas.py
+DESCRICOES_FERRAMENTAS = {
+    "list_documentos": "list_documentos() -> list: available documents (PDF, DOCX, ODT, HTML, TXT)",
+    "obter_dados_processados": (
+        'obter_dados_processados() -> dict: processed data; each paragraph has "id", '
+        '"loc" (Artigo/Parágrafo/Inciso/Alínea), "pag" (page) and "texto"'
+    ),
+    "localizar_paragrafo": "localizar_paragrafo(paragrafo_id) -> dict: location, page and text of a paragraph",
+    "buscar_dispositivo": (
+        'buscar_dispositivo(documento, localizacao) -> dict: paragraph ids of a provision, '
+        'e.g. "Artigo 5, Parágrafo 2"'
+    ),
+    "consultar_valores": (
+        'consultar_valores(entidade) -> dict: all monetary values, percentages and dates of an entity '
+        '(e.g. "tarifa de água"), grouped by document, with paragraph ids'
+    ),
+    "obter_paragrafos": (
+        'obter_paragrafos(documento, inicio, quantidade) -> dict: a range of paragraphs of one document; '
+        '"proximo" is the next inicio (null at the end). Use it when obter_dados_processados() returns only totals'
+    ),
+}
+
+# Seções compartilhadas; $campo é preenchido com os parâmetros do agente (string.Template)
+SECOES = {
+    "sem_pressa": "Take your time: there is no rush, analyze the documents carefully.",
+    "frases": (
+        'The message contains FRASES: the sentences to analyze, each with its "id" and "texto". '
+        "Analyze only those sentences and do not call obter_dados_processados() for them; "
+        "use localizar_paragrafo() only if you need the surrounding provision."
+    ),
+    "referencia_paragrafo": (
+        'Reference each excerpt by paragraph id (the "id" of each item in "paragrafos") and character span '
+        "(inicio/fim: 0-based, end exclusive, within the paragraph text). "
+        "DO NOT copy the excerpt text or write locations; they are filled in automatically from the ids."
+    ),
+    "referencia_frase": (
+        'Reference each finding by sentence id (in the "paragrafo" field) and character span '
+        "(inicio/fim: 0-based, end exclusive, within the sentence text). "
+        "DO NOT copy the excerpt text; it is filled in automatically."
+    ),
+    "tabelas": (
+        'Tables are in "tabelas" (one line per row, cells separated by "|", struck cell text as ~~text~~): '
+        'reference a table by its id (e.g. "3f9a1c-t1") and span just like a paragraph, and ignore ~~struck~~ values.'
+    ),
+    "regras_json": (
+        "RESPONSE RULES:\n"
+        "- Respond with a single valid JSON object with exactly the structure of RESPONSE FORMAT, and nothing else: "
+        "no markdown, explanations or text outside the JSON."
+    ),
+    "regras_contagem": (
+        '- "$campo_contagem" is the number of items in "$campo_lista" and "$campo_bool" is true only if it is not empty.\n'
+        '- When "$campo_bool" is false, include "observacao" stating that $nada_encontrado.'
+    ),
+}
+
+# Partes de cada instrução, na ordem. "ferramentas" e "formato" são geradas na
+# compilação (ferramentas do agente e "exemplo" serializado); as demais são
+# chaves de SECOES ou texto próprio do agente.
+MODELOS_PROMPT: Dict[str, Dict[str, Any]] = {
+    "Contradicao": {
+        "parametros": {"nada_encontrado": "no contradictions were found between the analyzed documents"},
+        "partes": [
+            "You are a specialist in finding contradictions in documents.",
+            "ferramentas",
+            "sem_pressa",
+            """INSTRUCTIONS:
+1. If the message contains CANDIDATOS A CONTRADIÇÃO, analyze ONLY those pairs: confirm the real contradictions
+   and discard the others. Do not call obter_dados_processados() in that case; the candidate texts are enough
+   (use localizar_paragrafo() only if you need the surrounding provision).
+2. Otherwise, call obter_dados_processados() first and thoroughly analyze all the processed content.
+   Contradictions can be within one document or across documents: check all resolutions of all documents.
+3. Method: group the texts by theme; compare the statements within each group; identify the conflicting ones;
+   check that their contexts are really comparable; document the contradictions found.
+   For values, percentages, deadlines and dates, use consultar_valores() to compare the same entity
+   across documents instead of scanning the full text.
+4. Focus only on content contradictions, not grammar errors or formatting. Be objective and clear,
+   and perform the analysis without waiting for additional instructions.
+
+WHAT IS A CONTRADICTION:
+Two statements (in one or more documents) that make directly opposing claims about the same subject in a
+comparable context. Evaluate the semantic context, not just keywords:
+- Same topic or entity: differences between unrelated subjects are not contradictions.
+- Same time frame and conditions: dates, conditions and circumstances must align.
+Example: "The water tariff will increase in July 2025." vs "The water tariff will decrease in July 2025."
+→ contradiction: same topic, same time frame, opposite claims.
+Counter-example: "The water tariff will increase in July 2025." vs "Wastewater treatment charges will decrease
+in July 2025." → no contradiction: different topics.""",
+            "referencia_paragrafo",
+            "tabelas",
+            "formato",
+            "regras_json",
+            "regras_contagem",
+        ],
+        "exemplo": {
+            "contradicao": True,
+            "documentos_analisados": ["arquivo1.pdf", "arquivo2.pdf"],
+            "numero_contradicoes": 1,
+            "contradicoes": [{
+                "paragrafo_1": "3f9a1c-p12", "inicio_1": 0, "fim_1": 48,
+                "paragrafo_2": "b7e02d-p40", "inicio_2": 15, "fim_2": 63,
+                "explicacao": "Ambos os documentos tratam do mesmo valor e período, mas indicam direções opostas "
+                              "(redução vs aumento), caracterizando uma contradição direta.",
+            }],
+        },
+    },
+    "OrtografiaGramatica": {
+        "parametros": {"nada_encontrado": "the sentences comply with the orthographic and grammatical norms"},
+        "partes": [
+            "You are a specialist in orthographic and grammatical revision of technical documents written in "
+            "Portuguese (Brazil), aligned with the Acordo Ortográfico da Língua Portuguesa and standard grammar norms.",
+            "ferramentas",
+            "frases",
+            """INSTRUCTIONS:
+Objective: identify spelling and grammar errors and suggest the correct form.
+1. Read the sentences one by one and check them against the norms of formal written Portuguese:
+   spelling, agreement, regency, punctuation and verb tenses.
+2. Pay special attention to:
+   - letter changes or outdated spelling (e.g. 'idéia' → 'ideia')
+   - accent marks removed by the AO90 (e.g. 'pára' → 'para')
+   - subject-verb and noun-adjective agreement
+   - improper or missing punctuation
+   - grammatical ambiguities
+   - improper use of pronouns and connectors
+3. Do not judge formatting, writing style or technical content: focus exclusively on the language.
+4. Be objective, technical and precise in the suggestions.""",
+            "referencia_frase",
+            "formato",
+            "regras_json",
+            "regras_contagem",
+        ],
+        "exemplo": {
+            "ortografia_gramatica": True,
+            "documentos_analisados": ["arquivo1.pdf", "arquivo2.pdf"],
+            "total_erros": 1,
+            "erros": [{
+                "paragrafo": "3f9a1c-p7-s2", "inicio": 45, "fim": 73,
+                "sugestao_correcao": "As ideias foram mal esclarecidas e não foi obedecida a norma.",
+                "tipo_erro": "Concordância nominal",
+                "justificativa": "O particípio 'obedecido' deve concordar com o substantivo feminino 'norma'.",
+            }],
+        },
+    },
+    "Ambiguidade": {
+        "parametros": {"nada_encontrado": "no ambiguous expressions were found"},
+        "partes": [
+            "You are a specialist in identifying ambiguities in technical and legal documents.",
+            "ferramentas",
+            "sem_pressa",
+            "frases",
+            """INSTRUCTIONS:
+Ambiguity occurs when a sentence or phrase allows two or more possible interpretations. It is a problem in legal,
+technical and regulatory documents because it leads to misinterpretations, loopholes or conflicting understandings.
+1. Read the sentences one by one and find the expressions with more than one possible meaning.
+2. Classify each ambiguity:
+   - Lexical (word with multiple meanings): "banco" (financial institution or bench)
+   - Syntactic (unclear structure): "O gerente demitiu o funcionário com problemas" → who has the problems?
+   - Referential (unclear pronoun or subject): "Foi decidido que ele será o responsável." → who is "ele"?
+   - Scope (unclear what an element applies to): "Todos os usuários não precisam preencher o formulário."
+     → no user or only some?
+   - Implicit assumptions or missing information
+3. Suggest a rewriting that removes the ambiguity
+   (e.g. "O gerente demitiu o funcionário que causava problemas técnicos." is specific and clear).
+4. Focus only on ambiguity of meaning, not grammar or contradictions. Be precise and objective.""",
+            "referencia_frase",
+            "formato",
+            "regras_json",
+            "regras_contagem",
+        ],
+        "exemplo": {
+            "ambiguidade": True,
+            "documentos_analisados": ["arquivo1.pdf", "arquivo2.pdf"],
+            "numero_ambiguidades": 1,
+            "ambiguidades": [{
+                "paragrafo": "3f9a1c-p21-s1", "inicio": 0, "fim": 66,
+                "tipo": "Referencial",
+                "explicacao": "Não está claro se 'urgência' se aplica ao responsável ou ao diretor.",
+                "sugestao_reescrita": "O responsável deverá entregar com urgência o relatório ao diretor.",
+            }],
+        },
+    },
+    "Adm_agentes": {
+        "partes": [
+            "You are responsible for validating the MEANING of the results produced by the other agents.",
+            "ferramentas",
+            """The message you receive contains two blocks:
+- PRÉ-VALIDAÇÃO LOCAL: document coverage, JSON format and count checks, already computed in code,
+  including 'resumo_processo' and the mechanical 'problemas_identificados'.
+- RESULTADOS DOS AGENTES: the parsed outputs of Contradicao, OrtografiaGramatica and Ambiguidade,
+  with duplicate findings already merged (a merged item lists the findings it replaced in 'origens').
+DO NOT redo the mechanical checks (processed files, counts, response format). Focus only on semantics.
+
+INSTRUCTIONS:
+1. For each item in Contradicao 'contradicoes', validate if the contradiction is real and meaningful
+   (same topic, same time frame, opposite claims).
+2. For each item in OrtografiaGramatica 'erros', validate whether the error is accurate and the suggestion
+   is correct according to formal written Portuguese (Acordo Ortográfico da Língua Portuguesa).
+3. For each item in Ambiguidade 'ambiguidades', validate whether it is truly open to multiple interpretations,
+   whether the type (lexical, syntactic, referential, scope) is correct and whether the rewriting resolves it.
+4. Use obter_dados_processados() only if you need the original text to confirm an item.
+5. Report every unjustified, misclassified or incorrect item in 'problemas_identificados' with a suggestion.
+6. Provide a summary of the validation and a conclusion.""",
+            "formato",
+            "regras_json",
+            "- DO NOT repeat the problems already listed in PRÉ-VALIDAÇÃO LOCAL; they are merged automatically.\n"
+            "- If no problems were found, keep 'problemas_identificados' as an empty list [].",
+        ],
+        "exemplo": {
+            "status_analise": "Aprovada | Necessita Correção",
+            "detalhes_validacao": "As contradições são consistentes com os trechos citados. Os erros gramaticais "
+                                  "foram corretamente classificados. As ambiguidades foram bem caracterizadas.",
+            "problemas_identificados": [{
+                "agente": "OrtografiaGramatica",
+                "erro": "Sugestão incorreta para 'pára' → 'para' em contexto verbal",
+                "sugestao": "Verificar se 'pára' está no sentido do verbo 'parar', o que mantém o acento",
+            }],
+            "conclusao": "A análise geral foi satisfatória. Um ajuste é necessário no agente de ortografia "
+                         "para casos de verbos acentuados.",
+        },
+    },
+}
+
+
+class OrcamentoPromptExcedido(Exception):
+    """Lançada quando a instrução compilada de um agente passa do seu orçamento de tokens."""
+
+
+class PromptCompilado:
+    """Instrução de um agente pronta para o ADK, com as seções usadas e a contagem de tokens."""
+    def __init__(self, agente: str, texto: str, secoes: List[str], tokens: int, contagem: str,
+                 modelo: str, orcamento: Optional[int]):
+        self.agente = agente
+        self.texto = texto
+        self.secoes = secoes
+        self.tokens = tokens
+        # "exata" (tokenizador do modelo) ou "estimada" (sem o tokenizador local)
+        self.contagem = contagem
+        self.modelo = modelo
+        self.orcamento = orcamento
+        self.assinatura = hashlib.sha1(texto.encode("utf-8")).hexdigest()[:12]
+
+    def resumo(self) -> Dict[str, Any]:
+        return {"agente": self.agente, "tokens": self.tokens, "contagem": self.contagem, "modelo": self.modelo,
+                "orcamento": self.orcamento, "caracteres": len(self.texto), "secoes": self.secoes,
+                "assinatura": self.assinatura}
+
+
+def _carregar_orcamentos() -> Dict[str, int]:
+    orcamentos = dict(ORCAMENTOS_PADRAO)
+    bruto = os.getenv("ORCAMENTOS_PROMPT")
+    if bruto:
+        try:
+            orcamentos.update({agente: int(limite) for agente, limite in json.loads(bruto).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("ORCAMENTOS_PROMPT inválido, usando os orçamentos padrão: %s", e)
+    return orcamentos
+
+
+ORCAMENTOS = _carregar_orcamentos()
+
+_TOKENIZADORES: Dict[str, Any] = {}
+_COMPILADOS: Dict[Tuple[str, Tuple[str, ...], str], PromptCompilado] = {}
+
+
+def contar_tokens(texto: str, modelo: str) -> Tuple[int, str]:
+    """
+    Tokens de `texto` pelo tokenizador local do modelo (google.genai.local_tokenizer,
+    que depende do sentencepiece e baixa o vocabulário na primeira vez). Sem ele,
+    usa a estimativa de cache_contexto.
+
+    Returns:
+        (tokens, "exata" | "estimada")
+    """
+    tokenizador = _TOKENIZADORES.get(modelo)
+    if tokenizador is None:
+        try:
+            from google.genai.local_tokenizer import LocalTokenizer
+            tokenizador = LocalTokenizer(model_name=modelo)
+        except Exception as e:
+            logger.warning("Tokenizador local indisponível para %s, contagem de tokens estimada: %s", modelo, e)
+            tokenizador = False
+        _TOKENIZADORES[modelo] = tokenizador
+    if tokenizador:
+        try:
+            return tokenizador.count_tokens(texto).total_tokens, "exata"
+        except Exception as e:
+            logger.warning("Falha ao contar tokens com o tokenizador de %s: %s", modelo, e)
+    return estimar_tokens(texto), "estimada"
+
+
+def _secao_ferramentas(ferramentas: List[str]) -> str:
+    linhas = []
+    for nome in ferramentas:
+        descricao = DESCRICOES_FERRAMENTAS.get(nome)
+        if descricao is None:
+            raise KeyError(f"Ferramenta sem descrição em DESCRICOES_FERRAMENTAS: {nome}")
+        linhas.append(f"- {descricao}")
+    return "TOOLS:\n" + "\n".join(linhas)
+
+
+def _exemplo_json(exemplo: Dict[str, Any]) -> str:
+    """Exemplo de resposta com um campo de primeiro nível por linha e os valores compactos."""
+    campos = [f"  {json.dumps(campo)}: {json.dumps(valor, ensure_ascii=False)}" for campo, valor in exemplo.items()]
+    return "{\n" + ",\n".join(campos) + "\n}"
+
+
+def montar_instrucao(agente: str, ferramentas: List[str]) -> Tuple[str, List[str]]:
+    """Texto da instrução de `agente` e a lista das seções compartilhadas usadas, sem contar tokens."""
+    modelo = MODELOS_PROMPT[agente]
+    parametros = dict(modelo.get("parametros", {}))
+    if agente in CONTAGENS:
+        campo_bool, campo_contagem, campo_lista, _ = CONTAGENS[agente]
+        parametros.update(campo_bool=campo_bool, campo_contagem=campo_contagem, campo_lista=campo_lista)
+
+    blocos, usadas = [], []
+    for parte in modelo["partes"]:
+        if parte == "ferramentas":
+            texto = _secao_ferramentas(ferramentas) if ferramentas else ""
+        elif parte == "formato":
+            texto = "RESPONSE FORMAT (JSON):\n" + _exemplo_json(modelo["exemplo"])
+        elif parte in SECOES:
+            texto = Template(SECOES[parte]).substitute(parametros)
+        else:
+            blocos.append(parte.strip())
+            continue
+        # Uma seção compartilhada entra uma única vez, mesmo se citada de novo
+        if parte in usadas or not texto:
+            continue
+        usadas.append(parte)
+        blocos.append(texto)
+    # Linhas de regras seguidas (ex.: regras_json e regras_contagem) formam um único bloco
+    texto = "\n\n".join(blocos).replace("\n\n- ", "\n- ")
+    return texto, usadas
+
+
+def compilar_instrucao(agente: str, ferramentas: List[str], modelo: str) -> PromptCompilado:
+    """
+    Instrução compilada de `agente` para as `ferramentas` (nomes das funções) e
+    o `modelo` usado na contagem de tokens. O resultado fica em cache no
+    processo; a primeira compilação registra os tokens no log.
+
+    Raises:
+        OrcamentoPromptExcedido: se a instrução passar de ORCAMENTOS[agente] tokens
+    """
+    chave = (agente, tuple(ferramentas), modelo)
+    compilado = _COMPILADOS.get(chave)
+    if compilado is not None:
+        return compilado
+    texto, secoes = montar_instrucao(agente, ferramentas)
+    tokens, contagem = contar_tokens(texto, modelo)
+    orcamento = ORCAMENTOS.get(agente)
+    compilado = PromptCompilado(agente, texto, secoes, tokens, contagem, modelo, orcamento)
+    if orcamento is not None and tokens > orcamento:
+        raise OrcamentoPromptExcedido(
+            f"Instrução do agente {agente} tem {tokens} tokens ({contagem}, {modelo}), "
+            f"acima do orçamento de {orcamento}; reduza o prompt ou ajuste ORCAMENTOS_PROMPT.")
+    logger.info("Instrução de %s compilada: %d tokens (%s, %s), orçamento %s",
+                agente, tokens, contagem, modelo, orcamento if orcamento is not None else "livre")
+    _COMPILADOS[chave] = compilado
+    return compilado
+
+
+def relatorio() -> List[Dict[str, Any]]:
+    """Resumo das instruções compiladas neste processo, uma por agente/ferramentas/modelo."""
+    return [compilado.resumo() for compilado in _COMPILADOS.values()]
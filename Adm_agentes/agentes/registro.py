@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Configurações do arquivo de eventos (JSON Lines)
+ARQUIVO_EVENTOS = os.getenv("LOG_JSONL", os.path.join("logs", "eventos.jsonl"))
+TAMANHO_LOTE = int(os.getenv("LOG_LOTE", "100"))
+INTERVALO_GRAVACAO = float(os.getenv("LOG_INTERVALO", "1"))
+TAMANHO_ROTACAO = int(os.getenv("LOG_ROTACAO_BYTES", str(10 * 1024 * 1024)))
+ARQUIVOS_ROTACAO = int(os.getenv("LOG_ARQUIVOS_ROTACAO", "5"))
+FILA_MAXIMA = int(os.getenv("LOG_FILA_MAXIMA", "10000"))
+
+_FIM = object()
+
+
+class GravadorEventos:
+    """
+    Grava eventos estruturados em JSON Lines a partir de uma thread própria.
+
+    `registrar` só coloca o evento em uma fila limitada e retorna; a thread
+    grava em lotes de até `tamanho_lote` eventos ou a cada `intervalo`
+    segundos, o que vier primeiro, e faz flush a cada lote. Quando o arquivo
+    passa de `tamanho_rotacao` bytes ele é renomeado para .1, .2, ... (até
+    `arquivos_rotacao`). Com a fila cheia o evento é descartado e contado em
+    `descartados`, para que o log nunca bloqueie a análise.
+    """
+    def __init__(self, caminho: str = ARQUIVO_EVENTOS, tamanho_lote: int = TAMANHO_LOTE,
+                 intervalo: float = INTERVALO_GRAVACAO, tamanho_rotacao: int = TAMANHO_ROTACAO,
+                 arquivos_rotacao: int = ARQUIVOS_ROTACAO, fila_maxima: int = FILA_MAXIMA):
+        self.caminho = caminho
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.intervalo = intervalo
+        self.tamanho_rotacao = tamanho_rotacao
+        self.arquivos_rotacao = arquivos_rotacao
+        self.descartados = 0
+        self._fila: queue.Queue = queue.Queue(maxsize=fila_maxima)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="GravadorEventos", daemon=True)
+                self._thread.start()
+
+    def registrar(self, evento: Dict[str, Any]):
+        if self._thread is None:
+            self.iniciar()
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+
+    def encerrar(self, prazo: float = 5.0):
+        """Grava o que restou na fila e para a thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(_FIM, timeout=prazo)
+        except queue.Full:
+            pass
+        self._thread.join(prazo)
+
+    def descarregar(self, prazo: float = 5.0):
+        """Espera a thread gravar os eventos registrados até aqui."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        marca = threading.Event()
+        try:
+            self._fila.put(marca, timeout=prazo)
+        except queue.Full:
+            return
+        marca.wait(prazo)
+
+    def eventos(self, execucao: str) -> List[Dict[str, Any]]:
+        """Eventos de uma execução gravados no arquivo e nas rotações dele, do mais antigo ao mais recente."""
+        self.descarregar()
+        caminhos = [f"{self.caminho}.{n}" for n in range(self.arquivos_rotacao, 0, -1)] + [self.caminho]
+        eventos = []
+        for caminho in caminhos:
+            try:
+                with open(caminho, "r", encoding="utf-8") as f:
+                    for linha in f:
+                        try:
+                            evento = json.loads(linha)
+                        except ValueError:
+                            continue
+                        if evento.get("execucao") == execucao:
+                            eventos.append({k: v for k, v in evento.items() if k != "execucao"})
+            except OSError:
+                continue
+        return eventos
+
+    def _loop(self):
+        encerrar = False
+        while not encerrar:
+            lote: List[Dict[str, Any]] = []
+            marcas: List[threading.Event] = []
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamanho_lote:
+                restante = limite - time.monotonic()
+                try:
+                    evento = self._fila.get(timeout=max(restante, 0)) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if evento is _FIM:
+                    encerrar = True
+                    break
+                if isinstance(evento, threading.Event):
+                    # Pedido de descarregar: grava o lote atual já
+                    marcas.append(evento)
+                    break
+                lote.append(evento)
+            if lote:
+                self._gravar(lote)
+            for marca in marcas:
+                marca.set()
+
+    def _gravar(self, lote: List[Dict[str, Any]]):
+        linhas = "".join(json.dumps(evento, ensure_ascii=False, default=str) + "\n" for evento in lote)
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+            self._rotacionar()
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(linhas)
+                if self.descartados:
+                    f.write(json.dumps({"agente": "Sistema", "acao": "eventos descartados",
+                                        "detalhes": self.descartados}, ensure_ascii=False) + "\n")
+                    self.descartados = 0
+        except OSError as e:
+            logger.warning("Não foi possível gravar %d eventos em %s: %s", len(lote), self.caminho, e)
+
+    def _rotacionar(self):
+        try:
+            if os.path.getsize(self.caminho) < self.tamanho_rotacao:
+                return
+        except OSError:
+            return
+        if self.arquivos_rotacao <= 0:
+            os.remove(self.caminho)
+            return
+        for n in range(self.arquivos_rotacao - 1, 0, -1):
+            origem = f"{self.caminho}.{n}"
+            if os.path.exists(origem):
+                os.replace(origem, f"{self.caminho}.{n + 1}")
+        os.replace(self.caminho, f"{self.caminho}.1")
+
+
+_GRAVADOR: Optional[GravadorEventos] = None
+
+
+def obter_gravador() -> GravadorEventos:
+    """Gravador padrão do processo, compartilhado por todas as execuções."""
+    global _GRAVADOR
+    if _GRAVADOR is None:
+        _GRAVADOR = GravadorEventos()
+        atexit.register(_GRAVADOR.encerrar)
+    return _GRAVADOR
@@ -0,0 +1,365 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Esquemas (subconjunto de JSON Schema) das respostas de cada agente de análise.
+# Espelham os "RESPONSE FORMAT" dos prompts em contradicao.py, ortografia.py e ambiguidade.py.
+_TEXTO = {"type": "string"}
+_LISTA_TEXTOS = {"type": "array", "items": _TEXTO}
+
+_INTEIRO = {"type": "integer"}
+
+# Os achados referenciam o texto pelo ID do parágrafo e pelo intervalo de caracteres
+# (ver tools/referencias.py); trechos e localizações são reconstituídos localmente.
+ESQUEMAS = {
+    "Contradicao": {
+        "type": "object",
+        "required": ["contradicao", "documentos_analisados", "numero_contradicoes", "contradicoes"],
+        "properties": {
+            "contradicao": {"type": "boolean"},
+            "documentos_analisados": _LISTA_TEXTOS,
+            "numero_contradicoes": _INTEIRO,
+            "contradicoes": {"type": "array", "items": {
+                "type": "object",
+                "required": ["paragrafo_1", "inicio_1", "fim_1",
+                             "paragrafo_2", "inicio_2", "fim_2", "explicacao"],
+                "properties": {
+                    "paragrafo_1": _TEXTO, "inicio_1": _INTEIRO, "fim_1": _INTEIRO,
+                    "paragrafo_2": _TEXTO, "inicio_2": _INTEIRO, "fim_2": _INTEIRO,
+                    "explicacao": _TEXTO,
+                },
+            }},
+            "observacao": _TEXTO,
+        },
+    },
+    "OrtografiaGramatica": {
+        "type": "object",
+        "required": ["ortografia_gramatica", "documentos_analisados", "total_erros", "erros"],
+        "properties": {
+            "ortografia_gramatica": {"type": "boolean"},
+            "documentos_analisados": _LISTA_TEXTOS,
+            "total_erros": _INTEIRO,
+            "erros": {"type": "array", "items": {
+                "type": "object",
+                "required": ["paragrafo", "inicio", "fim",
+                             "sugestao_correcao", "tipo_erro", "justificativa"],
+                "properties": {
+                    "paragrafo": _TEXTO, "inicio": _INTEIRO, "fim": _INTEIRO,
+                    "sugestao_correcao": _TEXTO, "tipo_erro": _TEXTO, "justificativa": _TEXTO,
+                },
+            }},
+            "observacao": _TEXTO,
+        },
+    },
+    "Ambiguidade": {
+        "type": "object",
+        "required": ["ambiguidade", "documentos_analisados", "numero_ambiguidades", "ambiguidades"],
+        "properties": {
+            "ambiguidade": {"type": "boolean"},
+            "documentos_analisados": _LISTA_TEXTOS,
+            "numero_ambiguidades": _INTEIRO,
+            "ambiguidades": {"type": "array", "items": {
+                "type": "object",
+                "required": ["paragrafo", "inicio", "fim", "tipo",
+                             "explicacao", "sugestao_reescrita"],
+                "properties": {
+                    "paragrafo": _TEXTO, "inicio": _INTEIRO, "fim": _INTEIRO,
+                    "tipo": _TEXTO, "explicacao": _TEXTO, "sugestao_reescrita": _TEXTO,
+                },
+            }},
+            "observacao": _TEXTO,
+        },
+    },
+}
+
+# Resposta do AgenteAdm (validação semântica); não entra na pré-validação
+ESQUEMA_ADM = {
+    "type": "object",
+    "required": ["status_analise", "detalhes_validacao", "problemas_identificados", "conclusao"],
+    "properties": {
+        "status_analise": _TEXTO,
+        "detalhes_validacao": _TEXTO,
+        "problemas_identificados": {"type": "array", "items": {
+            "type": "object",
+            "required": ["agente", "erro", "sugestao"],
+            "properties": {"agente": _TEXTO, "erro": _TEXTO, "sugestao": _TEXTO},
+        }},
+        "conclusao": _TEXTO,
+    },
+}
+
+# Formato de saída exigido do modelo em cada agente (ver modelo_resposta)
+ESQUEMAS_SAIDA = {**ESQUEMAS, "Adm_agentes": ESQUEMA_ADM}
+
+# Para cada agente: (campo booleano, campo de contagem, lista de achados, chave do resumo_processo)
+CONTAGENS = {
+    "Contradicao": ("contradicao", "numero_contradicoes", "contradicoes", "contradicoes_validadas"),
+    "OrtografiaGramatica": ("ortografia_gramatica", "total_erros", "erros", "erros_ortograficos_gramaticais_validados"),
+    "Ambiguidade": ("ambiguidade", "numero_ambiguidades", "ambiguidades", "ambiguidades_validadas"),
+}
+
+_TIPOS = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+}
+
+
+def _tipo_pydantic(esquema: Dict[str, Any], nome: str) -> Any:
+    from pydantic import create_model
+
+    tipo = esquema.get("type")
+    if tipo == "object":
+        obrigatorios = esquema.get("required", [])
+        campos = {}
+        for campo, sub_esquema in esquema.get("properties", {}).items():
+            anotacao = _tipo_pydantic(sub_esquema, f"{nome}_{campo}")
+            campos[campo] = (anotacao, ...) if campo in obrigatorios else (Optional[anotacao], None)
+        return create_model(nome, **campos)
+    if tipo == "array":
+        item = _tipo_pydantic(esquema.get("items", {}), f"{nome}_item")
+        return List[item]
+    return {"string": str, "boolean": bool, "integer": int}.get(tipo, Any)
+
+
+@lru_cache(maxsize=None)
+def modelo_resposta(agente: str) -> Optional[Any]:
+    """
+    Modelo pydantic equivalente a ESQUEMAS_SAIDA[agente], passado ao ADK como
+    output_schema (restrição de saída estruturada); None se o agente não tem esquema.
+    """
+    esquema = ESQUEMAS_SAIDA.get(agente)
+    if esquema is None:
+        return None
+    return _tipo_pydantic(esquema, "Resposta" + re.sub(r"\W", "", agente))
+
+
+def _fechamentos(pilha: List[Tuple[str, int]]) -> str:
+    return "".join("}" if c == "{" else "]" for c, _ in reversed(pilha))
+
+
+def reparar_json(texto: str) -> Tuple[Optional[Any], List[str]]:
+    """
+    Interpreta texto JSON com os defeitos mais comuns nas respostas dos modelos,
+    sem nova chamada: cerca ```json (inclusive sem o fechamento), texto antes ou
+    depois do JSON, vírgula antes de "}" ou "]", quebras de linha cruas dentro
+    de strings e resposta truncada (strings, listas e objetos abertos são
+    fechados; o último item incompleto de uma lista é descartado).
+
+    Returns:
+        (objeto ou None, lista dos reparos aplicados)
+    """
+    reparos = []
+    texto = texto.strip()
+    cerca = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", texto, re.DOTALL)
+    if cerca:
+        texto = cerca.group(1).strip()
+        reparos.append("cerca markdown")
+    inicio = min((i for i in (texto.find("{"), texto.find("[")) if i != -1), default=-1)
+    if inicio == -1:
+        return None, reparos
+    if texto[:inicio].strip():
+        reparos.append("texto antes do JSON")
+
+    saida: List[str] = []
+    # Contêineres abertos: (caractere, tamanho da saída logo após a abertura)
+    pilha: List[Tuple[str, int]] = []
+    # (tamanho da saída, profundidade) logo após cada elemento completo de uma lista ou objeto
+    cortes: List[Tuple[int, int]] = []
+    em_string = escape = False
+    fim = None
+    for posicao in range(inicio, len(texto)):
+        c = texto[posicao]
+        if em_string:
+            saida.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                em_string = False
+            continue
+        if c == '"':
+            em_string = True
+        elif c in "{[":
+            saida.append(c)
+            pilha.append((c, len(saida)))
+            continue
+        elif c in "}]":
+            # Vírgula sobrando antes do fechamento
+            while saida and saida[-1].isspace():
+                saida.pop()
+            if saida and saida[-1] == ",":
+                saida.pop()
+                if "vírgula sobrando" not in reparos:
+                    reparos.append("vírgula sobrando")
+            if not pilha or {"}": "{", "]": "["}[c] != pilha[-1][0]:
+                break
+            pilha.pop()
+            saida.append(c)
+            if not pilha:
+                fim = posicao
+                break
+            cortes.append((len(saida), len(pilha)))
+            continue
+        elif c == ",":
+            cortes.append((len(saida), len(pilha)))
+        saida.append(c)
+
+    if fim is not None:
+        if texto[fim + 1:].strip():
+            reparos.append("texto após o JSON")
+        try:
+            return json.loads("".join(saida), strict=False), reparos
+        except ValueError:
+            return None, reparos
+
+    # Resposta truncada. Dentro de uma lista, o item incompleto é descartado
+    # (um achado pela metade não serve); fora dela, o que está aberto é fechado
+    reparos.append("JSON truncado")
+    tentativas = []
+    listas = [n for n, (c, _) in enumerate(pilha) if c == "["]
+    if listas:
+        profundidade = listas[-1] + 1
+        abertura = pilha[profundidade - 1][1]
+        tentativas += [(tamanho, profundidade) for tamanho, nivel in reversed(cortes)
+                       if nivel == profundidade and tamanho > abertura][:1]
+        tentativas.append((abertura, profundidade))
+    base = "".join(saida)
+    if em_string:
+        # Uma barra invertida solta no fim escaparia as aspas de fechamento
+        base = (base[:-1] if escape else base) + '"'
+    candidatos = [re.sub(r"[\s,:]*$", "", base) + _fechamentos(pilha)]
+    candidatos = ["".join(saida[:tamanho]) + _fechamentos(pilha[:nivel]) for tamanho, nivel in tentativas] + candidatos
+    candidatos += ["".join(saida[:tamanho]) + _fechamentos(pilha[:nivel]) for tamanho, nivel in reversed(cortes)]
+    for candidato in candidatos:
+        try:
+            return json.loads(candidato, strict=False), reparos
+        except ValueError:
+            continue
+    return None, reparos
+
+
+def interpretar_resposta(resultado: Any) -> Tuple[Optional[Any], List[str]]:
+    """
+    Converte a resposta de um agente em objeto Python, reparando localmente o
+    JSON malformado (ver reparar_json). Aceita dicts já prontos e texto.
+
+    Returns:
+        (objeto ou None se não houver JSON aproveitável, reparos aplicados)
+    """
+    if resultado is None:
+        return None, []
+    if isinstance(resultado, (dict, list)):
+        return resultado, []
+    texto = str(resultado).strip()
+    try:
+        return json.loads(texto), []
+    except ValueError:
+        return reparar_json(texto)
+
+
+def interpretar_json(resultado: Any) -> Optional[Any]:
+    """
+    Converte a resposta de um agente em objeto Python.
+    Aceita dicts já prontos, texto JSON puro, JSON cercado por ```json ... ```
+    e os demais defeitos que reparar_json corrige.
+    Retorna None se não houver JSON válido.
+    """
+    return interpretar_resposta(resultado)[0]
+
+
+def validar_esquema(dados: Any, esquema: Dict[str, Any], caminho: str = "$") -> List[str]:
+    """Valida `dados` contra o esquema e retorna a lista de problemas encontrados."""
+    erros = []
+    tipo = esquema.get("type")
+    esperado = _TIPOS.get(tipo)
+    # bool é subclasse de int em Python; não aceitar True/False como inteiro
+    if esperado and (not isinstance(dados, esperado) or (tipo == "integer" and isinstance(dados, bool))):
+        return [f"{caminho}: esperado {tipo}, encontrado {type(dados).__name__}"]
+
+    if tipo == "object":
+        for campo in esquema.get("required", []):
+            if campo not in dados:
+                erros.append(f"{caminho}: campo obrigatório ausente '{campo}'")
+        for campo, sub_esquema in esquema.get("properties", {}).items():
+            if campo in dados:
+                erros.extend(validar_esquema(dados[campo], sub_esquema, f"{caminho}.{campo}"))
+    elif tipo == "array" and "items" in esquema:
+        for i, item in enumerate(dados):
+            erros.extend(validar_esquema(item, esquema["items"], f"{caminho}[{i}]"))
+    return erros
+
+
+def pre_validar(resultados: Dict[str, Any], documentos: List[str], processados: List[str]) -> Dict[str, Any]:
+    """
+    Executa localmente as verificações mecânicas do AgenteAdm:
+    cobertura de documentos, formato JSON de cada agente e conferência das contagens.
+
+    Args:
+        resultados: ContextoAnalise.resultados (respostas brutas dos agentes)
+        documentos: documentos que deveriam ser analisados
+        processados: documentos extraídos com sucesso
+
+    Returns:
+        dict com "resumo_processo", "problemas_identificados", "total_achados"
+        e "dados" (respostas interpretadas, por agente)
+    """
+    problemas = []
+    resumo = {
+        "arquivos_pdf_encontrados": len(documentos),
+        "arquivos_processados_com_sucesso": len([d for d in documentos if d in processados]),
+    }
+    dados_por_agente = {}
+    total_achados = 0
+
+    for doc in documentos:
+        if doc not in processados:
+            problemas.append({"agente": "Sistema", "erro": f"Documento não processado: {doc}",
+                              "sugestao": "Verificar a conversão/extração do arquivo e reprocessar."})
+
+    for agente, esquema in ESQUEMAS.items():
+        campo_bool, campo_contagem, campo_lista, chave_resumo = CONTAGENS[agente]
+        dados = interpretar_json(resultados.get(agente))
+        if dados is None:
+            resumo[chave_resumo] = 0
+            problemas.append({"agente": agente, "erro": "Resposta ausente ou não é um JSON válido",
+                              "sugestao": "Reexecutar o agente exigindo apenas o JSON no formato especificado."})
+            continue
+        dados_por_agente[agente] = dados
+
+        for erro in validar_esquema(dados, esquema):
+            problemas.append({"agente": agente, "erro": f"Formato inválido: {erro}",
+                              "sugestao": "Ajustar a resposta ao formato JSON especificado no prompt."})
+
+        achados = dados.get(campo_lista) if isinstance(dados, dict) else None
+        achados = achados if isinstance(achados, list) else []
+        total_achados += len(achados)
+        resumo[chave_resumo] = len(achados)
+
+        if isinstance(dados, dict):
+            contagem = dados.get(campo_contagem)
+            if isinstance(contagem, int) and contagem != len(achados):
+                problemas.append({"agente": agente,
+                                  "erro": f"'{campo_contagem}' = {contagem}, mas '{campo_lista}' tem {len(achados)} itens",
+                                  "sugestao": f"Corrigir '{campo_contagem}' para {len(achados)}."})
+            if isinstance(dados.get(campo_bool), bool) and dados[campo_bool] != bool(achados):
+                problemas.append({"agente": agente,
+                                  "erro": f"'{campo_bool}' = {json.dumps(dados[campo_bool])} não condiz com {len(achados)} achados",
+                                  "sugestao": f"Corrigir '{campo_bool}' para {str(bool(achados)).lower()}."})
+            analisados = dados.get("documentos_analisados")
+            if isinstance(analisados, list):
+                faltantes = [d for d in processados if d not in analisados]
+                if faltantes:
+                    problemas.append({"agente": agente, "erro": f"Documentos não analisados: {faltantes}",
+                                      "sugestao": "Reexecutar a análise incluindo todos os documentos processados."})
+
+    return {
+        "resumo_processo": resumo,
+        "problemas_identificados": problemas,
+        "total_achados": total_achados,
+        "dados": dados_por_agente,
+    }
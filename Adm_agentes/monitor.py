@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Awaitable, Dict, List
+
+from tools.ferramentas import BASE_PATH, list_documentos, assinatura_arquivo
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Configurações padrão do modo monitor (podem ser sobrescritas por variáveis de ambiente)
+INTERVALO_VARREDURA = float(os.getenv("MONITOR_INTERVALO", "2"))
+ESPERA_DEBOUNCE = float(os.getenv("MONITOR_ESPERA", "10"))
+LOTE_MAXIMO = int(os.getenv("MONITOR_LOTE_MAXIMO", "20"))
+
+
+class MonitorDocumentos:
+    """
+    Observa a pasta BASE_PATH e agrupa documentos novos ou modificados em lotes.
+
+    Uma rajada de arquivos copiados em sequência vira um único lote: o lote só é
+    liberado depois de `espera` segundos sem novas alterações, ou quando atinge
+    `lote_maximo` arquivos.
+    """
+    def __init__(self, intervalo: float = INTERVALO_VARREDURA, espera: float = ESPERA_DEBOUNCE,
+                 lote_maximo: int = LOTE_MAXIMO, processar_existentes: bool = False):
+        self.intervalo = intervalo
+        self.espera = espera
+        self.lote_maximo = lote_maximo
+        self.processar_existentes = processar_existentes
+        self.conhecidos: Dict[str, tuple] = {}
+        self.pendentes: Dict[str, float] = {}
+        self._ultima_alteracao = 0.0
+
+    def _varrer(self) -> Dict[str, tuple]:
+        """Retorna a assinatura atual de cada documento da pasta."""
+        atuais = {}
+        for nome in list_documentos():
+            try:
+                atuais[nome] = assinatura_arquivo(os.path.join(BASE_PATH, nome))
+            except OSError:
+                # Arquivo removido ou ainda sendo copiado; tenta na próxima varredura
+                continue
+        return atuais
+
+    def registrar_alteracoes(self) -> List[str]:
+        """Compara a pasta com o último estado conhecido e marca os arquivos alterados."""
+        atuais = self._varrer()
+        alterados = [nome for nome, assinatura in atuais.items() if self.conhecidos.get(nome) != assinatura]
+        agora = time.monotonic()
+        for nome in alterados:
+            self.pendentes[nome] = agora
+        if alterados:
+            self._ultima_alteracao = agora
+        # Arquivos removidos deixam de estar pendentes
+        for nome in list(self.pendentes):
+            if nome not in atuais:
+                del self.pendentes[nome]
+        self.conhecidos = atuais
+        return alterados
+
+    def lote_pronto(self) -> List[str]:
+        """Libera o lote pendente se a pasta ficou estável ou se o lote encheu."""
+        if not self.pendentes:
+            return []
+        estavel = time.monotonic() - self._ultima_alteracao >= self.espera
+        if not estavel and len(self.pendentes) < self.lote_maximo:
+            return []
+        lote = sorted(self.pendentes, key=self.pendentes.get)[:self.lote_maximo]
+        for nome in lote:
+            del self.pendentes[nome]
+        return lote
+
+    async def monitorar(self, ao_detectar: Callable[[List[str]], Awaitable[None]]):
+        """Loop principal: varre a pasta e entrega cada lote para `ao_detectar`."""
+        if self.processar_existentes:
+            self.registrar_alteracoes()
+        else:
+            self.conhecidos = self._varrer()
+        logger.info(f"Monitorando {BASE_PATH} ({len(self.conhecidos)} documentos já existentes)")
+
+        while True:
+            alterados = self.registrar_alteracoes()
+            if alterados:
+                logger.info(f"Alterações detectadas: {alterados}")
+            lote = self.lote_pronto()
+            if lote:
+                logger.info(f"Iniciando análise do lote: {lote}")
+                try:
+                    await ao_detectar(lote)
+                except Exception as e:
+                    # Uma falha em um lote não deve derrubar o monitor
+                    logger.warning(f"Falha ao analisar o lote {lote}: {e}")
+            await asyncio.sleep(self.intervalo)
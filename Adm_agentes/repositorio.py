@@ -0,0 +1,309 @@
+import os
+import json
+import uuid
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from tools.ferramentas import BASE_PATH
+from tools.referencias import EXPANSOES, expandir_resultados
+from agentes.validacao import interpretar_json
+
+logger = logging.getLogger("FluxoAgentes")
+
+# Banco SQLite com o histórico de todas as execuções
+ARQUIVO_BANCO = os.getenv("RESULTADOS_DB", os.path.join("logs", "resultados.db"))
+# Logs e resultados vão para o banco em lotes, gravados por uma thread do
+# repositório: a cada INTERVALO_ESCRITA segundos ou ao juntar LOTE_ESCRITA itens
+LOTE_ESCRITA = int(os.getenv("RESULTADOS_LOTE", "200"))
+INTERVALO_ESCRITA = float(os.getenv("RESULTADOS_INTERVALO", "1"))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id TEXT PRIMARY KEY,
+    inicio TEXT NOT NULL,
+    fim TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS documentos_execucao (
+    execucao TEXT NOT NULL,
+    documento TEXT NOT NULL,
+    hash_documento TEXT
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execucao TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    agente TEXT,
+    acao TEXT,
+    detalhes TEXT
+);
+CREATE TABLE IF NOT EXISTS resultados (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execucao TEXT NOT NULL,
+    agente TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    resultado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS achados (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execucao TEXT NOT NULL,
+    resultado INTEGER NOT NULL,
+    agente TEXT NOT NULL,
+    documento TEXT,
+    hash_documento TEXT,
+    timestamp TEXT NOT NULL,
+    achado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_execucoes_inicio ON execucoes (inicio);
+CREATE INDEX IF NOT EXISTS idx_documentos_execucao ON documentos_execucao (execucao);
+CREATE INDEX IF NOT EXISTS idx_documentos_nome ON documentos_execucao (documento);
+CREATE INDEX IF NOT EXISTS idx_documentos_hash ON documentos_execucao (hash_documento);
+CREATE INDEX IF NOT EXISTS idx_logs_execucao ON logs (execucao);
+CREATE INDEX IF NOT EXISTS idx_logs_agente ON logs (agente, timestamp);
+CREATE INDEX IF NOT EXISTS idx_resultados_execucao ON resultados (execucao, agente);
+CREATE INDEX IF NOT EXISTS idx_achados_documento ON achados (documento, agente);
+CREATE INDEX IF NOT EXISTS idx_achados_hash ON achados (hash_documento);
+CREATE INDEX IF NOT EXISTS idx_achados_agente ON achados (agente, timestamp);
+CREATE INDEX IF NOT EXISTS idx_achados_execucao ON achados (execucao);
+"""
+
+# Campos de documento de cada referência dos achados, por agente
+_CAMPOS_DOCUMENTO = {
+    agente: [campo_doc for _, campo_doc, _, _ in referencias]
+    for agente, (_, referencias) in EXPANSOES.items()
+}
+
+
+def hash_arquivo(caminho: str) -> Optional[str]:
+    """SHA-1 do conteúdo do arquivo; distingue as versões (minutas) de uma mesma resolução."""
+    try:
+        sha1 = hashlib.sha1()
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(bloco)
+        return sha1.hexdigest()
+    except OSError:
+        return None
+
+
+class RepositorioResultados:
+    """
+    Histórico durável das execuções em SQLite.
+
+    Logs e resultados de agente entram em uma fila e são gravados por uma
+    thread própria, em lotes com um único commit, sem bloquear o loop de
+    eventos da análise; uma queda no meio da execução perde no máximo o último
+    INTERVALO_ESCRITA. As consultas e finalizar_execucao gravam antes o que
+    estiver na fila. Um novo resultado do mesmo agente na mesma
+    execução (lotes de frases, resposta do modelo antes da combinação com a
+    pré-validação) substitui o anterior e os achados dele. Os achados dos agentes
+    são gravados um por linha, indexados por documento, hash do conteúdo,
+    agente e data, para consultas de histórico entre versões de um documento.
+    """
+    def __init__(self, caminho: str = ARQUIVO_BANCO):
+        self.caminho = caminho
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        # Os agentes registram logs a partir de threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.row_factory = sqlite3.Row
+        with self._lock, self._conexao:
+            if caminho != ":memory:":
+                self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript(_ESQUEMA)
+        # Escritas pendentes: ("log", linha) ou ("resultado", argumentos)
+        self._pendentes: List[tuple] = []
+        self._lock_pendentes = threading.Lock()
+        self._sinal = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fechado = False
+
+    def fechar(self):
+        self._fechado = True
+        self._sinal.set()
+        self.descarregar()
+        with self._lock:
+            self._conexao.close()
+
+    def _enfileirar(self, item: tuple):
+        with self._lock_pendentes:
+            self._pendentes.append(item)
+            cheio = len(self._pendentes) >= LOTE_ESCRITA
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="RepositorioResultados", daemon=True)
+                self._thread.start()
+        if cheio:
+            self._sinal.set()
+
+    def _loop(self):
+        while not self._fechado:
+            self._sinal.wait(INTERVALO_ESCRITA)
+            self._sinal.clear()
+            if not self._fechado:
+                self.descarregar()
+
+    def descarregar(self):
+        """Grava no banco, em uma transação, os logs e resultados da fila."""
+        # A trava da conexão cobre a troca da fila, para que os lotes entrem na ordem
+        with self._lock:
+            with self._lock_pendentes:
+                pendentes, self._pendentes = self._pendentes, []
+            if not pendentes:
+                return
+            try:
+                with self._conexao:
+                    self._conexao.executemany(
+                        "INSERT INTO logs (execucao, timestamp, agente, acao, detalhes) VALUES (?, ?, ?, ?, ?)",
+                        [dados for tipo, dados in pendentes if tipo == "log"]
+                    )
+                    for tipo, dados in pendentes:
+                        if tipo == "resultado":
+                            self._gravar_resultado(*dados)
+            except sqlite3.Error as e:
+                logger.warning(f"Não foi possível gravar {len(pendentes)} itens no repositório de resultados: {e}")
+
+    def _consultar(self, sql: str, parametros: tuple = ()) -> List[sqlite3.Row]:
+        self.descarregar()
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    # --- Escrita -----------------------------------------------------------
+
+    def iniciar_execucao(self, documentos: List[str]) -> str:
+        """Abre uma execução e registra os documentos com o hash do conteúdo atual."""
+        execucao = uuid.uuid4().hex
+        agora = datetime.now().isoformat()
+        with self._lock, self._conexao:
+            self._conexao.execute("INSERT INTO execucoes (id, inicio, status) VALUES (?, ?, ?)",
+                                  (execucao, agora, "iniciado"))
+            self._conexao.executemany(
+                "INSERT INTO documentos_execucao (execucao, documento, hash_documento) VALUES (?, ?, ?)",
+                [(execucao, doc, hash_arquivo(os.path.join(BASE_PATH, doc))) for doc in documentos]
+            )
+        return execucao
+
+    def finalizar_execucao(self, execucao: str, status: str):
+        self.descarregar()
+        with self._lock, self._conexao:
+            self._conexao.execute("UPDATE execucoes SET fim = ?, status = ? WHERE id = ?",
+                                  (datetime.now().isoformat(), status, execucao))
+
+    def registrar_log(self, execucao: str, log: Dict[str, Any]):
+        self._enfileirar(("log", (execucao, log["timestamp"], log["agente"], log["acao"], str(log["detalhes"]))))
+
+    def registrar_resultado(self, execucao: str, agente: str, resultado: Any):
+        """
+        Grava o resultado do agente já expandido (documento, localização e trecho
+        de cada achado) e uma linha por achado e documento citado, no lugar do
+        resultado anterior do agente nesta execução.
+        """
+        # A expansão usa os índices de parágrafos de agora; a gravação fica para a thread
+        expandido = expandir_resultados({agente: interpretar_json(resultado) or resultado})[agente]
+        self._enfileirar(("resultado", (execucao, agente, datetime.now().isoformat(), expandido)))
+
+    def _gravar_resultado(self, execucao: str, agente: str, agora: str, expandido: Any):
+        """Chamado por descarregar, com a trava e a transação da conexão abertas."""
+        hashes = {
+            documento: hash_documento
+            for documento, hash_documento in self._conexao.execute(
+                "SELECT documento, hash_documento FROM documentos_execucao WHERE execucao = ?", (execucao,))
+        }
+        self._conexao.execute("DELETE FROM achados WHERE execucao = ? AND agente = ?", (execucao, agente))
+        self._conexao.execute("DELETE FROM resultados WHERE execucao = ? AND agente = ?", (execucao, agente))
+        resultado_id = self._conexao.execute(
+            "INSERT INTO resultados (execucao, agente, timestamp, resultado) VALUES (?, ?, ?, ?)",
+            (execucao, agente, agora, json.dumps(expandido, ensure_ascii=False))
+        ).lastrowid
+        linhas = []
+        if agente in EXPANSOES and isinstance(expandido, dict):
+            achados = expandido.get(EXPANSOES[agente][0])
+            for achado in achados if isinstance(achados, list) else []:
+                if not isinstance(achado, dict):
+                    continue
+                texto = json.dumps(achado, ensure_ascii=False)
+                documentos = {achado.get(campo) for campo in _CAMPOS_DOCUMENTO[agente]} - {None}
+                for documento in sorted(documentos) or [None]:
+                    linhas.append((execucao, resultado_id, agente, documento,
+                                   hashes.get(documento), agora, texto))
+        self._conexao.executemany(
+            "INSERT INTO achados (execucao, resultado, agente, documento, hash_documento, timestamp, achado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas
+        )
+
+    # --- Consulta ----------------------------------------------------------
+
+    def execucoes(self, documento: str = None, limite: int = 50) -> List[Dict[str, Any]]:
+        """Execuções mais recentes, opcionalmente só as que analisaram `documento`."""
+        if documento is None:
+            linhas = self._consultar("SELECT * FROM execucoes ORDER BY inicio DESC LIMIT ?", (limite,))
+        else:
+            linhas = self._consultar(
+                "SELECT DISTINCT e.* FROM execucoes e JOIN documentos_execucao d ON d.execucao = e.id "
+                "WHERE d.documento = ? ORDER BY e.inicio DESC LIMIT ?", (documento, limite))
+        return [dict(linha) for linha in linhas]
+
+    def historico(self, documento: str = None, agente: str = None, hash_documento: str = None,
+                  desde: str = None, ate: str = None) -> List[Dict[str, Any]]:
+        """
+        Achados registrados ao longo das execuções, do mais antigo ao mais recente.
+        Ex.: historico("resolucao.pdf", "Contradicao") traz todas as contradições
+        apontadas para a resolução em todas as suas versões; cada achado vem com
+        a execução e o hash da versão analisada. `desde`/`ate` são datas ISO.
+        """
+        condicoes, parametros = [], []
+        for campo, valor in (("documento", documento), ("agente", agente), ("hash_documento", hash_documento)):
+            if valor is not None:
+                condicoes.append(f"{campo} = ?")
+                parametros.append(valor)
+        if desde is not None:
+            condicoes.append("timestamp >= ?")
+            parametros.append(desde)
+        if ate is not None:
+            condicoes.append("timestamp <= ?")
+            parametros.append(ate)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        linhas = self._consultar(
+            f"SELECT execucao, agente, documento, hash_documento, timestamp, achado FROM achados {where} ORDER BY id",
+            tuple(parametros))
+        return [{**{k: linha[k] for k in linha.keys() if k != "achado"}, "achado": json.loads(linha["achado"])}
+                for linha in linhas]
+
+    def logs(self, execucao: str) -> List[Dict[str, Any]]:
+        linhas = self._consultar(
+            "SELECT timestamp, agente, acao, detalhes FROM logs WHERE execucao = ? ORDER BY id", (execucao,))
+        return [dict(linha) for linha in linhas]
+
+    def resultados(self, execucao: str) -> Dict[str, Any]:
+        """Último resultado de cada agente na execução (já expandido)."""
+        linhas = self._consultar(
+            "SELECT agente, resultado FROM resultados WHERE execucao = ? ORDER BY id", (execucao,))
+        return {linha["agente"]: json.loads(linha["resultado"]) for linha in linhas}
+
+    # --- Exportação --------------------------------------------------------
+
+    def exportar_json(self, execucao: str, arquivo_logs: str = os.path.join("logs", "execucao_analise.json"),
+                      arquivo_resultados: str = "resultados_analise_final.json"):
+        """Gera os arquivos JSON no formato de sempre a partir de uma execução gravada."""
+        with open(arquivo_logs, "w", encoding="utf-8") as f:
+            json.dump(self.logs(execucao), f, ensure_ascii=False, indent=2)
+        with open(arquivo_resultados, "w", encoding="utf-8") as f:
+            json.dump(self.resultados(execucao), f, ensure_ascii=False, indent=2)
+
+
+_REPOSITORIO: Optional[RepositorioResultados] = None
+
+
+def obter_repositorio() -> RepositorioResultados:
+    """Repositório padrão do processo (aberto na primeira chamada)."""
+    global _REPOSITORIO
+    if _REPOSITORIO is None:
+        _REPOSITORIO = RepositorioResultados()
+        atexit.register(_REPOSITORIO.descarregar)
+    return _REPOSITORIO
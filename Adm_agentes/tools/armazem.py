@@ -0,0 +1,242 @@
+import os
+import mmap
+import json
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from tools.referencias import id_documento
+
+# Armazém em disco dos parágrafos extraídos, lido por mapeamento de memória.
+# Cada documento vira três arquivos em `pasta`, nomeados pelo prefixo do
+# documento (ArmazemParagrafos.prefixo):
+#   <prefixo>.utf8      textos de todos os parágrafos e tabelas, em sequência,
+#                       seguidos das localizações (UTF-8, sem separadores)
+#   <prefixo>.idx.npy   um registro por parágrafo/tabela com os offsets (em
+#                       bytes) do texto e da localização no blob, página,
+#                       número no ID ("-p<n>" ou "-t<n>") e flags
+#   <prefixo>.json      documento, assinatura do arquivo de origem e totais
+# Os parágrafos vêm primeiro, na ordem de extração, e as tabelas depois; os
+# textos de um intervalo de registros ficam contíguos no blob.
+# prefixos.json guarda a tabela documento -> prefixo. O prefixo começa com os
+# 6 primeiros dígitos do SHA-1 do nome (id_documento) e é estendido quando já
+# pertence a outro documento, o que mantém os IDs curtos sem colisões.
+
+# Flags de cada registro
+FLAG_OCR = 1
+FLAG_TABELA = 2
+
+DTYPE_INDICE = np.dtype([
+    ("inicio", "<i8"), ("fim", "<i8"),
+    ("loc_inicio", "<i8"), ("loc_fim", "<i8"),
+    ("pagina", "<i4"), ("numero", "<i4"), ("flags", "u1"),
+])
+
+
+class DocumentoMapeado:
+    """
+    Parágrafos de um documento lidos do armazém sem carregá-los na memória:
+    o blob é mapeado com mmap e o índice com np.load(mmap_mode="r"). `bruto`
+    devolve um memoryview do blob (sem cópia); o texto só é decodificado nos
+    registros efetivamente pedidos.
+    """
+    def __init__(self, pasta: str, prefixo: str):
+        self.prefixo = prefixo
+        with open(os.path.join(pasta, f"{prefixo}.json"), encoding="utf-8") as f:
+            self.metadados = json.load(f)
+        self.indice = np.load(os.path.join(pasta, f"{prefixo}.idx.npy"), mmap_mode="r")
+        self._arquivo = open(os.path.join(pasta, f"{prefixo}.utf8"), "rb")
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        # mmap não aceita arquivos vazios (documento sem texto)
+        self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else None
+        self.blob = memoryview(self._mapa) if self._mapa is not None else memoryview(b"")
+
+    def __len__(self) -> int:
+        return len(self.indice)
+
+    def bruto(self, inicio: int, fim: int) -> memoryview:
+        """Bytes UTF-8 dos textos dos registros [inicio, fim), sem cópia."""
+        inicio, fim = max(0, inicio), min(len(self), fim)
+        if inicio >= fim:
+            return self.blob[0:0]
+        return self.blob[int(self.indice["inicio"][inicio]):int(self.indice["fim"][fim - 1])]
+
+    def texto(self, i: int) -> str:
+        registro = self.indice[i]
+        return str(self.blob[int(registro["inicio"]):int(registro["fim"])], "utf-8")
+
+    def registro(self, i: int) -> Dict[str, Any]:
+        """Registro no mesmo formato compacto de obter_dados_processados ({"id", "loc", "pag", "texto"})."""
+        registro = self.indice[i]
+        tabela = bool(registro["flags"] & FLAG_TABELA)
+        saida = {
+            "id": f"{self.prefixo}-{'t' if tabela else 'p'}{int(registro['numero'])}",
+            "loc": str(self.blob[int(registro["loc_inicio"]):int(registro["loc_fim"])], "utf-8"),
+            "pag": int(registro["pagina"]) or None,
+            "texto": self.texto(i),
+        }
+        if registro["flags"] & FLAG_OCR:
+            saida["fonte"] = "ocr"
+        return saida
+
+    def fatia(self, inicio: int, fim: int) -> List[Dict[str, Any]]:
+        inicio, fim = max(0, inicio), min(len(self), fim)
+        return [self.registro(i) for i in range(inicio, fim)]
+
+    def fechar(self):
+        # Solta o mapeamento do índice (np.memmap é fechado quando não há mais referências)
+        self.indice = np.zeros(0, dtype=DTYPE_INDICE)
+        self.blob.release()
+        if self._mapa is not None:
+            try:
+                self._mapa.close()
+            except BufferError:
+                # Ainda há fatias de `bruto` em uso; o mapa é fechado quando forem coletadas
+                pass
+        self._arquivo.close()
+
+
+class ArmazemParagrafos:
+    """
+    Parágrafos e tabelas de todos os documentos processados, gravados pela
+    etapa de extração e lidos por intervalo (documento, registros [inicio, fim))
+    pelas ferramentas que alimentam os agentes.
+
+    Gravar um documento fecha o mapeamento aberto dele: quem lê um documento
+    aberto (abrir) fora do armazém segura `trava` durante a leitura.
+    """
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        self._abertos: Dict[str, DocumentoMapeado] = {}
+        self._prefixos: Optional[Dict[str, str]] = None
+        self.trava = threading.RLock()
+
+    def _caminho(self, prefixo: str, extensao: str) -> str:
+        return os.path.join(self.pasta, f"{prefixo}{extensao}")
+
+    def _tabela_prefixos(self) -> Dict[str, str]:
+        if self._prefixos is None:
+            try:
+                with open(os.path.join(self.pasta, "prefixos.json"), encoding="utf-8") as f:
+                    self._prefixos = json.load(f)
+            except (OSError, ValueError):
+                self._prefixos = {}
+        return self._prefixos
+
+    def prefixo(self, documento: str) -> str:
+        """
+        Prefixo dos IDs e dos arquivos do documento, único no armazém. Um
+        documento novo recebe id_documento(documento), estendido com mais
+        dígitos do hash enquanto o prefixo pertencer a outro documento.
+        """
+        with self.trava:
+            tabela = self._tabela_prefixos()
+            if documento in tabela:
+                return tabela[documento]
+            completo = hashlib.sha1(documento.encode("utf-8")).hexdigest()
+            usados = set(tabela.values())
+            prefixo = id_documento(documento)
+            tamanho = len(prefixo)
+            while prefixo in usados:
+                tamanho += 2
+                # Com o hash inteiro em uso por outro nome, acrescenta um contador
+                prefixo = completo[:tamanho] if tamanho <= len(completo) else f"{completo}{tamanho}"
+            tabela[documento] = prefixo
+            os.makedirs(self.pasta, exist_ok=True)
+            caminho = os.path.join(self.pasta, "prefixos.json")
+            with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(tabela, f, ensure_ascii=False)
+            os.replace(caminho + ".tmp", caminho)
+            return prefixo
+
+    def gravar(self, documento: str, analise: Dict[str, Any], assinatura: Optional[tuple] = None):
+        """Grava os "paragrafos" e "tabelas" (já com IDs, ver atribuir_ids) de um documento."""
+        prefixo = self.prefixo(documento)
+        registros = [(p, 0) for p in analise.get("paragrafos", [])]
+        registros += [(t, FLAG_TABELA) for t in analise.get("tabelas", [])]
+
+        textos = [r["texto"].encode("utf-8") for r, _ in registros]
+        locais = [(r.get("loc") or "").encode("utf-8") for r, _ in registros]
+        indice = np.zeros(len(registros), dtype=DTYPE_INDICE)
+        tamanhos = np.fromiter((len(t) for t in textos), dtype=np.int64, count=len(textos))
+        indice["fim"] = np.cumsum(tamanhos)
+        indice["inicio"] = indice["fim"] - tamanhos
+        tamanhos_loc = np.fromiter((len(l) for l in locais), dtype=np.int64, count=len(locais))
+        indice["loc_fim"] = int(tamanhos.sum()) + np.cumsum(tamanhos_loc)
+        indice["loc_inicio"] = indice["loc_fim"] - tamanhos_loc
+        for n, (registro, flags) in enumerate(registros):
+            indice["pagina"][n] = registro.get("pag") or 0
+            indice["numero"][n] = int(registro["id"].rsplit("-", 1)[1][1:])
+            indice["flags"][n] = flags | (FLAG_OCR if registro.get("fonte") == "ocr" else 0)
+
+        with self.trava:
+            # Um documento aberto precisa ser fechado antes de o arquivo ser substituído (Windows)
+            self.fechar(documento)
+            os.makedirs(self.pasta, exist_ok=True)
+            blob = self._caminho(prefixo, ".utf8")
+            with open(blob + ".tmp", "wb") as f:
+                f.writelines(textos)
+                f.writelines(locais)
+            os.replace(blob + ".tmp", blob)
+            # np.save acrescenta ".npy" a nomes sem essa extensão
+            with open(self._caminho(prefixo, ".idx.npy.tmp"), "wb") as f:
+                np.save(f, indice)
+            os.replace(self._caminho(prefixo, ".idx.npy.tmp"), self._caminho(prefixo, ".idx.npy"))
+            with open(self._caminho(prefixo, ".json.tmp"), "w", encoding="utf-8") as f:
+                json.dump({"documento": documento, "assinatura": list(assinatura) if assinatura else None,
+                           "paragrafos": len(analise.get("paragrafos", [])),
+                           "tabelas": len(analise.get("tabelas", []))}, f, ensure_ascii=False)
+            os.replace(self._caminho(prefixo, ".json.tmp"), self._caminho(prefixo, ".json"))
+
+    def abrir(self, documento: str, assinatura: Optional[tuple] = None) -> Optional[DocumentoMapeado]:
+        """
+        Documento mapeado (aberto uma única vez), ou None se não estiver no
+        armazém. Arquivos gravados para outro documento ou, quando `assinatura`
+        é informada, para outra versão do arquivo de origem também devolvem
+        None: o documento precisa ser processado (e gravado) de novo.
+        """
+        with self.trava:
+            if documento not in self._abertos:
+                prefixo = self._tabela_prefixos().get(documento)
+                if prefixo is None or not os.path.exists(self._caminho(prefixo, ".idx.npy")):
+                    return None
+                try:
+                    mapeado = DocumentoMapeado(self.pasta, prefixo)
+                except (OSError, ValueError) as e:
+                    print(f"Armazém: arquivos de {documento} ilegíveis ({e}), o documento será reprocessado")
+                    return None
+                if mapeado.metadados.get("documento") != documento:
+                    print(f"Armazém: {prefixo} pertence a {mapeado.metadados.get('documento')}, não a {documento}")
+                    mapeado.fechar()
+                    return None
+                self._abertos[documento] = mapeado
+            mapeado = self._abertos[documento]
+            if assinatura is not None and mapeado.metadados.get("assinatura") != list(assinatura):
+                return None
+            return mapeado
+
+    def tamanho_texto(self, documento: str) -> Optional[int]:
+        """Bytes (UTF-8) dos textos de parágrafos e tabelas gravados; None se o documento não estiver no armazém."""
+        with self.trava:
+            mapeado = self.abrir(documento)
+            if mapeado is None:
+                return None
+            return int(mapeado.indice["fim"][-1]) if len(mapeado) else 0
+
+    def fatiar(self, documento: str, inicio: int = 0, fim: int = None) -> List[Dict[str, Any]]:
+        """Registros [inicio, fim) de um documento; lista vazia se ele não estiver no armazém."""
+        with self.trava:
+            mapeado = self.abrir(documento)
+            if mapeado is None:
+                return []
+            return mapeado.fatia(inicio, len(mapeado) if fim is None else fim)
+
+    def fechar(self, documento: str = None):
+        with self.trava:
+            documentos = [documento] if documento is not None else list(self._abertos)
+            for doc in documentos:
+                mapeado = self._abertos.pop(doc, None)
+                if mapeado is not None:
+                    mapeado.fechar()
@@ -0,0 +1,125 @@
+import re
+from itertools import combinations
+from typing import Dict, List, Set
+
+from tools.valores import extrair_valores, normalizar, NOMES_TIPOS
+
+# Eixos de polaridade: cada eixo tem um polo positivo e um negativo.
+# Dois parágrafos sobre o mesmo assunto com polos opostos no mesmo eixo são candidatos.
+POLARIDADES = {
+    "variacao": (
+        ("aument", "elev", "acresc", "major"),
+        ("reduz", "reduc", "diminu", "decresc", "minor"),
+    ),
+    "permissao": (
+        ("permitid", "autorizad", "admitid", "facultad", "pode ", "poderao ", "podera "),
+        ("vedad", "proibid", "nao pode", "nao podera", "nao sera permitid", "defes"),
+    ),
+    "obrigatoriedade": (
+        ("obrigatori", "devera ", "deverao ", "deve ", "compulsori"),
+        ("facultativ", "opcional", "dispensad", "nao precisa", "isent"),
+    ),
+    "vigencia": (
+        ("entra em vigor", "vigora", "mantid", "prorrogad"),
+        ("revogad", "extint", "suspens", "cancelad"),
+    ),
+}
+
+_STOPWORDS = set("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para
+com sem sob sobre entre ate e ou que se nao mais menos ao aos seu sua seus suas este esta
+estes estas esse essa isso aquele aquela ser sera serao sao foi foram tem ter como quando
+art artigo paragrafo inciso alinea resolucao presente disposto forma caso bem ainda mesmo
+""".split())
+
+_PALAVRA = re.compile(r"[a-z]{3,}")
+
+
+def _termos(texto_normalizado: str) -> Set[str]:
+    """Palavras de conteúdo, reduzidas a um radical simples (5 letras)."""
+    return {p[:5] for p in _PALAVRA.findall(texto_normalizado) if p not in _STOPWORDS}
+
+
+def _polaridades(texto_normalizado: str) -> Dict[str, int]:
+    """Para cada eixo, +1 ou -1 se só um dos polos aparece no texto."""
+    sinais = {}
+    for eixo, (positivos, negativos) in POLARIDADES.items():
+        neg = any(m in texto_normalizado for m in negativos)
+        # Remove os marcadores negativos antes de procurar os positivos ("nao pode" contém "pode")
+        restante = texto_normalizado
+        for m in negativos:
+            restante = restante.replace(m, " ")
+        pos = any(m in restante for m in positivos)
+        if pos != neg:
+            sinais[eixo] = 1 if pos else -1
+    return sinais
+
+
+def _perfil(paragrafo: dict) -> dict:
+    texto = normalizar(paragrafo["texto"]) + " "
+    valores = {}
+    for tipo, valor, trecho, entidade in extrair_valores(paragrafo["texto"]):
+        if entidade:
+            valores.setdefault((entidade, tipo), set()).add(valor)
+    return {
+        "paragrafo": paragrafo,
+        "termos": _termos(texto),
+        "polaridades": _polaridades(texto),
+        "valores": valores,
+    }
+
+
+def gerar_candidatos(paragrafos: List[dict], limite: int = 20, similaridade_minima: float = 0.25) -> List[dict]:
+    """
+    Encontra pares de parágrafos que tratam do mesmo assunto e divergem em
+    polaridade (aumento/redução, permitido/vedado, obrigatório/facultativo...)
+    ou em valores/datas da mesma entidade. Retorna os `limite` melhores pares,
+    do mais para o menos provável.
+
+    Args:
+        paragrafos: itens {"id", "documento", "texto", ...} (ver referencias.paragrafos_dos_documentos)
+    """
+    perfis = [_perfil(p) for p in paragrafos]
+
+    # Índice invertido radical -> parágrafos, para só comparar pares com vocabulário em comum
+    indice: Dict[str, List[int]] = {}
+    for i, perfil in enumerate(perfis):
+        for termo in perfil["termos"]:
+            indice.setdefault(termo, []).append(i)
+    pares = set()
+    for ocorrencias in indice.values():
+        # Termos muito frequentes não ajudam a separar assuntos
+        if 1 < len(ocorrencias) <= max(50, len(perfis) // 10):
+            pares.update(combinations(ocorrencias, 2))
+
+    candidatos = []
+    for i, j in pares:
+        a, b = perfis[i], perfis[j]
+        uniao = a["termos"] | b["termos"]
+        similaridade = len(a["termos"] & b["termos"]) / len(uniao) if uniao else 0.0
+        if similaridade < similaridade_minima:
+            continue
+
+        motivos = [
+            f"polaridade oposta ({eixo})"
+            for eixo, sinal in a["polaridades"].items()
+            if b["polaridades"].get(eixo) == -sinal
+        ]
+        for chave in a["valores"].keys() & b["valores"].keys():
+            if a["valores"][chave] != b["valores"][chave]:
+                entidade, tipo = chave
+                motivos.append(f"{NOMES_TIPOS[tipo]} divergente para '{entidade}'")
+        if not motivos:
+            continue
+
+        candidatos.append({
+            "paragrafo_1": a["paragrafo"]["id"],
+            "texto_1": a["paragrafo"]["texto"],
+            "paragrafo_2": b["paragrafo"]["id"],
+            "texto_2": b["paragrafo"]["texto"],
+            "motivos": motivos,
+            "pontuacao": round(similaridade * (1 + len(motivos)), 4),
+        })
+
+    candidatos.sort(key=lambda c: c["pontuacao"], reverse=True)
+    return candidatos[:limite]
@@ -0,0 +1,339 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+from pdf2docx import Converter
+
+import tools.perfil as perfil
+
+# Processos de conversão pdf2docx mantidos ao mesmo tempo
+CONVERSAO_WORKERS = int(os.getenv("CONVERSAO_WORKERS", "1"))
+# Um processo é reciclado depois de converter este número de documentos...
+CONVERSAO_DOCS_POR_WORKER = int(os.getenv("CONVERSAO_DOCS_POR_WORKER", "20"))
+# ...ou se, ao terminar um documento, estiver usando mais que este RSS (MB; 0 desativa)
+CONVERSAO_RECICLAR_RSS_MB = float(os.getenv("CONVERSAO_RECICLAR_RSS_MB", "1024"))
+# Limite de memória de cada processo (MB; 0 desativa). No Linux é o RLIMIT_AS
+# do próprio processo; nos demais sistemas (Windows, macOS) o orquestrador
+# acompanha o RSS do processo pelo psutil e o encerra ao passar do limite, o que
+# exige o pacote psutil. Sem ele, a conversão falha avisando como resolver.
+CONVERSAO_LIMITE_MEMORIA_MB = int(os.getenv("CONVERSAO_LIMITE_MEMORIA_MB", "4096"))
+
+# RLIMIT_AS só limita de fato a memória do processo no Linux
+_LIMITE_NO_PROCESSO = sys.platform.startswith("linux")
+
+
+class ConversaoCancelada(Exception):
+    """A análise que pediu a conversão foi cancelada; o processo de trabalho foi encerrado."""
+
+
+def _psutil():
+    """Módulo psutil, se instalado (medição e limite de memória fora do Linux)."""
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def _aplicar_limite_memoria(limite_mb: int):
+    if not limite_mb or not _LIMITE_NO_PROCESSO:
+        return
+    try:
+        import resource
+        limite = limite_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Não foi possível limitar a memória do processo de conversão: {e}")
+
+
+def _rss_kb() -> Optional[int]:
+    """RSS atual do processo em kB: /proc no Linux, psutil nos demais sistemas."""
+    rss = _ler_status_kb("VmRSS")
+    if rss is None and _psutil() is not None:
+        rss = _psutil().Process().memory_info().rss // 1024
+    return rss
+
+
+def _ler_status_kb(campo: str) -> Optional[int]:
+    """Lê um campo (VmRSS, VmHWM) de /proc/self/status, em kB; None fora do Linux."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for linha in f:
+                if linha.startswith(campo + ":"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _zerar_pico_rss():
+    """Reinicia o pico de RSS (VmHWM) do processo para medir cada arquivo separadamente."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _pico_rss_mb() -> Optional[float]:
+    pico = _ler_status_kb("VmHWM")
+    if pico is None and _psutil() is not None:
+        # No Windows o psutil informa o pico do working set do processo
+        pico_bytes = getattr(_psutil().Process().memory_info(), "peak_wset", None)
+        pico = pico_bytes // 1024 if pico_bytes else None
+    if pico is None:
+        try:
+            import resource
+            # Sem /proc, o melhor disponível é o pico do processo inteiro
+            # (ru_maxrss vem em bytes no macOS e em kB nos demais)
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if sys.platform == "darwin":
+                pico //= 1024
+        except ImportError:
+            return None
+    return round(pico / 1024, 1)
+
+
+def _pilhas_da_conversao(perfilador) -> Dict[str, int]:
+    """Amostras do processo a partir de _loop_worker (sem os quadros herdados do fork)."""
+    pilhas = {}
+    for pilha, quantidade in perfilador.cpu.items():
+        inicio = pilha.find("_loop_worker (")
+        pilha = pilha[inicio:] if inicio >= 0 else pilha
+        pilhas[pilha] = pilhas.get(pilha, 0) + quantidade
+    return pilhas
+
+
+def _loop_worker(pedidos, respostas, limite_mb: int):
+    """Processo de conversão: converte os arquivos recebidos até receber None."""
+    _aplicar_limite_memoria(limite_mb)
+    while True:
+        pedido = pedidos.get()
+        if pedido is None:
+            return
+        pdf_path, docx_path, paginas, intervalo_perfil = pedido
+        # Com o perfil ativo no orquestrador, o processo amostra a própria conversão
+        perfilador = perfil.Perfilador(intervalo_perfil).iniciar() if intervalo_perfil else None
+        _zerar_pico_rss()
+        inicio = time.monotonic()
+        sem_memoria = False
+        try:
+            cv = Converter(pdf_path)
+            try:
+                # pdf2docx numera as páginas a partir de 0
+                cv.convert(docx_path, pages=[p - 1 for p in paginas] if paginas else None)
+            finally:
+                cv.close()
+            sucesso, erro = True, None
+        except MemoryError:
+            sucesso, erro, sem_memoria = False, f"Memória esgotada (limite de {limite_mb} MB)", True
+        except Exception as e:
+            sucesso, erro = False, str(e)
+        if perfilador is not None:
+            perfilador.parar()
+        rss = _rss_kb()
+        respostas.put({
+            "sucesso": sucesso,
+            "erro": erro,
+            "segundos": round(time.monotonic() - inicio, 2),
+            "pico_rss_mb": _pico_rss_mb(),
+            "rss_mb": round(rss / 1024, 1) if rss is not None else None,
+            "sem_memoria": sem_memoria,
+            "perfil": _pilhas_da_conversao(perfilador) if perfilador is not None else None,
+        })
+        if sem_memoria:
+            # Depois de um MemoryError o estado do processo não é confiável
+            return
+
+
+class _Worker:
+    def __init__(self, limite_mb: int):
+        self.pedidos = multiprocessing.Queue()
+        self.respostas = multiprocessing.Queue()
+        self.processo = multiprocessing.Process(target=_loop_worker, args=(self.pedidos, self.respostas, limite_mb),
+                                                daemon=True)
+        self.processo.start()
+        self.convertidos = 0
+
+    def encerrar(self, forcar: bool = False):
+        if not forcar and self.processo.is_alive():
+            self.pedidos.put(None)
+            self.processo.join(5)
+        if self.processo.is_alive():
+            self.processo.terminate()
+            self.processo.join(5)
+            if self.processo.is_alive():
+                self.processo.kill()
+                self.processo.join()
+
+
+class PoolConversao:
+    """
+    Processos de trabalho reaproveitáveis para a conversão pdf2docx.
+
+    Cada processo roda com memória limitada (`limite_memoria_mb`), então um PDF
+    que estoura a memória derruba só o seu processo, nunca o orquestrador. No
+    Linux o limite é o RLIMIT_AS do processo; nos demais sistemas o RSS do
+    processo é conferido a cada segundo pelo psutil e o processo é encerrado
+    ao passar do limite (ver CONVERSAO_LIMITE_MEMORIA_MB).
+    O processo é reciclado depois de `documentos_por_worker` conversões ou quando
+    o RSS passa de `reciclar_rss_mb`, devolvendo a memória ao sistema. Cada
+    conversão retorna um relatório com sucesso/erro, duração e pico de RSS.
+    """
+    def __init__(self, workers: int = CONVERSAO_WORKERS, documentos_por_worker: int = CONVERSAO_DOCS_POR_WORKER,
+                 reciclar_rss_mb: float = CONVERSAO_RECICLAR_RSS_MB, limite_memoria_mb: int = CONVERSAO_LIMITE_MEMORIA_MB):
+        self.workers = max(1, workers)
+        self.documentos_por_worker = documentos_por_worker
+        self.reciclar_rss_mb = reciclar_rss_mb
+        self.limite_memoria_mb = limite_memoria_mb
+        self.reciclagens = 0
+        self._livres: List[_Worker] = []
+        self._ativos = 0
+        self._condicao = threading.Condition()
+
+    def _verificar_plataforma(self):
+        """Falha com uma mensagem clara se o limite de memória não puder ser aplicado neste sistema."""
+        if self.limite_memoria_mb and not _LIMITE_NO_PROCESSO and _psutil() is None:
+            raise RuntimeError(
+                f"O limite de memória da conversão ({self.limite_memoria_mb} MB) não pode ser aplicado em "
+                f"{sys.platform} sem o pacote psutil. Instale o psutil ou defina CONVERSAO_LIMITE_MEMORIA_MB=0 "
+                "para converter sem limite."
+            )
+
+    def _excedeu_memoria(self, worker: _Worker) -> bool:
+        """Fora do Linux, confere o RSS do processo de trabalho com o limite."""
+        if not self.limite_memoria_mb or _LIMITE_NO_PROCESSO:
+            return False
+        psutil = _psutil()
+        try:
+            rss = psutil.Process(worker.processo.pid).memory_info().rss
+        except (psutil.Error, OSError):
+            return False
+        return rss > self.limite_memoria_mb * 1024 * 1024
+
+    def _adquirir(self, limite: float = None, cancelar: threading.Event = None) -> _Worker:
+        with self._condicao:
+            while not self._livres and self._ativos >= self.workers:
+                if cancelar is not None and cancelar.is_set():
+                    raise ConversaoCancelada("Conversão cancelada aguardando um processo livre")
+                espera = 1.0 if limite is None else min(1.0, limite - time.monotonic())
+                if espera <= 0:
+                    raise TimeoutError("Prazo da conversão esgotado aguardando um processo livre")
+                self._condicao.wait(espera)
+            while self._livres:
+                worker = self._livres.pop()
+                if worker.processo.is_alive():
+                    return worker
+                self._ativos -= 1
+            self._ativos += 1
+        try:
+            return _Worker(self.limite_memoria_mb)
+        except Exception:
+            with self._condicao:
+                self._ativos -= 1
+                self._condicao.notify()
+            raise
+
+    def _devolver(self, worker: _Worker, reciclar: bool, forcar: bool = False):
+        if reciclar:
+            worker.encerrar(forcar=forcar)
+            self.reciclagens += 1
+        with self._condicao:
+            if reciclar:
+                self._ativos -= 1
+            else:
+                self._livres.append(worker)
+            self._condicao.notify()
+
+    def _motivo_reciclagem(self, worker: _Worker, relatorio: Dict[str, Any]) -> Optional[str]:
+        if relatorio.get("sem_memoria"):
+            return "memória esgotada"
+        if not worker.processo.is_alive():
+            return "processo encerrado"
+        if self.documentos_por_worker and worker.convertidos >= self.documentos_por_worker:
+            return f"{worker.convertidos} documentos convertidos"
+        if self.reciclar_rss_mb and (relatorio.get("rss_mb") or 0) > self.reciclar_rss_mb:
+            return f"RSS de {relatorio['rss_mb']:g} MB"
+        return None
+
+    def converter(self, pdf_path: str, docx_path: str, prazo: float = None,
+                  paginas: List[int] = None, cancelar: threading.Event = None) -> Dict[str, Any]:
+        """
+        Converte um PDF (ou só as `paginas` indicadas, a partir de 1) em um
+        processo de trabalho. `cancelar`, quando sinalizado, interrompe a
+        conversão (verificado a cada segundo, inclusive na espera por um processo livre).
+
+        Returns:
+            dict: sucesso, erro, segundos, pico_rss_mb, rss_mb e, se o processo
+            foi reciclado depois desta conversão, o motivo em "reciclado".
+
+        Raises:
+            TimeoutError: se a conversão não terminar em `prazo` segundos; o
+                processo é encerrado antes da exceção ser lançada.
+            ConversaoCancelada: se `cancelar` for sinalizado; idem.
+        """
+        self._verificar_plataforma()
+        limite = time.monotonic() + prazo if prazo else None
+        worker = self._adquirir(limite, cancelar)
+        try:
+            perfilador = perfil.perfilador()
+            worker.pedidos.put((pdf_path, docx_path, paginas, perfilador.intervalo if perfilador else None))
+            while True:
+                if cancelar is not None and cancelar.is_set():
+                    self._devolver(worker, reciclar=True, forcar=True)
+                    raise ConversaoCancelada(f"Conversão de {os.path.basename(pdf_path)} cancelada")
+                espera = 1.0 if limite is None else min(1.0, limite - time.monotonic())
+                if espera <= 0:
+                    self._devolver(worker, reciclar=True, forcar=True)
+                    raise TimeoutError(f"Conversão excedeu o prazo de {prazo:g}s")
+                try:
+                    relatorio = worker.respostas.get(timeout=espera)
+                    break
+                except queue.Empty:
+                    if self._excedeu_memoria(worker):
+                        worker.encerrar(forcar=True)
+                        relatorio = {
+                            "sucesso": False,
+                            "erro": f"Memória esgotada (limite de {self.limite_memoria_mb} MB)",
+                            "segundos": None, "pico_rss_mb": None, "rss_mb": None, "sem_memoria": True,
+                        }
+                        break
+                    if not worker.processo.is_alive():
+                        # Morto pelo sistema (ex.: OOM killer) ou por falha nativa
+                        relatorio = {
+                            "sucesso": False,
+                            "erro": f"Processo de conversão terminou com código {worker.processo.exitcode}",
+                            "segundos": None, "pico_rss_mb": None, "rss_mb": None, "sem_memoria": False,
+                        }
+                        break
+        except (TimeoutError, ConversaoCancelada):
+            raise
+        except BaseException:
+            self._devolver(worker, reciclar=True, forcar=True)
+            raise
+
+        amostras = relatorio.pop("perfil", None)
+        if amostras and perfil.perfilador() is not None:
+            perfil.perfilador().incorporar(amostras, perfil.etapa_atual())
+        worker.convertidos += 1
+        motivo = self._motivo_reciclagem(worker, relatorio)
+        if motivo:
+            relatorio["reciclado"] = motivo
+        self._devolver(worker, reciclar=motivo is not None)
+        return relatorio
+
+    def encerrar(self):
+        with self._condicao:
+            livres, self._livres = self._livres, []
+            self._ativos -= len(livres)
+        for worker in livres:
+            worker.encerrar()
+
+
+POOL_CONVERSAO = PoolConversao()
+atexit.register(POOL_CONVERSAO.encerrar)
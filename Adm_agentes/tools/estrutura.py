@@ -0,0 +1,70 @@
+import re
+from typing import Dict, List, Optional
+
+# Padrões dos dispositivos das resoluções, sempre no início do parágrafo.
+# Ex.: "Art. 5º", "Artigo 12-A", "§ 2º", "Parágrafo único", "III -", "b)"
+_ARTIGO = re.compile(r"^\s*Art(?:igo)?\.?\s*(\d+)\s*[º°o]?(?:\s*-\s*([A-Z]))?\b", re.IGNORECASE)
+_PARAGRAFO = re.compile(r"^\s*§\s*(\d+)\s*[º°o]?")
+_PARAGRAFO_UNICO = re.compile(r"^\s*Par[áa]grafo\s+[úu]nico\b", re.IGNORECASE)
+_INCISO = re.compile(r"^\s*([IVXLC]+)\s*[-–—.)]\s")
+_ALINEA = re.compile(r"^\s*([a-z])\)\s")
+
+
+def identificar_dispositivo(texto: str) -> Optional[tuple]:
+    """
+    Identifica o dispositivo que abre o parágrafo.
+    Retorna (nivel, rotulo) com nivel em "artigo", "paragrafo", "inciso" ou "alinea", ou None.
+    """
+    m = _ARTIGO.match(texto)
+    if m:
+        return ("artigo", m.group(1) + (f"-{m.group(2).upper()}" if m.group(2) else ""))
+    if _PARAGRAFO_UNICO.match(texto):
+        return ("paragrafo", "único")
+    m = _PARAGRAFO.match(texto)
+    if m:
+        return ("paragrafo", m.group(1))
+    m = _INCISO.match(texto)
+    if m:
+        return ("inciso", m.group(1))
+    m = _ALINEA.match(texto)
+    if m:
+        return ("alinea", m.group(1))
+    return None
+
+
+_NIVEIS = ["artigo", "paragrafo", "inciso", "alinea"]
+_ROTULOS = {"artigo": "Artigo", "paragrafo": "Parágrafo", "inciso": "Inciso", "alinea": "Alínea"}
+
+
+def formatar_localizacao(estrutura: Dict[str, str]) -> str:
+    """Ex.: {"artigo": "5", "paragrafo": "2"} -> "Artigo 5, Parágrafo 2"."""
+    partes = []
+    for nivel in _NIVEIS:
+        rotulo = estrutura.get(nivel)
+        if rotulo is None:
+            continue
+        if nivel == "paragrafo" and rotulo == "único":
+            partes.append("Parágrafo único")
+        else:
+            partes.append(f"{_ROTULOS[nivel]} {rotulo}")
+    return ", ".join(partes)
+
+
+def indexar_estrutura(textos: List[str]) -> List[Dict[str, str]]:
+    """
+    Percorre os parágrafos em ordem e devolve, para cada um, o dispositivo em que
+    ele está contido (artigo/parágrafo/inciso/alínea). Um novo dispositivo zera
+    os níveis abaixo dele; textos sem marcador herdam a posição corrente
+    (ex.: continuação de um caput).
+    """
+    atual: Dict[str, str] = {}
+    estruturas = []
+    for texto in textos:
+        dispositivo = identificar_dispositivo(texto)
+        if dispositivo:
+            nivel, rotulo = dispositivo
+            indice = _NIVEIS.index(nivel)
+            atual = {n: atual[n] for n in _NIVEIS[:indice] if n in atual}
+            atual[nivel] = rotulo
+        estruturas.append(dict(atual))
+    return estruturas
@@ -0,0 +1,186 @@
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+
+# Extratores para formatos nativos (sem conversão pdf2docx). Todos devolvem a
+# mesma estrutura de analisar_texto_riscado: textos_normais, paginas_normais e
+# total_paragrafos; parágrafos com texto riscado ficam de fora.
+
+
+def _resultado(textos_normais: list, paginas: list, total_riscados: int) -> dict:
+    print(f"Análise completa - Textos riscados: {total_riscados}, Textos normais: {len(textos_normais)}")
+    return {
+        "textos_normais": textos_normais,
+        "paginas_normais": paginas,
+        "total_paragrafos": len(textos_normais) + total_riscados
+    }
+
+
+def extrair_txt(caminho: str) -> dict:
+    """Texto puro: parágrafos separados por linha em branco (ou uma linha por parágrafo, se não houver)."""
+    with open(caminho, "r", encoding="utf-8", errors="replace") as f:
+        conteudo = f.read()
+    # Quebra de página (form feed) marca mudança de página em exportações de texto
+    textos, paginas = [], []
+    for pagina, bloco_pagina in enumerate(conteudo.split("\f"), start=1):
+        blocos = re.split(r"\n\s*\n", bloco_pagina) if re.search(r"\n\s*\n", bloco_pagina) else bloco_pagina.splitlines()
+        for bloco in blocos:
+            texto = " ".join(bloco.split())
+            if texto:
+                textos.append(texto)
+                paginas.append(pagina)
+    return _resultado(textos, paginas, 0)
+
+
+_ODF_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+_ODF_STYLE = "urn:oasis:names:tc:opendocument:xmlns:style:1.0"
+_ODF_FO = "urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"
+
+
+def extrair_odt(caminho: str) -> dict:
+    """Documento ODF: lê content.xml e detecta riscado pelos estilos automáticos."""
+    with zipfile.ZipFile(caminho) as odt:
+        raiz = ET.fromstring(odt.read("content.xml"))
+
+    # Estilos cujo texto é riscado (style:text-line-through-style diferente de "none")
+    riscados = set()
+    for estilo in raiz.iter(f"{{{_ODF_STYLE}}}style"):
+        props = estilo.find(f"{{{_ODF_STYLE}}}text-properties")
+        if props is not None and props.get(f"{{{_ODF_STYLE}}}text-line-through-style", "none") != "none":
+            riscados.add(estilo.get(f"{{{_ODF_STYLE}}}name"))
+
+    textos, paginas = [], []
+    total_riscados = 0
+    for elemento in raiz.iter():
+        if elemento.tag not in (f"{{{_ODF_TEXT}}}p", f"{{{_ODF_TEXT}}}h"):
+            continue
+        texto = " ".join("".join(elemento.itertext()).split())
+        if not texto:
+            continue
+        tem_risco = elemento.get(f"{{{_ODF_TEXT}}}style-name") in riscados or any(
+            span.get(f"{{{_ODF_TEXT}}}style-name") in riscados
+            for span in elemento.iter(f"{{{_ODF_TEXT}}}span")
+        )
+        if tem_risco:
+            total_riscados += 1
+        else:
+            textos.append(texto)
+            paginas.append(None)
+    return _resultado(textos, paginas, total_riscados)
+
+
+class _ParserHTML(HTMLParser):
+    """
+    Coleta o texto dos blocos (p, li, h1-h6, div...) marcando os que têm
+    <s>/<del>/<strike>. Cada linha de tabela (tr) vira um bloco com as células
+    separadas por "|", como no texto tabular das tabelas DOCX (tabela_compacta).
+    """
+    BLOCOS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "div", "blockquote", "pre", "tr"}
+    CELULAS = {"td", "th"}
+    RISCADO = {"s", "strike", "del"}
+    IGNORAR = {"script", "style", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.blocos = []
+        self._atual = []
+        self._celulas = []
+        self._riscado = False
+        self._nivel_risco = 0
+        self._nivel_ignorar = 0
+        self._nivel_celula = 0
+
+    def _fechar_celula(self):
+        self._celulas.append(" ".join("".join(self._atual).split()).replace("|", "/"))
+        self._atual = []
+
+    def _fechar_bloco(self):
+        if self._celulas:
+            if "".join(self._atual).strip():
+                self._fechar_celula()
+            # Células vazias no fim da linha são omitidas, como nas tabelas DOCX
+            while self._celulas and not self._celulas[-1]:
+                self._celulas.pop()
+            texto = "|".join(self._celulas)
+        else:
+            texto = " ".join("".join(self._atual).split())
+        if texto:
+            self.blocos.append((texto, self._riscado))
+        self._atual = []
+        self._celulas = []
+        self._riscado = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.IGNORAR:
+            self._nivel_ignorar += 1
+        elif tag in self.CELULAS:
+            # Uma célula sem </td> termina onde a próxima começa
+            if self._nivel_celula:
+                self._fechar_celula()
+            self._nivel_celula = 1
+        elif tag in self.BLOCOS or tag == "br":
+            # Blocos dentro de uma célula (<td><p>...</p></td>) não quebram a linha da tabela
+            if self._nivel_celula:
+                self._atual.append(" ")
+            else:
+                self._fechar_bloco()
+        elif tag in self.RISCADO:
+            self._nivel_risco += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.IGNORAR:
+            self._nivel_ignorar = max(0, self._nivel_ignorar - 1)
+        elif tag in self.CELULAS:
+            if self._nivel_celula:
+                self._nivel_celula = 0
+                self._fechar_celula()
+        elif tag in self.BLOCOS:
+            if self._nivel_celula and tag != "tr":
+                self._atual.append(" ")
+            else:
+                # Uma linha encerra também as células sem </td>
+                self._nivel_celula = 0
+                self._fechar_bloco()
+        elif tag in self.RISCADO:
+            self._nivel_risco = max(0, self._nivel_risco - 1)
+
+    def handle_data(self, data):
+        if self._nivel_ignorar:
+            return
+        if self._nivel_risco and data.strip():
+            self._riscado = True
+        self._atual.append(data)
+
+
+def extrair_html(caminho: str) -> dict:
+    """HTML: um parágrafo por bloco; blocos com <s>, <del> ou <strike> contam como riscados."""
+    with open(caminho, "r", encoding="utf-8", errors="replace") as f:
+        parser = _ParserHTML()
+        parser.feed(f.read())
+        parser.close()
+    parser._fechar_bloco()
+    textos = [texto for texto, riscado in parser.blocos if not riscado]
+    total_riscados = sum(1 for _, riscado in parser.blocos if riscado)
+    return _resultado(textos, [None] * len(textos), total_riscados)
+
+
+def extrair_nativo(caminho: str) -> dict:
+    """Escolhe o extrator pelo formato do arquivo (exceto PDF, que passa pelo pdf2docx)."""
+    extensao = os.path.splitext(caminho)[1].lower()
+    try:
+        if extensao == ".docx":
+            # Import tardio para evitar ciclo: ferramentas importa este módulo
+            from tools.ferramentas import analisar_texto_riscado
+            return analisar_texto_riscado(caminho)
+        if extensao == ".odt":
+            return extrair_odt(caminho)
+        if extensao in (".html", ".htm"):
+            return extrair_html(caminho)
+        if extensao == ".txt":
+            return extrair_txt(caminho)
+    except Exception as e:
+        print(f"Erro ao extrair texto de {os.path.basename(caminho)}: {str(e)}")
+        return {"textos_normais": [], "erro": str(e)}
+    return {"textos_normais": [], "erro": f"Formato não suportado: {extensao}"}
@@ -1,16 +1,130 @@
 import os
-from pathlib import Path
-from pdf2docx import Converter
+import re
+import asyncio
+import collections
+import contextvars
+import threading
+import time
 from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from tools.referencias import (atribuir_ids, obter_paragrafo, buscar_por_localizacao, usar_armazem,
+                               indexar_registros, documento_indexado, remover_documento as remover_referencias,
+                               tamanho_dos_documentos)
+from tools.valores import TABELA_VALORES
+from tools.sentencas import registrar_documento as registrar_sentencas, remover_documento as remover_sentencas
+from tools.extratores import extrair_nativo
+from tools.conversao import POOL_CONVERSAO, ConversaoCancelada
+from tools.ocr import ocr_disponivel, triar_paginas, ocr_paginas, mesclar_ocr
+from tools.armazem import ArmazemParagrafos
+from tools.perfil import etapa
 
 # Configuração dos caminhos - usando variáveis de ambiente para flexibilidade
 BASE_PATH = os.getenv('DOCUMENTS_PATH', r"D:\cod\Arsae\Adk\Projeto_Adk_resolucoes\Adm_agentes\documentos")
+# Os DOCX gerados a partir de PDFs ficam em uma subpasta, para não serem
+# confundidos com documentos DOCX nativos colocados em BASE_PATH
+CONVERTIDOS_PATH = os.path.join(BASE_PATH, "convertidos")
+
+# Parágrafos extraídos de cada documento, em disco e lidos por mapeamento de memória
+ARMAZEM_PATH = os.path.join(BASE_PATH, "paragrafos")
+ARMAZEM = ArmazemParagrafos(ARMAZEM_PATH)
+# Os índices de referências e frases guardam só posições; os textos vêm do armazém
+usar_armazem(ARMAZEM)
+# Para corpora muito grandes (ex.: verificação de consistência de todo o acervo):
+# obter_dados_processados devolve só os totais de cada documento, sem os textos,
+# e os agentes leem os parágrafos por intervalo com obter_paragrafos()
+DADOS_SOMENTE_NO_ARMAZEM = os.getenv("DADOS_SOMENTE_NO_ARMAZEM", "0").lower() in ("1", "true", "sim")
+
+# Formatos aceitos, em ordem de preferência quando o mesmo documento existe em
+# mais de um formato: os nativos dispensam a conversão pdf2docx, a mais cara.
+FORMATOS_SUPORTADOS = [".docx", ".odt", ".html", ".htm", ".txt", ".pdf"]
+
+# Prazos (em segundos) das ferramentas; 0 desativa o limite.
+# PRAZO_CONVERSAO limita cada conversão pdf2docx, que roda em um processo separado
+# para poder ser encerrada. PRAZO_FERRAMENTA limita uma chamada inteira de
+# obter_dados_processados (verificado entre um arquivo e outro).
+PRAZO_CONVERSAO = float(os.getenv("PRAZO_CONVERSAO", "300"))
+PRAZO_FERRAMENTA = float(os.getenv("PRAZO_FERRAMENTA", "900"))
+
+# Cache dos arquivos já processados, indexado pelo nome e validado pela assinatura
+# (mtime + tamanho). Evita reconverter PDFs que não mudaram entre execuções.
+# Guarda o resultado sem os parágrafos e tabelas, que são lidos de volta do armazém.
+_CACHE_PROCESSAMENTO = {}
+
+# Análises em andamento que usam cada documento: quando a última termina, os
+# índices em memória dele (referências, frases e valores) são descartados
+_USOS_DOCUMENTOS = collections.Counter()
+
+# Um arquivo é processado por uma análise de cada vez: as demais esperam e
+# reaproveitam o resultado em cache, em vez de converter o mesmo PDF de novo
+_TRAVAS_DOCUMENTOS = {}
+_TRAVA_TRAVAS = threading.Lock()
+
+# Quando definido, restringe o processamento a um subconjunto dos PDFs (modo monitor).
+# Cada tarefa asyncio (análise) enxerga a sua própria seleção, o que permite
+# execuções concorrentes; asyncio.to_thread propaga o valor para as threads.
+_DOCUMENTOS_SELECIONADOS = contextvars.ContextVar("documentos_selecionados", default=None)
+
+# Sinal de cancelamento da chamada em andamento (ver obter_dados_processados_cancelavel)
+_CANCELAMENTO = contextvars.ContextVar("cancelamento_processamento", default=None)
+
+def _trava_documento(arquivo: str) -> threading.Lock:
+    with _TRAVA_TRAVAS:
+        return _TRAVAS_DOCUMENTOS.setdefault(arquivo, threading.Lock())
+
+def reter_documentos(documentos: list):
+    """Registra uma análise que vai usar os documentos (ver liberar_documentos)."""
+    with _TRAVA_TRAVAS:
+        _USOS_DOCUMENTOS.update(documentos)
+
+def liberar_documentos(documentos: list):
+    """
+    Encerra o uso dos documentos por uma análise. Documentos que nenhuma outra
+    análise usa saem dos índices em memória e têm o mapeamento do armazém
+    fechado; a próxima análise os reindexa a partir do armazém, sem extraí-los.
+    Bloqueia enquanto outra análise processa o mesmo arquivo.
+    """
+    for documento in set(documentos):
+        # Sob a trava do arquivo: obter_dados_processados não reindexa no meio da remoção
+        with _trava_documento(documento):
+            with _TRAVA_TRAVAS:
+                _USOS_DOCUMENTOS[documento] -= 1
+                if _USOS_DOCUMENTOS[documento] > 0:
+                    continue
+                del _USOS_DOCUMENTOS[documento]
+            remover_referencias(documento)
+            remover_sentencas(documento)
+            TABELA_VALORES.remover_documento(documento)
+            ARMAZEM.fechar(documento)
+
+def tamanho_estimado(documentos: list) -> int:
+    """
+    Tamanho do texto dos documentos, para o roteamento de modelo: o dos
+    índices em memória, o gravado no armazém para documentos ainda não
+    indexados nesta execução e, para os nunca processados, o tamanho do
+    arquivo (estimativa por cima: PDF e DOCX pesam mais que o texto deles).
+    """
+    total = 0
+    for documento in set(documentos):
+        tamanho = tamanho_dos_documentos([documento])
+        if not tamanho:
+            tamanho = ARMAZEM.tamanho_texto(documento)
+        if tamanho is None:
+            try:
+                tamanho = os.path.getsize(os.path.join(BASE_PATH, documento))
+            except OSError:
+                tamanho = 0
+        total += tamanho
+    return total
 
 # Verificar e criar diretórios se necessário
 def ensure_directories():
     """Garante que os diretórios necessários existam."""
     try:
         os.makedirs(BASE_PATH, exist_ok=True)
+        os.makedirs(CONVERTIDOS_PATH, exist_ok=True)
         return True
     except Exception as e:
         print(f"Erro ao criar diretórios: {str(e)}")
@@ -30,34 +144,271 @@ def list_pdfs() -> list:
         print(f"Erro ao listar arquivos: {str(e)}")
         return []
 
-def converter_pdf_para_docx(pdf_path: str, docx_path: str) -> bool:
+def list_documentos() -> list:
+    """
+    Lista os documentos disponíveis (PDF, DOCX, ODT, HTML e TXT), um arquivo por
+    documento: se o mesmo nome existir em mais de um formato, fica o formato
+    nativo de menor custo de extração em vez do PDF, desde que não seja mais
+    antigo que o PDF. Versões anteriores gravavam a conversão pdf2docx como
+    X.docx ao lado de X.pdf; um PDF atualizado depois dela volta a ser usado.
+    """
+    try:
+        if not os.path.exists(BASE_PATH):
+            print(f"Diretório {BASE_PATH} não existe.")
+            return []
+
+        por_nome = {}
+        for arquivo in sorted(os.listdir(BASE_PATH)):
+            nome_base, extensao = os.path.splitext(arquivo)
+            extensao = extensao.lower()
+            # Arquivos temporários do Word ("~$...") e formatos não suportados ficam de fora
+            if extensao not in FORMATOS_SUPORTADOS or arquivo.startswith("~$"):
+                continue
+            caminho = os.path.join(BASE_PATH, arquivo)
+            if not os.path.isfile(caminho):
+                continue
+            por_nome.setdefault(nome_base, []).append((FORMATOS_SUPORTADOS.index(extensao), os.path.getmtime(caminho), arquivo))
+
+        escolhidos = []
+        for versoes in por_nome.values():
+            mtime_pdf = max((mtime for ordem, mtime, _ in versoes if FORMATOS_SUPORTADOS[ordem] == ".pdf"), default=None)
+            atuais = [v for v in versoes if mtime_pdf is None or FORMATOS_SUPORTADOS[v[0]] == ".pdf" or v[1] >= mtime_pdf]
+            escolhidos.append(min(atuais)[2])
+        return sorted(escolhidos)
+
+    except Exception as e:
+        print(f"Erro ao listar arquivos: {str(e)}")
+        return []
+
+def assinatura_arquivo(caminho: str) -> tuple:
+    """Retorna (mtime_ns, tamanho) do arquivo, usada para detectar alterações."""
+    stat = os.stat(caminho)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def selecionar_documentos(documentos: list = None):
+    """
+    Restringe obter_dados_processados() aos documentos informados.
+    Passe None para voltar a considerar todos os documentos de BASE_PATH.
+    """
+    _DOCUMENTOS_SELECIONADOS.set(list(documentos) if documentos is not None else None)
+
+def documentos_selecionados() -> list:
+    """Lista os documentos que devem ser processados na execução atual."""
+    selecionados = _DOCUMENTOS_SELECIONADOS.get()
+    if selecionados is not None:
+        return list(selecionados)
+    return list_documentos()
+
+def localizar_paragrafo(paragrafo_id: str) -> dict:
+    """
+    Retorna documento, localização na estrutura da resolução (Artigo/Parágrafo/
+    Inciso/Alínea), página e texto de um parágrafo a partir do seu ID.
+
+    Args:
+        paragrafo_id (str): ID do parágrafo, como devolvido por obter_dados_processados
+    """
+    paragrafo = obter_paragrafo(paragrafo_id)
+    if paragrafo is None:
+        return {"erro": f"Parágrafo não encontrado: {paragrafo_id}"}
+    return {"id": paragrafo_id, **paragrafo}
+
+def buscar_dispositivo(documento: str, localizacao: str) -> dict:
+    """
+    Lista os IDs dos parágrafos de um dispositivo da resolução.
+
+    Args:
+        documento (str): Nome do arquivo PDF
+        localizacao (str): Dispositivo no formato "Artigo 5, Parágrafo 2" (ou "Artigo 5, Inciso III", etc.)
+    """
+    ids = buscar_por_localizacao(documento, localizacao)
+    if not ids:
+        return {"erro": f"Dispositivo não encontrado em {documento}: {localizacao}"}
+    return {"documento": documento, "localizacao": localizacao, "paragrafos": ids}
+
+def consultar_valores(entidade: str) -> dict:
+    """
+    Lista todos os valores monetários, percentuais e datas associados a uma
+    entidade (ex.: "tarifa de água", "multa", "reajuste"), agrupados por documento.
+    Útil para comparar rapidamente valores e prazos entre resoluções.
+
+    Args:
+        entidade (str): Termo que identifica a entidade; acentos e maiúsculas são ignorados
+    """
+    valores = TABELA_VALORES.consultar(entidade)
+    if not valores:
+        return {"entidade": entidade, "valores": {}, "observacao": "Nenhum valor encontrado para a entidade"}
+    return {"entidade": entidade, "valores": valores}
+
+def obter_paragrafos(documento: str, inicio: int = 0, quantidade: int = 200) -> dict:
+    """
+    Lê um intervalo de parágrafos de um documento já processado, direto do
+    armazém em disco, sem carregar o documento inteiro. As tabelas vêm depois
+    de todos os parágrafos.
+
+    Args:
+        documento (str): Nome do arquivo, como em list_documentos()
+        inicio (int): Posição do primeiro parágrafo (a partir de 0)
+        quantidade (int): Número máximo de parágrafos devolvidos
+    """
+    try:
+        assinatura = assinatura_arquivo(os.path.join(BASE_PATH, documento))
+    except OSError:
+        assinatura = None
+    # A trava impede que uma nova versão do documento feche o mapeamento no meio da leitura
+    with ARMAZEM.trava:
+        # Parágrafos gravados para uma versão anterior do arquivo não são devolvidos
+        mapeado = ARMAZEM.abrir(documento, assinatura)
+        if mapeado is None:
+            return {"erro": f"Documento não processado: {documento}. Chame obter_dados_processados() antes."}
+        inicio = max(0, int(inicio))
+        fim = min(len(mapeado), inicio + max(1, int(quantidade)))
+        return {
+            "documento": documento,
+            "inicio": inicio,
+            "total": len(mapeado),
+            "paragrafos": mapeado.fatia(inicio, fim),
+            "proximo": fim if fim < len(mapeado) else None,
+        }
+
+def documentos_processados(documentos: list = None) -> list:
+    """
+    Lista, entre os documentos informados (padrão: os selecionados), os que já
+    foram convertidos e extraídos com sucesso nesta execução do processo.
+    Não dispara nenhum processamento novo.
     """
-    Converte um arquivo PDF para DOCX.
+    documentos = documentos_selecionados() if documentos is None else documentos
+    return [
+        d for d in documentos
+        if d in _CACHE_PROCESSAMENTO and _CACHE_PROCESSAMENTO[d]["resultado"].get("analise") is not None
+        and "erro" not in _CACHE_PROCESSAMENTO[d]["resultado"]["analise"]
+    ]
+
+def converter_pdf_para_docx(pdf_path: str, docx_path: str, prazo: float = None) -> bool:
+    """
+    Converte um arquivo PDF para DOCX em um processo do POOL_CONVERSAO.
     
     Args:
         pdf_path (str): Caminho completo para o arquivo PDF
         docx_path (str): Caminho completo para o arquivo DOCX de saída
+        prazo (float): Tempo máximo em segundos (padrão PRAZO_CONVERSAO; 0 desativa)
     
     Returns:
         bool: True se a conversão foi bem-sucedida, False caso contrário
+
+    Raises:
+        TimeoutError: se a conversão não terminar dentro do prazo. O processo de
+            trabalho é encerrado antes da exceção ser lançada.
     """
+    return _converter(pdf_path, docx_path, prazo)["sucesso"]
+
+def _converter(pdf_path: str, docx_path: str, prazo: float = None, paginas: list = None,
+               cancelar: threading.Event = None) -> dict:
+    """
+    Converte (todas as páginas ou só `paginas`) e retorna o relatório do
+    POOL_CONVERSAO (sucesso, erro, duração e pico de RSS).
+    """
+    prazo = PRAZO_CONVERSAO if prazo is None else prazo
+    nome = os.path.basename(pdf_path)
+    if not os.path.exists(pdf_path):
+        print(f"Arquivo PDF não encontrado: {pdf_path}")
+        return {"sucesso": False, "erro": "Arquivo não encontrado"}
     try:
-        if not os.path.exists(pdf_path):
-            print(f"Arquivo PDF não encontrado: {pdf_path}")
-            return False
-            
-        cv = Converter(pdf_path)
-        cv.convert(docx_path)
-        cv.close()
-        print(f"PDF convertido com sucesso: {os.path.basename(pdf_path)}")
-        return True
+        relatorio = POOL_CONVERSAO.converter(pdf_path, docx_path, prazo=prazo or None, paginas=paginas,
+                                             cancelar=cancelar)
+    except TimeoutError:
+        print(f"Tempo esgotado ao converter PDF para DOCX ({nome})")
+        raise
+    except ConversaoCancelada:
+        print(f"Conversão de PDF para DOCX cancelada ({nome})")
+        raise
     except Exception as e:
-        print(f"Erro ao converter PDF para DOCX ({os.path.basename(pdf_path)}): {str(e)}")
-        return False
+        print(f"Erro ao converter PDF para DOCX ({nome}): {str(e)}")
+        return {"sucesso": False, "erro": str(e)}
+    if relatorio["sucesso"]:
+        print(f"PDF convertido com sucesso: {nome} ({relatorio['segundos']}s, pico de {relatorio['pico_rss_mb']} MB)")
+    else:
+        print(f"Erro ao converter PDF para DOCX ({nome}): {relatorio['erro']}")
+    if relatorio.get("reciclado"):
+        print(f"Processo de conversão reciclado: {relatorio['reciclado']}")
+    return relatorio
+
+def _texto_celula(celula) -> tuple:
+    """
+    Texto de uma célula de tabela, com os trechos riscados marcados como ~~trecho~~.
+    Retorna (texto, tem_risco).
+    """
+    partes = []
+    tem_risco = False
+    for paragrafo in celula.paragraphs:
+        trechos = []
+        for run in paragrafo.runs:
+            if not run.text:
+                continue
+            if run.font.strike and run.text.strip():
+                tem_risco = True
+                trechos.append(f"~~{run.text.strip()}~~")
+            else:
+                trechos.append(run.text)
+        texto = " ".join("".join(trechos).split())
+        if texto:
+            partes.append(texto)
+    return " ".join(partes), tem_risco
+
+def tabela_compacta(tabela) -> dict:
+    """
+    Converte uma tabela do python-docx em texto tabular compacto: uma linha por
+    linha da tabela, células separadas por "|". Células mescladas aparecem uma
+    única vez e células vazias no fim da linha são omitidas.
+    """
+    linhas = []
+    colunas = 0
+    celulas_riscadas = 0
+    for linha in tabela.rows:
+        celulas = []
+        anterior = None
+        for celula in linha.cells:
+            # Células mescladas horizontalmente se repetem em row.cells
+            if anterior is not None and celula._tc is anterior:
+                continue
+            anterior = celula._tc
+            texto, riscada = _texto_celula(celula)
+            celulas_riscadas += riscada
+            celulas.append(texto.replace("|", "/"))
+        while celulas and not celulas[-1]:
+            celulas.pop()
+        if celulas:
+            linhas.append("|".join(celulas))
+            colunas = max(colunas, len(celulas))
+    return {
+        "texto": "\n".join(linhas),
+        "linhas": len(linhas),
+        "colunas": colunas,
+        "celulas_riscadas": celulas_riscadas
+    }
+
+def linhas_para_valores(texto_tabela: str) -> list:
+    """
+    Reescreve cada linha de dados de uma tabela compacta como "cabeçalho valor; ...",
+    para que o valor de cada célula fique ligado à entidade da sua coluna.
+    Trechos riscados (~~trecho~~) são descartados.
+    """
+    linhas = [re.sub(r"~~.*?~~", "", linha).split("|") for linha in texto_tabela.splitlines()]
+    if len(linhas) < 2:
+        return ["; ".join(c.strip() for c in linha) for linha in linhas]
+    cabecalho = linhas[0]
+    return [
+        "; ".join(
+            f"{cabecalho[i].strip()} {celula.strip()}" if i < len(cabecalho) else celula.strip()
+            for i, celula in enumerate(linha)
+        )
+        for linha in linhas[1:]
+    ]
 
 def analisar_texto_riscado(docx_path: str) -> dict:
     """
-    Analisa o documento DOCX procurando por texto riscado.
+    Analisa o documento DOCX procurando por texto riscado. Parágrafos e tabelas
+    são lidos na ordem em que aparecem; as tabelas vão para "tabelas" em formato
+    compacto, com os trechos riscados de cada célula marcados como ~~trecho~~.
     
     Args:
         docx_path (str): Caminho para o arquivo DOCX
@@ -73,9 +424,27 @@ def analisar_texto_riscado(docx_path: str) -> dict:
         doc = Document(docx_path)
         textos_riscados = []
         textos_normais = []
+        paginas_normais = []
+        tabelas = []
+        pagina = 1
 
-        for paragraph in doc.paragraphs:
+        for elemento in doc.element.body.iterchildren():
+            if elemento.tag == qn("w:tbl"):
+                tabela = tabela_compacta(Table(elemento, doc))
+                if tabela["texto"]:
+                    # "posicao" = quantos parágrafos normais vieram antes da tabela
+                    tabela.update({"pagina": pagina, "posicao": len(textos_normais)})
+                    tabelas.append(tabela)
+                continue
+            if elemento.tag != qn("w:p"):
+                continue
+
+            paragraph = Paragraph(elemento, doc)
             texto = paragraph.text.strip()
+            pagina_paragrafo = pagina
+            # O pdf2docx abre uma seção por página do PDF; quebras de página explícitas também contam
+            if elemento.xpath('./w:pPr/w:sectPr') or elemento.xpath('.//w:br[@w:type="page"]'):
+                pagina += 1
             if not texto:
                 continue
 
@@ -90,12 +459,15 @@ def analisar_texto_riscado(docx_path: str) -> dict:
                 print(f"Texto riscado encontrado: {texto[:50]}...")
             else:
                 textos_normais.append(texto)
+                paginas_normais.append(pagina_paragrafo)
 
-        print(f"Análise completa - Textos riscados: {len(textos_riscados)}, Textos normais: {len(textos_normais)}")
+        print(f"Análise completa - Textos riscados: {len(textos_riscados)}, Textos normais: {len(textos_normais)}, Tabelas: {len(tabelas)}")
         
         return {
             #"textos_riscados": textos_riscados,
             "textos_normais": textos_normais,
+            "paginas_normais": paginas_normais,
+            "tabelas": tabelas,
             "total_paragrafos": len(textos_riscados) + len(textos_normais)
         }
 
@@ -103,54 +475,230 @@ def analisar_texto_riscado(docx_path: str) -> dict:
         print(f"Erro ao analisar documento DOCX: {str(e)}")
         return {"textos_riscados": [], "textos_normais": [], "erro": str(e)}
 
+def _aguardar_trava(trava: threading.Lock, restante: float = None, cancelar: threading.Event = None) -> bool:
+    """Adquire a trava do arquivo em até `restante` segundos, desistindo se `cancelar` for sinalizado."""
+    limite = time.monotonic() + restante if restante is not None else None
+    while True:
+        if cancelar is not None and cancelar.is_set():
+            return False
+        espera = 1.0 if limite is None else min(1.0, limite - time.monotonic())
+        if espera <= 0:
+            return False
+        if trava.acquire(timeout=espera):
+            return True
+
+def _registrar_indices(arquivo: str, paragrafos: list, tabelas: list):
+    # Valores, percentuais e datas vão para a tabela consultada por consultar_valores()
+    linhas_tabelas = [
+        {"id": tabela["id"], "texto": linha}
+        for tabela in tabelas
+        for linha in linhas_para_valores(tabela["texto"])
+    ]
+    TABELA_VALORES.registrar_paragrafos(arquivo, paragrafos + linhas_tabelas)
+    # Segmentação em frases feita uma única vez, compartilhada pelos agentes linguísticos
+    registrar_sentencas(arquivo, paragrafos)
+
+def _resultado_do_armazem(arquivo: str, em_cache: dict, assinatura: tuple):
+    """
+    Resultado em cache com os parágrafos e tabelas lidos de volta do armazém,
+    reindexando o documento se os índices dele tiverem sido descartados.
+    None se o armazém não tiver esta versão do arquivo.
+    """
+    with ARMAZEM.trava:
+        mapeado = ARMAZEM.abrir(arquivo, assinatura)
+        if mapeado is None:
+            return None
+        total_paragrafos = mapeado.metadados.get("paragrafos", 0)
+        indexado = documento_indexado(arquivo)
+        registros = ARMAZEM.fatiar(arquivo) if not indexado or not DADOS_SOMENTE_NO_ARMAZEM else []
+    paragrafos, tabelas = registros[:total_paragrafos], registros[total_paragrafos:]
+    if not indexado:
+        indexar_registros(arquivo, registros)
+        _registrar_indices(arquivo, paragrafos, tabelas)
+    resultado = dict(em_cache["resultado"])
+    if not DADOS_SOMENTE_NO_ARMAZEM:
+        resultado["analise"] = {**resultado["analise"], "paragrafos": paragrafos, "tabelas": tabelas}
+    return resultado
+
 def obter_dados_processados()-> dict:
     """
-    Processa todos os PDFs convertendo para DOCX e analisando o texto riscado.
+    Processa todos os documentos e analisa o texto riscado. PDFs são convertidos
+    para DOCX; DOCX, ODT, HTML e TXT são lidos diretamente, sem conversão.
+    Páginas de PDF sem camada de texto utilizável passam por OCR (tools.ocr) e
+    seus parágrafos são marcados com "fonte": "ocr".
+    Cada parágrafo é devolvido com um ID estável ("<documento>-p<ordem>") que os
+    agentes usam para referenciar os achados. Respeita PRAZO_FERRAMENTA: arquivos
+    que não couberem no prazo são marcados com "timeout" em vez de bloquear o
+    agente indefinidamente.
     
     Returns:
         dict: Dicionário com resultados do processamento de cada arquivo
     """
+    limite = time.monotonic() + PRAZO_FERRAMENTA if PRAZO_FERRAMENTA else None
+    cancelar = _CANCELAMENTO.get()
     # Garantir que os diretórios existam
     if not ensure_directories():
         return {"erro": "Não foi possível criar/acessar os diretórios necessários"}
     
     resultados = {}
-    arquivos_pdf = list_pdfs()
+    arquivos = documentos_selecionados()
     
-    if not arquivos_pdf:
-        return {"erro": "Nenhum arquivo PDF encontrado", "arquivos_processados": 0}
+    if not arquivos:
+        return {"erro": "Nenhum documento encontrado", "arquivos_processados": 0}
     
-    print(f"Encontrados {len(arquivos_pdf)} arquivos PDF para processar")
+    print(f"Encontrados {len(arquivos)} documentos para processar")
     
-    for arquivo_pdf in arquivos_pdf:
-        print(f"\nProcessando: {arquivo_pdf}")
-        
-        # Construir caminhos completos
-        pdf_path = os.path.join(BASE_PATH, arquivo_pdf)
-        nome_base = os.path.splitext(arquivo_pdf)[0]
-        docx_path = os.path.join(BASE_PATH, f"{nome_base}.docx")
-        
-        # Converter PDF para DOCX
-        sucesso_conversao = converter_pdf_para_docx(pdf_path, docx_path)
-        
-        if sucesso_conversao:
-            # Analisar texto riscado
-            resultado_analise = analisar_texto_riscado(docx_path)
-            resultados[arquivo_pdf] = {
-                "convertido": True,
-                "caminho_docx": docx_path,
-                "analise": resultado_analise
+    for arquivo in arquivos:
+        if cancelar is not None and cancelar.is_set():
+            print("Processamento cancelado pela análise que o pediu.")
+            break
+        print(f"\nProcessando: {arquivo}")
+
+        restante = limite - time.monotonic() if limite is not None else None
+        if restante is not None and restante <= 0:
+            resultados[arquivo] = {
+                "convertido": False,
+                "erro": "Prazo da ferramenta esgotado antes do processamento",
+                "timeout": True,
+                "analise": None
             }
-        else:
-            resultados[arquivo_pdf] = {
+            continue
+        
+        trava = _trava_documento(arquivo)
+        if not _aguardar_trava(trava, restante, cancelar):
+            resultados[arquivo] = {
                 "convertido": False,
-                "erro": "Falha na conversão",
+                "erro": "Prazo da ferramenta esgotado aguardando outra análise processar o mesmo arquivo",
+                "timeout": True,
                 "analise": None
             }
+            continue
+        try:
+            # Construir caminhos completos
+            caminho = os.path.join(BASE_PATH, arquivo)
+            nome_base, extensao = os.path.splitext(arquivo)
+            extensao = extensao.lower()
+
+            # Reaproveitar o resultado anterior se o arquivo não mudou
+            try:
+                assinatura = assinatura_arquivo(caminho)
+            except OSError:
+                assinatura = None
+            em_cache = _CACHE_PROCESSAMENTO.get(arquivo)
+            if assinatura is not None and em_cache and em_cache["assinatura"] == assinatura:
+                recuperado = _resultado_do_armazem(arquivo, em_cache, assinatura)
+                if recuperado is not None:
+                    print("Sem alterações desde o último processamento, usando cache.")
+                    resultados[arquivo] = recuperado
+                    continue
+
+            if extensao == ".pdf":
+                docx_path = os.path.join(CONVERTIDOS_PATH, f"{nome_base}.docx")
+                # Converter PDF para DOCX (o prazo da conversão nunca ultrapassa o da ferramenta)
+                prazo = PRAZO_CONVERSAO
+                if restante is not None:
+                    prazo = min(prazo, restante) if prazo else restante
+                # Triagem: páginas sem camada de texto utilizável (digitalizadas) vão
+                # para o OCR; o pdf2docx converte só as demais
+                triagem = triar_paginas(caminho) if ocr_disponivel() else None
+                paginas_ocr = [p["pagina"] for p in triagem if p["ocr"]] if triagem else []
+                paginas_texto = [p["pagina"] for p in triagem if not p["ocr"]] if triagem else []
+                resultado = {"formato": extensao, "convertido": False}
+                analise = {"textos_normais": [], "paginas_normais": [], "tabelas": [], "total_paragrafos": 0}
+                if paginas_ocr:
+                    print(f"Triagem: {len(paginas_ocr)} de {len(triagem)} páginas sem texto utilizável, enviadas ao OCR")
+                    resultado["triagem"] = {"paginas": len(triagem), "ocr": paginas_ocr}
+                if paginas_texto or not paginas_ocr:
+                    try:
+                        with etapa(f"conversao:{arquivo}"):
+                            conversao = _converter(caminho, docx_path, prazo=prazo,
+                                                   paginas=paginas_texto if paginas_ocr else None,
+                                                   cancelar=cancelar)
+                    except ConversaoCancelada as e:
+                        resultados[arquivo] = {"convertido": False, "erro": str(e), "cancelado": True, "analise": None}
+                        break
+                    except TimeoutError as e:
+                        resultados[arquivo] = {
+                            "convertido": False,
+                            "erro": str(e),
+                            "timeout": True,
+                            "analise": None
+                        }
+                        continue
+                    # Resumo da conversão: duração e pico de memória do processo de trabalho
+                    resumo_conversao = {"segundos": conversao.get("segundos"), "pico_rss_mb": conversao.get("pico_rss_mb")}
+                    if not conversao["sucesso"]:
+                        resultados[arquivo] = {
+                            "convertido": False,
+                            "erro": f"Falha na conversão: {conversao['erro']}",
+                            "conversao": resumo_conversao,
+                            "analise": None
+                        }
+                        continue
+                    with etapa(f"extracao:{arquivo}"):
+                        analise = analisar_texto_riscado(docx_path)
+                    resultado.update({"convertido": True, "caminho_docx": docx_path, "conversao": resumo_conversao})
+                if paginas_ocr and "erro" not in analise:
+                    restante = limite - time.monotonic() if limite is not None else None
+                    with etapa(f"ocr:{arquivo}"):
+                        ocr = ocr_paginas(caminho, paginas_ocr, prazo=max(restante, 0.01) if restante is not None else None,
+                                          cancelar=cancelar)
+                    if cancelar is not None and cancelar.is_set():
+                        resultados[arquivo] = {"convertido": False, "erro": "OCR cancelado", "cancelado": True, "analise": None}
+                        break
+                    analise = mesclar_ocr(analise, paginas_texto, ocr)
+            else:
+                # Formato nativo: extração direta, sem pdf2docx
+                with etapa(f"extracao:{arquivo}"):
+                    analise = extrair_nativo(caminho)
+                resultado = {"formato": extensao, "convertido": False}
+
+            # Atribuir IDs estáveis aos parágrafos
+            resultado_analise = atribuir_ids(arquivo, analise, ARMAZEM.prefixo(arquivo))
+            _registrar_indices(arquivo, resultado_analise.get("paragrafos", []), resultado_analise.get("tabelas", []))
+            if "erro" not in resultado_analise:
+                ARMAZEM.gravar(arquivo, resultado_analise, assinatura)
+                if DADOS_SOMENTE_NO_ARMAZEM:
+                    resultado_analise = {
+                        "total_paragrafos": resultado_analise.get("total_paragrafos"),
+                        "paragrafos": len(resultado_analise.get("paragrafos", [])),
+                        "tabelas": len(resultado_analise.get("tabelas", [])),
+                        "observacao": "Textos no armazém: use obter_paragrafos(documento, inicio, quantidade)",
+                    }
+            resultado["analise"] = resultado_analise
+            resultados[arquivo] = resultado
+            if assinatura is not None and "erro" not in resultado_analise:
+                sem_textos = resultado_analise
+                if not DADOS_SOMENTE_NO_ARMAZEM:
+                    sem_textos = {k: v for k, v in resultado_analise.items() if k not in ("paragrafos", "tabelas")}
+                _CACHE_PROCESSAMENTO[arquivo] = {
+                    "assinatura": assinatura,
+                    "resultado": {**resultado, "analise": sem_textos}
+                }
+        finally:
+            trava.release()
     
     print(f"\nProcessamento concluído. {len(resultados)} arquivos processados.")
     return {
         "arquivos_processados": len(resultados),
         "resultados": resultados,
         "sucesso": True
-    }
\ No newline at end of file
+    }
+
+async def obter_dados_processados_cancelavel() -> dict:
+    """
+    obter_dados_processados() em uma thread, para os agentes. Se a tarefa for
+    cancelada (ex.: asyncio.wait_for com o prazo da execução esgotado), a
+    thread é avisada: abandona a espera pela trava de um arquivo, encerra a
+    conversão em andamento e não começa o próximo arquivo.
+    """
+    cancelar = threading.Event()
+    # asyncio.to_thread leva o contexto atual (e este sinal) para a thread
+    token = _CANCELAMENTO.set(cancelar)
+    try:
+        return await asyncio.to_thread(obter_dados_processados)
+    except asyncio.CancelledError:
+        cancelar.set()
+        raise
+    finally:
+        _CANCELAMENTO.reset(token)
@@ -0,0 +1,295 @@
+import os
+import re
+import time
+import atexit
+import threading
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set
+
+# Triagem das páginas de PDFs digitalizados e OCR local só das páginas sem
+# camada de texto utilizável. Dependências opcionais: PyMuPDF (já instalado
+# com o pdf2docx) para ler e renderizar as páginas, e pytesseract + Pillow
+# (com o executável do Tesseract) para o OCR. Sem elas, tudo segue pelo
+# caminho normal de conversão.
+
+OCR_ATIVO = os.getenv("OCR_ATIVO", "1") not in ("0", "false", "")
+# Processos de OCR simultâneos
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+OCR_IDIOMA = os.getenv("OCR_IDIOMA", "por")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+# Uma página vai para o OCR se a camada de texto tiver menos caracteres que isto...
+OCR_MIN_CARACTERES = int(os.getenv("OCR_MIN_CARACTERES", "40"))
+# ...ou se a proporção de letras entre os caracteres visíveis for menor que isto
+# (fontes sem mapeamento Unicode geram texto com símbolos e caracteres de substituição)
+OCR_MIN_PROPORCAO_LETRAS = float(os.getenv("OCR_MIN_PROPORCAO_LETRAS", "0.6"))
+
+
+def _fitz():
+    try:
+        import fitz
+        return fitz
+    except ImportError:
+        try:
+            import pymupdf
+            return pymupdf
+        except ImportError:
+            return None
+
+
+_DISPONIVEL: Optional[bool] = None
+
+
+def ocr_disponivel() -> bool:
+    """True se o OCR está ativo e PyMuPDF, pytesseract, Pillow e o Tesseract estão instalados."""
+    global _DISPONIVEL
+    if _DISPONIVEL is None:
+        _DISPONIVEL = False
+        if OCR_ATIVO and _fitz() is not None:
+            try:
+                import pytesseract
+                import PIL  # noqa: F401
+                pytesseract.get_tesseract_version()
+                _DISPONIVEL = True
+            except Exception as e:
+                print(f"OCR indisponível, páginas digitalizadas seguem pela conversão normal: {e}")
+    return _DISPONIVEL
+
+
+def qualidade_texto(texto: str) -> Dict[str, Any]:
+    """Caracteres visíveis da camada de texto e a proporção deles que são letras."""
+    visiveis = [c for c in texto if not c.isspace()]
+    letras = sum(1 for c in visiveis if c.isalpha() and c != "�")
+    return {
+        "caracteres": len(visiveis),
+        "proporcao_letras": round(letras / len(visiveis), 2) if visiveis else 0.0,
+    }
+
+
+def triar_paginas(pdf_path: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Examina a camada de texto de cada página, sem converter o documento.
+
+    Returns:
+        list: {"pagina" (a partir de 1), "caracteres", "proporcao_letras",
+        "imagens", "ocr"} por página, com "ocr" True nas páginas sem texto
+        utilizável; None se o PyMuPDF não estiver instalado ou o PDF não abrir.
+    """
+    fitz = _fitz()
+    if fitz is None:
+        return None
+    try:
+        documento = fitz.open(pdf_path)
+    except Exception as e:
+        print(f"Triagem de páginas indisponível ({os.path.basename(pdf_path)}): {e}")
+        return None
+    paginas = []
+    try:
+        for indice, pagina in enumerate(documento, start=1):
+            qualidade = qualidade_texto(pagina.get_text("text"))
+            paginas.append({
+                "pagina": indice,
+                **qualidade,
+                "imagens": len(pagina.get_images(full=False)),
+                "ocr": (qualidade["caracteres"] < OCR_MIN_CARACTERES
+                        or qualidade["proporcao_letras"] < OCR_MIN_PROPORCAO_LETRAS),
+            })
+    finally:
+        documento.close()
+    return paginas
+
+
+def _ocr_pagina(pdf_path: str, pagina: int, idioma: str, dpi: int) -> str:
+    """Executado nos processos do pool: renderiza a página e aplica o Tesseract."""
+    import pytesseract
+    from PIL import Image
+
+    fitz = _fitz()
+    documento = fitz.open(pdf_path)
+    try:
+        imagem = documento[pagina - 1].get_pixmap(dpi=dpi)
+        figura = Image.frombytes("RGB", (imagem.width, imagem.height), imagem.samples)
+    finally:
+        documento.close()
+    return pytesseract.image_to_string(figura, lang=idioma)
+
+
+# Vagas de processo de OCR, compartilhadas pelos documentos processados ao mesmo tempo
+_VAGAS = threading.BoundedSemaphore(max(1, OCR_WORKERS))
+# Pools em uso, encerrados na saída do programa
+_EXECUTORES: Set[concurrent.futures.ProcessPoolExecutor] = set()
+
+
+def _interromper(executor: concurrent.futures.ProcessPoolExecutor):
+    """Cancela as páginas na fila e termina os processos, inclusive os que estão no meio de uma página."""
+    processos = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for processo in processos:
+        if processo.is_alive():
+            processo.terminate()
+    for processo in processos:
+        processo.join(timeout=5)
+
+
+def encerrar():
+    for executor in list(_EXECUTORES):
+        _interromper(executor)
+    _EXECUTORES.clear()
+
+
+atexit.register(encerrar)
+
+
+def _reservar_vagas(quantidade: int, limite: float = None, cancelar: threading.Event = None) -> int:
+    """
+    Reserva até `quantidade` vagas: espera pela primeira (até `limite`, em
+    time.monotonic(), ou até `cancelar`) e pega as demais só se estiverem
+    livres. Retorna o número de vagas reservadas (0 se desistiu).
+    """
+    while True:
+        if cancelar is not None and cancelar.is_set():
+            return 0
+        espera = 1.0 if limite is None else min(1.0, limite - time.monotonic())
+        if espera <= 0:
+            return 0
+        if _VAGAS.acquire(timeout=espera):
+            break
+    reservadas = 1
+    while reservadas < quantidade and _VAGAS.acquire(blocking=False):
+        reservadas += 1
+    return reservadas
+
+
+def ocr_paginas(pdf_path: str, paginas: List[int], prazo: float = None,
+                cancelar: threading.Event = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Aplica OCR às páginas indicadas, em paralelo em processos próprios do
+    documento (até OCR_WORKERS processos entre todos os documentos).
+
+    No fim do `prazo` (segundos) ou quando `cancelar` é sinalizado, as páginas
+    na fila são canceladas e os processos terminados, interrompendo também as
+    páginas em andamento.
+
+    Returns:
+        dict: página -> {"texto"} ou {"erro"}; páginas que não terminarem
+        a tempo voltam com erro.
+    """
+    nome = os.path.basename(pdf_path)
+    limite = time.monotonic() + prazo if prazo else None
+    resultados: Dict[int, Dict[str, Any]] = {}
+    vagas = _reservar_vagas(len(paginas), limite, cancelar)
+    if not vagas:
+        motivo = "OCR cancelado" if cancelar is not None and cancelar.is_set() else f"OCR excedeu o prazo de {prazo:g}s"
+        return {pagina: {"erro": motivo} for pagina in paginas}
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=vagas)
+    _EXECUTORES.add(executor)
+    motivo = None
+    try:
+        futuros = {executor.submit(_ocr_pagina, pdf_path, p, OCR_IDIOMA, OCR_DPI): p for p in paginas}
+        pendentes = set(futuros)
+        while pendentes:
+            # Espera em fatias de 1s para atender ao cancelamento
+            if cancelar is not None and cancelar.is_set():
+                motivo = "OCR cancelado"
+                break
+            espera = 1.0 if limite is None else min(1.0, limite - time.monotonic())
+            if espera <= 0:
+                motivo = f"OCR excedeu o prazo de {prazo:g}s"
+                break
+            feitos, pendentes = concurrent.futures.wait(
+                pendentes, timeout=espera, return_when=concurrent.futures.FIRST_COMPLETED)
+            for futuro in feitos:
+                pagina = futuros[futuro]
+                try:
+                    resultados[pagina] = {"texto": futuro.result()}
+                except BrokenProcessPool as e:
+                    resultados[pagina] = {"erro": f"Processo de OCR encerrado: {e}"}
+                except Exception as e:
+                    resultados[pagina] = {"erro": str(e)}
+        for pagina in paginas:
+            if pagina not in resultados:
+                resultados[pagina] = {"erro": motivo}
+    finally:
+        if motivo is not None:
+            _interromper(executor)
+        else:
+            executor.shutdown(wait=True)
+        _EXECUTORES.discard(executor)
+        for _ in range(vagas):
+            _VAGAS.release()
+    falhas = [p for p, r in resultados.items() if "erro" in r]
+    print(f"OCR concluído: {nome}, {len(paginas) - len(falhas)} de {len(paginas)} páginas"
+          + (f" (falhas nas páginas {sorted(falhas)})" if falhas else ""))
+    return resultados
+
+
+def paragrafos_ocr(texto: str) -> List[str]:
+    """
+    Divide o texto do OCR em parágrafos: blocos separados por linha em branco,
+    com as quebras de linha internas e hifenizações de fim de linha desfeitas.
+    """
+    paragrafos = []
+    for bloco in re.split(r"\n\s*\n", texto):
+        bloco = re.sub(r"(\w)-\n(\w)", r"\1\2", bloco)
+        paragrafo = " ".join(bloco.split())
+        # Linhas de um ou dois caracteres costumam ser ruído da digitalização
+        if len(paragrafo) > 2:
+            paragrafos.append(paragrafo)
+    return paragrafos
+
+
+def mesclar_ocr(analise: Dict[str, Any], paginas_convertidas: List[int],
+                ocr: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Junta o texto do OCR à análise da conversão, na ordem das páginas.
+
+    `analise` vem de analisar_texto_riscado sobre um DOCX com só as
+    `paginas_convertidas` (numeradas 1..n no DOCX); as páginas voltam à
+    numeração do PDF. Cada parágrafo recebe sua fonte em "fontes_normais"
+    ("texto" ou "ocr") e a análise ganha "fontes_paginas" com a fonte de cada
+    página; páginas cujo OCR falhou ficam como "ocr_falhou".
+    """
+    def pagina_original(pagina):
+        if not paginas_convertidas or pagina is None:
+            return pagina
+        return paginas_convertidas[min(pagina, len(paginas_convertidas)) - 1]
+
+    textos = analise.get("textos_normais", [])
+    paginas = analise.get("paginas_normais") or [None] * len(textos)
+    # (página no PDF, 0 = conversão / 1 = OCR, texto, fonte, índice na análise original)
+    itens = [(pagina_original(pagina), 0, texto, "texto", indice)
+             for indice, (texto, pagina) in enumerate(zip(textos, paginas))]
+    fontes_paginas = {pagina: "texto" for pagina in paginas_convertidas}
+    total_ocr = 0
+    for pagina, resultado in ocr.items():
+        if "erro" in resultado:
+            fontes_paginas[pagina] = "ocr_falhou"
+            continue
+        fontes_paginas[pagina] = "ocr"
+        for texto in paragrafos_ocr(resultado["texto"]):
+            itens.append((pagina, 1, texto, "ocr", None))
+            total_ocr += 1
+    # Ordenação estável: mantém a ordem original dentro de cada página
+    itens.sort(key=lambda item: (item[0] or 0, item[1]))
+
+    mesclada = dict(analise)
+    mesclada["textos_normais"] = [item[2] for item in itens]
+    mesclada["paginas_normais"] = [item[0] for item in itens]
+    mesclada["fontes_normais"] = [item[3] for item in itens]
+    mesclada["fontes_paginas"] = {str(p): fontes_paginas[p] for p in sorted(fontes_paginas)}
+    mesclada["total_paragrafos"] = analise.get("total_paragrafos", 0) + total_ocr
+    if mesclada.get("tabelas"):
+        # "posicao" (parágrafos antes da tabela) passa a contar também os do OCR
+        nova_ordem = {item[4]: n for n, item in enumerate(itens) if item[4] is not None}
+        tabelas = []
+        for tabela in mesclada["tabelas"]:
+            pagina = pagina_original(tabela.get("pagina"))
+            posicao = tabela.get("posicao", 0)
+            if posicao > 0 and posicao - 1 in nova_ordem:
+                posicao = nova_ordem[posicao - 1] + 1
+            else:
+                posicao = sum(1 for item in itens if (item[0] or 0) < (pagina or 0))
+            tabelas.append(dict(tabela, pagina=pagina, posicao=posicao))
+        mesclada["tabelas"] = tabelas
+    return mesclada
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Perfil por amostragem (--perfil no agent.py). Uma thread coleta, a cada
+# PERFIL_INTERVALO segundos, a pilha Python de todas as threads e a cadeia de
+# await das tarefas asyncio paradas dentro de uma etapa. Cada amostra é
+# atribuída à etapa mais interna ativa na pilha (etapas aninhadas formam um
+# caminho, ex.: "agente:Contradicao:gemini-2.5-flash;conversao:res.pdf").
+# Sem o perfil ativo, etapa() não faz nada.
+
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.01"))
+# Quantas funções aparecem no resumo de pontos quentes
+PERFIL_TOP = int(os.getenv("PERFIL_TOP", "25"))
+
+# Caminho das etapas ativas no contexto atual (propagado para asyncio.to_thread)
+_ETAPA = contextvars.ContextVar("etapa_perfil", default="")
+
+# Última função Python antes de uma chamada bloqueante: a thread está esperando, não usando CPU
+_FUNCOES_ESPERA = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("selectors.py", "select"), ("connection.py", "_recv"), ("connection.py", "_poll"),
+    ("connection.py", "poll"), ("socket.py", "readinto"), ("ssl.py", "read"), ("ssl.py", "recv_into"),
+}
+
+_PERFILADOR: Optional["Perfilador"] = None
+
+
+def _nome_quadro(quadro) -> str:
+    codigo = quadro.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})".replace(";", ",")
+
+
+def _em_espera(quadro) -> bool:
+    return (os.path.basename(quadro.f_code.co_filename), quadro.f_code.co_name) in _FUNCOES_ESPERA
+
+
+def _quadros_da_tarefa(tarefa) -> List[Any]:
+    """Quadros da cadeia de await de uma tarefa parada, da raiz para a folha."""
+    quadros = []
+    corrotina = tarefa.get_coro()
+    while corrotina is not None:
+        quadro = (getattr(corrotina, "cr_frame", None) or getattr(corrotina, "ag_frame", None)
+                  or getattr(corrotina, "gi_frame", None))
+        if quadro is not None:
+            quadros.append(quadro)
+        corrotina = (getattr(corrotina, "cr_await", None) or getattr(corrotina, "ag_await", None)
+                     or getattr(corrotina, "gi_yieldfrom", None))
+    return quadros
+
+
+class Perfilador:
+    """
+    Coletor das amostras. As pilhas ficam acumuladas no formato "folded"
+    (quadros separados por ";", da raiz para a folha), pronto para
+    flamegraph.pl, speedscope ou inferno.
+    """
+    def __init__(self, intervalo: float = PERFIL_INTERVALO):
+        self.intervalo = intervalo
+        self.cpu: Counter = Counter()
+        self.espera: Counter = Counter()
+        self.etapas: Dict[str, Dict[str, float]] = {}
+        # id do quadro que abriu a etapa -> caminho da etapa
+        self._quadros_etapa: Dict[int, str] = {}
+        self._tarefas: Counter = Counter()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.inicio = None
+        self.duracao = 0.0
+
+    # --- registro das etapas (chamado pelo código instrumentado) ---
+
+    def _entrar(self, quadro, caminho: str, tarefa):
+        self._quadros_etapa[id(quadro)] = caminho
+        if tarefa is not None:
+            with self._lock:
+                self._tarefas[tarefa] += 1
+
+    def _sair(self, quadro, caminho: str, tarefa, segundos: float):
+        self._quadros_etapa.pop(id(quadro), None)
+        with self._lock:
+            if tarefa is not None:
+                self._tarefas[tarefa] -= 1
+                if self._tarefas[tarefa] <= 0:
+                    del self._tarefas[tarefa]
+            estatistica = self.etapas.setdefault(caminho, {"chamadas": 0, "parede_s": 0.0})
+            estatistica["chamadas"] += 1
+            estatistica["parede_s"] += segundos
+
+    def incorporar(self, pilhas: Dict[str, int], caminho: str):
+        """Acrescenta amostras coletadas em outro processo (ex.: conversão pdf2docx) sob `caminho`."""
+        prefixo = ";".join(f"[{e}]" for e in caminho.split(";") if e)
+        with self._lock:
+            for pilha, quantidade in pilhas.items():
+                self.cpu[f"{prefixo};{pilha}" if prefixo else pilha] += quantidade
+
+    # --- amostragem ---
+
+    def _pilha(self, quadros: List[Any], etapas: Dict[int, str]) -> Tuple[str, str]:
+        """(caminho da etapa mais interna, pilha folded) para quadros da raiz para a folha."""
+        caminho = ""
+        for quadro in quadros:
+            caminho = etapas.get(id(quadro), caminho)
+        prefixo = [f"[{e}]" for e in caminho.split(";") if e]
+        return caminho, ";".join(prefixo + [_nome_quadro(q) for q in quadros])
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        etapas = self._quadros_etapa.copy()
+        em_execucao = set()
+        for thread_id, quadro in sys._current_frames().items():
+            if thread_id == proprio:
+                continue
+            quadros = []
+            while quadro is not None:
+                quadros.append(quadro)
+                em_execucao.add(id(quadro))
+                quadro = quadro.f_back
+            quadros.reverse()
+            caminho, pilha = self._pilha(quadros, etapas)
+            if _em_espera(quadros[-1]):
+                # Threads ociosas fora de qualquer etapa (ex.: o laço asyncio sem tarefa pronta) não contam
+                if caminho:
+                    self.espera[pilha] += 1
+            else:
+                self.cpu[pilha] += 1
+        with self._lock:
+            tarefas = list(self._tarefas)
+        for tarefa in tarefas:
+            try:
+                quadros = _quadros_da_tarefa(tarefa)
+            except Exception:
+                continue
+            # Tarefas em execução já foram contadas pela pilha da thread
+            if not quadros or id(quadros[0]) in em_execucao:
+                continue
+            caminho, pilha = self._pilha(quadros, etapas)
+            if caminho:
+                self.espera[pilha + ";[await]"] += 1
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self._amostrar()
+            except Exception:
+                # Uma amostra perdida não deve derrubar o perfil
+                pass
+
+    def iniciar(self) -> "Perfilador":
+        self.inicio = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="perfil", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duracao = time.monotonic() - self.inicio if self.inicio is not None else 0.0
+
+    # --- relatórios ---
+
+    def resumo(self, top: int = PERFIL_TOP) -> Dict[str, Any]:
+        """Tempo de parede, CPU e espera por etapa e as funções com mais amostras."""
+        cpu_etapa: Counter = Counter()
+        espera_etapa: Counter = Counter()
+        proprio: Counter = Counter()
+        inclusivo: Counter = Counter()
+        for pilhas, destino in ((self.cpu, cpu_etapa), (self.espera, espera_etapa)):
+            for pilha, quantidade in pilhas.items():
+                etapas = [q[1:-1] for q in pilha.split(";") if q.startswith("[") and q != "[await]"]
+                destino[";".join(etapas)] += quantidade
+        for pilha, quantidade in self.cpu.items():
+            funcoes = [q for q in pilha.split(";") if not q.startswith("[")]
+            if funcoes:
+                proprio[funcoes[-1]] += quantidade
+            for funcao in set(funcoes):
+                inclusivo[funcao] += quantidade
+
+        caminhos = set(self.etapas) | set(cpu_etapa) | set(espera_etapa)
+        etapas = {
+            caminho or "(fora de etapa)": {
+                "chamadas": self.etapas.get(caminho, {}).get("chamadas", 0),
+                "parede_s": round(self.etapas.get(caminho, {}).get("parede_s", 0.0), 3),
+                "cpu_s": round(cpu_etapa[caminho] * self.intervalo, 3),
+                "espera_s": round(espera_etapa[caminho] * self.intervalo, 3),
+            }
+            for caminho in sorted(caminhos)
+        }
+        return {
+            "intervalo_s": self.intervalo,
+            "duracao_s": round(self.duracao, 3),
+            "amostras_cpu": sum(self.cpu.values()),
+            "amostras_espera": sum(self.espera.values()),
+            "etapas": etapas,
+            "pontos_quentes": [
+                {"funcao": funcao, "proprio_s": round(n * self.intervalo, 3),
+                 "inclusivo_s": round(inclusivo[funcao] * self.intervalo, 3)}
+                for funcao, n in proprio.most_common(top)
+            ],
+        }
+
+    def salvar(self, pasta: str = "logs", top: int = PERFIL_TOP) -> Dict[str, str]:
+        """Grava <pasta>/perfil-<data>-cpu.folded, -espera.folded e .json; retorna os caminhos."""
+        os.makedirs(pasta, exist_ok=True)
+        base = os.path.join(pasta, f"perfil-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        arquivos = {"cpu": f"{base}-cpu.folded", "espera": f"{base}-espera.folded", "resumo": f"{base}.json"}
+        for chave in ("cpu", "espera"):
+            with open(arquivos[chave], "w", encoding="utf-8") as f:
+                for pilha, quantidade in sorted(getattr(self, chave).items()):
+                    f.write(f"{pilha} {quantidade}\n")
+        with open(arquivos["resumo"], "w", encoding="utf-8") as f:
+            json.dump(self.resumo(top), f, ensure_ascii=False, indent=2)
+        return arquivos
+
+
+class _Etapa:
+    def __init__(self, perfilador: Perfilador, nome: str):
+        self.perfilador = perfilador
+        self.nome = nome
+
+    def __enter__(self):
+        self._quadro = sys._getframe(1)
+        pai = _ETAPA.get()
+        self.caminho = f"{pai};{self.nome}" if pai else self.nome
+        self._token = _ETAPA.set(self.caminho)
+        try:
+            self._tarefa = asyncio.current_task()
+        except RuntimeError:
+            self._tarefa = None
+        self._inicio = time.monotonic()
+        self.perfilador._entrar(self._quadro, self.caminho, self._tarefa)
+        return self
+
+    def __exit__(self, *exc):
+        self.perfilador._sair(self._quadro, self.caminho, self._tarefa, time.monotonic() - self._inicio)
+        _ETAPA.reset(self._token)
+        self._quadro = None
+        return False
+
+
+class _SemEtapa:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_SEM_ETAPA = _SemEtapa()
+
+
+def etapa(nome: str):
+    """
+    Marca um trecho do fluxo (uso: `with etapa("conversao:res.pdf"):`), em
+    código síncrono, em threads ou em corrotinas. Nomes não devem conter ";".
+    """
+    if _PERFILADOR is None:
+        return _SEM_ETAPA
+    return _Etapa(_PERFILADOR, nome.replace(";", ","))
+
+
+def etapa_atual() -> str:
+    return _ETAPA.get()
+
+
+def perfilador() -> Optional[Perfilador]:
+    return _PERFILADOR
+
+
+def iniciar(intervalo: float = None) -> Perfilador:
+    global _PERFILADOR
+    _PERFILADOR = Perfilador(intervalo or PERFIL_INTERVALO).iniciar()
+    return _PERFILADOR
+
+
+def parar(pasta: str = "logs") -> Optional[Dict[str, str]]:
+    """Encerra a amostragem e grava os arquivos; retorna os caminhos (ou None se o perfil não estava ativo)."""
+    global _PERFILADOR
+    atual, _PERFILADOR = _PERFILADOR, None
+    if atual is None:
+        return None
+    atual.parar()
+    return atual.salvar(pasta)
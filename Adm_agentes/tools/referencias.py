@@ -0,0 +1,309 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from tools.estrutura import indexar_estrutura, formatar_localizacao
+from tools.sentencas import obter_sentenca
+
+# Índice global dos parágrafos extraídos:
+# id -> {"documento", "ordem", "localizacao", "pagina", "registro", "tamanho"}
+# (tabelas também têm "tabela", o número da tabela no documento).
+# Preenchido por obter_dados_processados e usado para expandir as referências
+# devolvidas pelos agentes de volta em trechos e localizações. Os textos não
+# ficam na memória: "registro" é a posição do parágrafo no armazém em disco
+# (ver usar_armazem) e "tamanho" o seu número de caracteres.
+_INDICE_PARAGRAFOS: Dict[str, Dict[str, Any]] = {}
+
+# Índice reverso: (documento, localizacao) -> IDs dos parágrafos do dispositivo
+_INDICE_LOCALIZACOES: Dict[tuple, List[str]] = {}
+
+# Os índices são atualizados pelas threads de obter_dados_processados de
+# análises concorrentes; atualizações e varreduras passam por esta trava
+_TRAVA_INDICES = threading.RLock()
+
+# Armazém (tools.armazem.ArmazemParagrafos) de onde os textos são lidos. Sem
+# armazém, o índice guarda os textos na memória, como "texto".
+_ARMAZEM = None
+
+
+def usar_armazem(armazem):
+    """Passa a ler os textos dos parágrafos indexados do armazém informado."""
+    global _ARMAZEM
+    _ARMAZEM = armazem
+
+# Para cada agente: lista de achados e, para cada referência do achado,
+# (sufixo dos campos compactos, campo do documento, campo da localização, campo do trecho).
+EXPANSOES = {
+    "Contradicao": ("contradicoes", [
+        ("_1", "documento_1", "localizacao_1", "trecho_1"),
+        ("_2", "documento_2", "localizacao_2", "trecho_2"),
+    ]),
+    "OrtografiaGramatica": ("erros", [("", "documento", "localizacao", "trecho_original")]),
+    "Ambiguidade": ("ambiguidades", [("", "documento", "localizacao", "trecho")]),
+}
+
+
+def id_documento(documento: str) -> str:
+    """
+    Prefixo curto e estável do documento (não depende da ordem de processamento).
+    Com 6 dígitos hexadecimais, acervos grandes têm colisões: os IDs gravados
+    usam o prefixo único do armazém (ArmazemParagrafos.prefixo), que parte deste.
+    """
+    return hashlib.sha1(documento.encode("utf-8")).hexdigest()[:6]
+
+
+def atribuir_ids(documento: str, analise: dict, prefixo: Optional[str] = None) -> dict:
+    """
+    Troca a lista "textos_normais" da análise por "paragrafos" com IDs estáveis
+    no formato "<documento>-p<ordem>", anexa a cada um sua localização na
+    estrutura da resolução e a página, e registra tudo nos índices. Parágrafos
+    obtidos por OCR ("fontes_normais") recebem "fonte": "ocr". `prefixo`
+    (padrão: id_documento) identifica o documento nos IDs.
+    """
+    if not analise or "textos_normais" not in analise:
+        return analise
+    textos = analise["textos_normais"]
+    paginas = analise.get("paginas_normais") or [None] * len(textos)
+    fontes = analise.get("fontes_normais") or ["texto"] * len(textos)
+    prefixo = prefixo or id_documento(documento)
+    estruturas = indexar_estrutura(textos)
+
+    # Troca as entradas da versão anterior do documento de uma vez, sem que uma
+    # consulta concorrente veja o índice pela metade
+    with _TRAVA_INDICES:
+        # Descarta entradas de uma versão anterior do mesmo documento
+        remover_documento(documento)
+
+        paragrafos = []
+        for ordem, (texto, estrutura, pagina, fonte) in enumerate(zip(textos, estruturas, paginas, fontes), start=1):
+            paragrafo_id = f"{prefixo}-p{ordem}"
+            localizacao = formatar_localizacao(estrutura)
+            _INDICE_PARAGRAFOS[paragrafo_id] = _entrada(documento, ordem, localizacao, pagina, ordem - 1, texto, fonte=fonte)
+            if localizacao:
+                _INDICE_LOCALIZACOES.setdefault((documento, localizacao), []).append(paragrafo_id)
+            paragrafo = {"id": paragrafo_id, "loc": localizacao, "pag": pagina, "texto": texto}
+            # Só o que não veio da camada de texto é marcado, para não inflar a saída
+            if fonte != "texto":
+                paragrafo["fonte"] = fonte
+            paragrafos.append(paragrafo)
+        analise = {k: v for k, v in analise.items() if k not in ("textos_normais", "paginas_normais", "fontes_normais")}
+        analise["paragrafos"] = paragrafos
+        if analise.get("tabelas"):
+            analise["tabelas"] = _atribuir_ids_tabelas(documento, prefixo, analise["tabelas"], estruturas)
+    return analise
+
+
+def _entrada(documento: str, ordem: int, localizacao: str, pagina: Any, registro: int, texto: str, **extras) -> dict:
+    entrada = {"documento": documento, "ordem": ordem, "localizacao": localizacao, "pagina": pagina,
+               "registro": registro, "tamanho": len(texto), **extras}
+    if _ARMAZEM is None:
+        entrada["texto"] = texto
+    return entrada
+
+
+def indexar_registros(documento: str, registros: List[Dict[str, Any]]):
+    """
+    Reconstrói as entradas de um documento a partir dos registros do armazém
+    (ArmazemParagrafos.fatiar), sem extrair o documento de novo.
+    """
+    with _TRAVA_INDICES:
+        remover_documento(documento)
+        for posicao, registro in enumerate(registros):
+            tipo, numero = registro["id"].rsplit("-", 1)[1][0], int(registro["id"].rsplit("-", 1)[1][1:])
+            if tipo == "t":
+                entrada = _entrada(documento, 0, registro["loc"], registro["pag"], posicao, registro["texto"], tabela=numero)
+            else:
+                entrada = _entrada(documento, numero, registro["loc"], registro["pag"], posicao, registro["texto"],
+                                   fonte=registro.get("fonte", "texto"))
+            _INDICE_PARAGRAFOS[registro["id"]] = entrada
+            if registro["loc"]:
+                _INDICE_LOCALIZACOES.setdefault((documento, registro["loc"]), []).append(registro["id"])
+
+
+def remover_documento(documento: str):
+    """Descarta as entradas de um documento (nova versão, ou fim das análises que o usavam)."""
+    with _TRAVA_INDICES:
+        for chave in [c for c in _INDICE_LOCALIZACOES if c[0] == documento]:
+            del _INDICE_LOCALIZACOES[chave]
+        for chave in [c for c, p in _INDICE_PARAGRAFOS.items() if p["documento"] == documento]:
+            del _INDICE_PARAGRAFOS[chave]
+
+
+def documento_indexado(documento: str) -> bool:
+    with _TRAVA_INDICES:
+        return any(p["documento"] == documento for p in _INDICE_PARAGRAFOS.values())
+
+
+def _atribuir_ids_tabelas(documento: str, prefixo: str, tabelas: List[dict], estruturas: List[Dict[str, str]]) -> List[dict]:
+    """
+    Tabelas recebem IDs "<documento>-t<n>" e herdam a localização do último
+    parágrafo anterior a elas, ex.: "Artigo 3, Tabela 1".
+    """
+    compactas = []
+    # No armazém, as tabelas vêm depois de todos os parágrafos
+    primeiro_registro = len(estruturas)
+    for numero, tabela in enumerate(tabelas, start=1):
+        tabela_id = f"{prefixo}-t{numero}"
+        posicao = tabela.get("posicao", 0)
+        anterior = formatar_localizacao(estruturas[posicao - 1]) if 0 < posicao <= len(estruturas) else ""
+        localizacao = f"{anterior}, Tabela {numero}" if anterior else f"Tabela {numero}"
+        _INDICE_PARAGRAFOS[tabela_id] = _entrada(documento, posicao, localizacao, tabela.get("pagina"),
+                                                 primeiro_registro + numero - 1, tabela["texto"], tabela=numero)
+        _INDICE_LOCALIZACOES.setdefault((documento, localizacao), []).append(tabela_id)
+        compactas.append({"id": tabela_id, "loc": localizacao, "pag": tabela.get("pagina"), "texto": tabela["texto"]})
+    return compactas
+
+
+def _textos(documento: str, entradas: List[tuple]) -> Dict[str, str]:
+    """Textos das entradas (id, dados) de um documento, lidos do armazém em um único intervalo."""
+    if _ARMAZEM is None or not entradas:
+        return {paragrafo_id: dados.get("texto", "") for paragrafo_id, dados in entradas}
+    inicio = min(dados["registro"] for _, dados in entradas)
+    fim = max(dados["registro"] for _, dados in entradas) + 1
+    # Registros de outra versão do documento não batem com os IDs e ficam de fora
+    lidos = {r["id"]: r["texto"] for r in _ARMAZEM.fatiar(documento, inicio, fim)}
+    return {paragrafo_id: lidos.get(paragrafo_id, "") for paragrafo_id, _ in entradas}
+
+
+def texto_paragrafo(paragrafo_id: str) -> Optional[str]:
+    """Texto de um parágrafo (ou tabela) indexado, ou None se o ID não estiver no índice."""
+    dados = _INDICE_PARAGRAFOS.get(paragrafo_id)
+    if dados is None:
+        return None
+    return _textos(dados["documento"], [(paragrafo_id, dados)])[paragrafo_id]
+
+
+def texto_sentencas(sentencas: List[Dict[str, Any]]) -> List[str]:
+    """Textos das frases (ver sentencas_dos_documentos), recortados dos parágrafos que as contêm."""
+    paragrafos: Dict[str, str] = {}
+    textos = []
+    for sentenca in sentencas:
+        if sentenca["paragrafo"] not in paragrafos:
+            paragrafos[sentenca["paragrafo"]] = texto_paragrafo(sentenca["paragrafo"]) or ""
+        textos.append(paragrafos[sentenca["paragrafo"]][sentenca["inicio"]:sentenca["fim"]])
+    return textos
+
+
+def obter_paragrafo(paragrafo_id: str) -> Optional[Dict[str, Any]]:
+    """Retorna documento, ordem, localização, página e texto de um parágrafo (ou tabela) pelo seu ID."""
+    dados = _INDICE_PARAGRAFOS.get(paragrafo_id)
+    if dados is None:
+        return None
+    publicos = {k: v for k, v in dados.items() if k not in ("registro", "tamanho")}
+    return {**publicos, "texto": texto_paragrafo(paragrafo_id) or ""}
+
+
+def localizacao_paragrafo(paragrafo_id: str) -> str:
+    """
+    Descrição legível da posição do parágrafo no documento, ex.:
+    "Artigo 5, Parágrafo 2 (página 3)". Parágrafos fora de qualquer artigo
+    (preâmbulo, ementa) são descritos pela ordem de extração.
+    """
+    paragrafo = _INDICE_PARAGRAFOS.get(paragrafo_id)
+    if paragrafo is None:
+        return ""
+    localizacao = paragrafo.get("localizacao") or f"Parágrafo {paragrafo['ordem']} do texto"
+    if paragrafo.get("pagina"):
+        localizacao += f" (página {paragrafo['pagina']})"
+    return localizacao
+
+
+def buscar_por_localizacao(documento: str, localizacao: str) -> List[str]:
+    """IDs dos parágrafos de um dispositivo, ex.: ("res.pdf", "Artigo 5, Parágrafo 2")."""
+    with _TRAVA_INDICES:
+        return list(_INDICE_LOCALIZACOES.get((documento, localizacao.strip()), []))
+
+
+def _com_textos(documentos: List[str], tabelas: bool) -> List[Dict[str, Any]]:
+    """Entradas (parágrafos ou tabelas) dos documentos, com os textos lidos do armazém."""
+    alvo = set(documentos)
+    with _TRAVA_INDICES:
+        entradas = [
+            (paragrafo_id, dados) for paragrafo_id, dados in _INDICE_PARAGRAFOS.items()
+            if dados["documento"] in alvo and ("tabela" in dados) == tabelas
+        ]
+    itens = []
+    for documento in documentos:
+        do_documento = [e for e in entradas if e[1]["documento"] == documento]
+        textos = _textos(documento, do_documento)
+        itens.extend(
+            {"id": paragrafo_id, **{k: v for k, v in dados.items() if k not in ("registro", "tamanho")},
+             "texto": textos[paragrafo_id]}
+            for paragrafo_id, dados in sorted(do_documento, key=lambda e: e[1]["registro"])
+        )
+    return itens
+
+
+def paragrafos_dos_documentos(documentos: List[str]) -> List[Dict[str, Any]]:
+    """Parágrafos indexados dos documentos informados, na ordem de extração (sem as tabelas)."""
+    return _com_textos(documentos, tabelas=False)
+
+
+def tabelas_dos_documentos(documentos: List[str]) -> List[Dict[str, Any]]:
+    """Tabelas indexadas dos documentos informados, na ordem de extração."""
+    return _com_textos(documentos, tabelas=True)
+
+
+def tamanho_dos_documentos(documentos: List[str]) -> int:
+    """Total de caracteres dos parágrafos e tabelas indexados dos documentos (0 se ainda não processados)."""
+    alvo = set(documentos)
+    with _TRAVA_INDICES:
+        return sum(dados["tamanho"] for dados in _INDICE_PARAGRAFOS.values() if dados["documento"] in alvo)
+
+
+def _recortar(texto: str, inicio: Any, fim: Any) -> str:
+    """Recorta o trecho citado; spans inválidos devolvem o parágrafo inteiro."""
+    if isinstance(inicio, int) and isinstance(fim, int) and 0 <= inicio < fim <= len(texto):
+        return texto[inicio:fim]
+    return texto
+
+
+def expandir_achado(achado: dict, referencias: list) -> dict:
+    """
+    Preenche documento, localização e trecho de um achado a partir dos IDs.
+    O ID pode ser de um parágrafo ou de uma frase ("<parágrafo>-s<n>"); no
+    segundo caso o intervalo é relativo à frase.
+    """
+    expandido = dict(achado)
+    for sufixo, campo_doc, campo_loc, campo_trecho in referencias:
+        referencia_id = achado.get(f"paragrafo{sufixo}")
+        if not isinstance(referencia_id, str):
+            continue
+        inicio, fim = achado.get(f"inicio{sufixo}"), achado.get(f"fim{sufixo}")
+        paragrafo_id = referencia_id
+        sentenca = obter_sentenca(referencia_id)
+        if sentenca is not None:
+            paragrafo_id = sentenca["paragrafo"]
+        paragrafo = _INDICE_PARAGRAFOS.get(paragrafo_id)
+        if paragrafo is None:
+            continue
+        expandido.setdefault(campo_doc, paragrafo["documento"])
+        expandido.setdefault(campo_loc, localizacao_paragrafo(paragrafo_id))
+        if campo_trecho not in expandido:
+            texto_base = texto_paragrafo(paragrafo_id) or ""
+            if sentenca is not None:
+                texto_base = texto_base[sentenca["inicio"]:sentenca["fim"]]
+            expandido[campo_trecho] = _recortar(texto_base, inicio, fim)
+    return expandido
+
+
+def expandir_resultados(resultados: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Expande as respostas compactas dos agentes (já interpretadas como dict)
+    para o formato completo gravado em resultados_analise_final.json.
+    Agentes sem expansão definida ou respostas que não são dict ficam inalterados.
+    """
+    expandidos = {}
+    for agente, resultado in resultados.items():
+        if agente not in EXPANSOES or not isinstance(resultado, dict):
+            expandidos[agente] = resultado
+            continue
+        campo_lista, referencias = EXPANSOES[agente]
+        achados = resultado.get(campo_lista)
+        resultado = dict(resultado)
+        if isinstance(achados, list):
+            resultado[campo_lista] = [
+                expandir_achado(a, referencias) if isinstance(a, dict) else a for a in achados
+            ]
+        expandidos[agente] = resultado
+    return expandidos
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+# Abreviações comuns em resoluções que terminam em ponto sem encerrar a frase
+ABREVIACOES = {
+    "art", "arts", "inc", "incs", "al", "par", "cap", "tit", "sec", "n", "nº", "no", "nos",
+    "p", "pp", "pág", "pag", "fl", "fls", "res", "dec", "lei", "port", "of", "proc",
+    "sr", "sra", "srs", "dr", "dra", "prof", "eng", "exmo", "exma", "ilmo", "ilma",
+    "ex", "obs", "cf", "vol", "ed", "av", "r", "km", "min", "máx", "mín", "aprox",
+    "ltda", "cia", "s.a", "i.e", "e.g", "jan", "fev", "mar", "abr", "mai", "jun",
+    "jul", "ago", "set", "out", "nov", "dez",
+}
+
+# Candidato a fim de frase: pontuação final seguida de espaço e início de nova frase
+_FIM = re.compile(r"(\.{3}|[.!?])[\"'”»)]*\s+(?=[\"'“«(]?[A-ZÀ-Ú0-9§])")
+_ULTIMO_TOKEN = re.compile(r"(\S+)$")
+_ROMANO_OU_NUMERO = re.compile(r"^(?:[IVXLC]+|\d{1,3}|[a-z])$")
+
+# Sentenças segmentadas por documento: documento -> lista de sentenças
+# {"id", "paragrafo", "inicio", "fim", "hash"}. O texto não fica na memória:
+# é recortado do parágrafo (referencias.texto_sentencas) quando necessário.
+_SENTENCAS: Dict[str, List[Dict[str, Any]]] = {}
+# Índice id da sentença -> sentença
+_INDICE_SENTENCAS: Dict[str, Dict[str, Any]] = {}
+
+# Segmentação e cache em disco são compartilhados pelas análises concorrentes
+# (e pelos dois agentes linguísticos de cada análise)
+_TRAVA = threading.RLock()
+
+ARQUIVO_CACHE = os.getenv("CACHE_SENTENCAS", os.path.join("logs", "sentencas_analisadas.json"))
+
+
+def _fim_valido(texto: str, posicao_ponto: int) -> bool:
+    """Decide se a pontuação em `posicao_ponto` encerra mesmo a frase."""
+    if texto[posicao_ponto] != ".":
+        return True
+    anterior = _ULTIMO_TOKEN.search(texto[:posicao_ponto])
+    if not anterior:
+        return False
+    token = anterior.group(1).lstrip("(\"'“«")
+    # "Art.", "§ 2º.", "inc.", iniciais ("J.") e marcadores de lista ("1.", "IV.", "a.")
+    if token.lower().rstrip(".") in ABREVIACOES or token.startswith("§"):
+        return False
+    if len(token) == 1 and token.isupper():
+        return False
+    if _ROMANO_OU_NUMERO.match(token) and (anterior.start() == 0 or texto[:anterior.start()].rstrip()[-1:] in (";", ":")):
+        return False
+    return True
+
+
+def segmentar(texto: str) -> List[tuple]:
+    """
+    Divide um parágrafo em frases, respeitando abreviações jurídicas ("Art.",
+    "inc.", "§"), iniciais e listas numeradas. Retorna (inicio, fim, frase),
+    com os deslocamentos relativos ao parágrafo.
+    """
+    frases = []
+    inicio = 0
+    for m in _FIM.finditer(texto):
+        if not _fim_valido(texto, m.start(1)):
+            continue
+        fim = m.start(1) + len(m.group(1))
+        # Inclui aspas/parênteses de fechamento na frase
+        while fim < len(texto) and texto[fim] in "\"'”»)":
+            fim += 1
+        if texto[inicio:fim].strip():
+            frases.append((inicio, fim, texto[inicio:fim]))
+        inicio = m.end()
+    if texto[inicio:].strip():
+        frases.append((inicio, len(texto.rstrip()), texto[inicio:].rstrip()))
+    return frases
+
+
+def _hash_sentenca(documento: str, texto: str) -> str:
+    return hashlib.sha1(f"{documento}\x00{' '.join(texto.split())}".encode("utf-8")).hexdigest()[:16]
+
+
+def registrar_documento(documento: str, paragrafos: List[dict]):
+    """
+    Segmenta uma única vez os parágrafos ({"id", "texto"}) de um documento e
+    guarda as frases com IDs "<id do parágrafo>-s<n>" e seus deslocamentos no parágrafo.
+    """
+    sentencas = []
+    for paragrafo in paragrafos:
+        for n, (inicio, fim, frase) in enumerate(segmentar(paragrafo["texto"]), start=1):
+            sentencas.append({
+                "id": f"{paragrafo['id']}-s{n}",
+                "paragrafo": paragrafo["id"],
+                "inicio": inicio,
+                "fim": fim,
+                "hash": _hash_sentenca(documento, frase),
+            })
+    with _TRAVA:
+        remover_documento(documento)
+        _INDICE_SENTENCAS.update((s["id"], s) for s in sentencas)
+        _SENTENCAS[documento] = sentencas
+
+
+def remover_documento(documento: str):
+    with _TRAVA:
+        for antiga in _SENTENCAS.pop(documento, []):
+            _INDICE_SENTENCAS.pop(antiga["id"], None)
+
+
+def obter_sentenca(sentenca_id: str) -> Optional[Dict[str, Any]]:
+    return _INDICE_SENTENCAS.get(sentenca_id)
+
+
+def sentencas_dos_documentos(documentos: List[str]) -> List[Dict[str, Any]]:
+    """Frases dos documentos informados, na ordem de extração."""
+    with _TRAVA:
+        return [s for doc in documentos for s in _SENTENCAS.get(doc, [])]
+
+
+def _ler_cache() -> Dict[str, Dict[str, List[dict]]]:
+    """
+    Cache em disco: agente -> hash da frase -> achados do agente na frase. O
+    formato antigo (agente -> lista de hashes, sem os achados) é descartado,
+    para que essas frases sejam analisadas de novo.
+    """
+    try:
+        with _TRAVA, open(ARQUIVO_CACHE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return {agente: frases for agente, frases in cache.items() if isinstance(frases, dict)}
+
+
+def filtrar_novas(agente: str, sentencas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Remove as frases que o agente já analisou em execuções anteriores (mesmo texto, mesmo documento)."""
+    analisadas = _ler_cache().get(agente, {})
+    return [s for s in sentencas if s["hash"] not in analisadas]
+
+
+def achados_anteriores(agente: str, sentencas: List[Dict[str, Any]],
+                       campo_referencia: str = "paragrafo") -> List[dict]:
+    """
+    Achados registrados pelo agente para as frases já analisadas, com a
+    referência apontando para o ID atual da frase (os deslocamentos são
+    relativos à frase e continuam valendo).
+    """
+    analisadas = _ler_cache().get(agente, {})
+    achados = []
+    for sentenca in sentencas:
+        for achado in analisadas.get(sentenca["hash"], []):
+            achados.append(achado if campo_referencia in achado else {campo_referencia: sentenca["id"], **achado})
+    return achados
+
+
+def marcar_analisadas(agente: str, sentencas: List[Dict[str, Any]], achados: List[dict] = (),
+                      campo_referencia: str = "paragrafo"):
+    """
+    Registra no cache em disco as frases analisadas com sucesso pelo agente e
+    os achados de cada uma, sem o ID da frase (que muda quando o documento
+    muda). Um achado que não cita uma frase do lote fica com a referência
+    original, junto da primeira frase do lote.
+    """
+    por_id = {s["id"]: s["hash"] for s in sentencas}
+    novas: Dict[str, List[dict]] = {s["hash"]: [] for s in sentencas}
+    for achado in achados:
+        if not isinstance(achado, dict) or not sentencas:
+            continue
+        referencia = achado.get(campo_referencia)
+        if isinstance(referencia, str) and referencia in por_id:
+            novas[por_id[referencia]].append({k: v for k, v in achado.items() if k != campo_referencia})
+        else:
+            novas[sentencas[0]["hash"]].append(achado)
+    # Ler, atualizar e regravar sob a trava: os dois agentes linguísticos gravam ao mesmo tempo
+    with _TRAVA:
+        cache = _ler_cache()
+        cache.setdefault(agente, {}).update(novas)
+        try:
+            os.makedirs(os.path.dirname(ARQUIVO_CACHE) or ".", exist_ok=True)
+            with open(ARQUIVO_CACHE + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(ARQUIVO_CACHE + ".tmp", ARQUIVO_CACHE)
+        except OSError as e:
+            print(f"Não foi possível salvar o cache de sentenças: {e}")
+
+
+def lotes(sentencas: List[Dict[str, Any]], tamanho: int) -> List[List[Dict[str, Any]]]:
+    """Divide as frases em lotes de no máximo `tamanho` frases."""
+    return [sentencas[i:i + tamanho] for i in range(0, len(sentencas), tamanho)]
@@ -0,0 +1,172 @@
+import re
+import threading
+import unicodedata
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+
+# Tipos de valor extraídos (código numérico usado na coluna "tipo")
+MONETARIO, PERCENTUAL, DATA = 0, 1, 2
+NOMES_TIPOS = {MONETARIO: "monetario", PERCENTUAL: "percentual", DATA: "data"}
+
+_MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+_NUMERO = r"\d{1,3}(?:\.\d{3})*(?:,\d+)?|\d+(?:,\d+)?"
+_MONETARIO = re.compile(rf"R\$\s*({_NUMERO})(?:\s*(mil|milh[õo]es|milh[ãa]o|bilh[õo]es|bilh[ãa]o))?", re.IGNORECASE)
+_PERCENTUAL = re.compile(rf"({_NUMERO})\s*(?:%|por\s+cento)", re.IGNORECASE)
+_DATA_NUMERICA = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_DATA_EXTENSO = re.compile(r"\b(?:(\d{1,2})[º°o]?\s+de\s+)?(" + "|".join(_MESES) + r"|março)\s+de\s+(\d{4})\b", re.IGNORECASE)
+
+# Núcleos de sintagma que costumam nomear aquilo a que o valor se refere
+_ENTIDADE = re.compile(
+    r"\b(?:tarifas?|taxas?|valor(?:es)?|pre[çc]os?|multas?|reajustes?|prazos?|"
+    r"al[íi]quotas?|descontos?|subs[íi]dios?|custos?|receitas?|encargos?|"
+    r"[íi]ndices?|percentual|limites?|vig[êe]ncia)"
+    # Complemento opcional: "de água", "do esgoto" ou um adjetivo como "tarifário"
+    r"(?:\s+(?:de|do|da|dos|das)\s+[a-zà-ú]{3,}|\s+[a-zà-ú]+(?:[áa]ri[oa]s?|ais|al)\b)?",
+    re.IGNORECASE,
+)
+_ESCALAS = {"mil": 1e3, "milhao": 1e6, "milhoes": 1e6, "bilhao": 1e9, "bilhoes": 1e9}
+_EPOCA = date(1970, 1, 1).toordinal()
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas sem acentos e com espaços simples, para comparar entidades."""
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acento.lower().split())
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace(".", "").replace(",", "."))
+
+
+def _entidade_antes(texto: str, posicao: int) -> str:
+    """Última menção a uma entidade antes do valor, dentro da mesma frase."""
+    inicio_frase = max(texto.rfind(".", 0, posicao), texto.rfind(";", 0, posicao)) + 1
+    candidatos = list(_ENTIDADE.finditer(texto, inicio_frase, posicao))
+    if not candidatos:
+        return ""
+    return normalizar(candidatos[-1].group(0))
+
+
+def extrair_valores(texto: str) -> List[tuple]:
+    """Retorna (tipo, valor, trecho, entidade) para cada valor, percentual ou data do texto."""
+    encontrados = []
+    for m in _MONETARIO.finditer(texto):
+        escala = _ESCALAS.get(normalizar(m.group(2) or ""), 1)
+        encontrados.append((MONETARIO, _numero(m.group(1)) * escala, m.group(0), _entidade_antes(texto, m.start())))
+    for m in _PERCENTUAL.finditer(texto):
+        encontrados.append((PERCENTUAL, _numero(m.group(1)), m.group(0), _entidade_antes(texto, m.start())))
+    for m in _DATA_NUMERICA.finditer(texto):
+        try:
+            dia = date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        except ValueError:
+            continue
+        encontrados.append((DATA, float(dia.toordinal() - _EPOCA), m.group(0), _entidade_antes(texto, m.start())))
+    for m in _DATA_EXTENSO.finditer(texto):
+        mes = _MESES[normalizar(m.group(2))]
+        try:
+            dia = date(int(m.group(3)), mes, int(m.group(1) or 1))
+        except ValueError:
+            continue
+        encontrados.append((DATA, float(dia.toordinal() - _EPOCA), m.group(0), _entidade_antes(texto, m.start())))
+    return encontrados
+
+
+class TabelaValores:
+    """
+    Tabela colunar (arrays NumPy) com os valores extraídos de todos os documentos.
+
+    Colunas: documento e entidade (códigos em vocabulários), tipo, valor (float64;
+    datas em dias desde 1970-01-01), parágrafo e trecho original. As novas linhas
+    ficam em buffer e são consolidadas nos arrays na primeira consulta. A tabela
+    é compartilhada pelas análises concorrentes: registro e consulta usam uma trava.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.documentos: List[str] = []
+        self.entidades: List[str] = []
+        self._codigos_documentos: Dict[str, int] = {}
+        self._codigos_entidades: Dict[str, int] = {}
+        self._pendentes: List[tuple] = []
+        self.col_documento = np.empty(0, dtype=np.int32)
+        self.col_entidade = np.empty(0, dtype=np.int32)
+        self.col_tipo = np.empty(0, dtype=np.int8)
+        self.col_valor = np.empty(0, dtype=np.float64)
+        self.col_paragrafo = np.empty(0, dtype=object)
+        self.col_trecho = np.empty(0, dtype=object)
+
+    def _codigo(self, vocabulario: List[str], codigos: Dict[str, int], chave: str) -> int:
+        if chave not in codigos:
+            codigos[chave] = len(vocabulario)
+            vocabulario.append(chave)
+        return codigos[chave]
+
+    def remover_documento(self, documento: str):
+        """Remove as linhas de um documento (usado ao reprocessar uma nova versão)."""
+        with self._lock:
+            self._consolidar()
+            codigo = self._codigos_documentos.get(documento)
+            if codigo is None:
+                return
+            manter = self.col_documento != codigo
+            for nome in ("col_documento", "col_entidade", "col_tipo", "col_valor", "col_paragrafo", "col_trecho"):
+                setattr(self, nome, getattr(self, nome)[manter])
+
+    def registrar_paragrafos(self, documento: str, paragrafos: List[dict]):
+        """Extrai e adiciona os valores dos parágrafos ({"id", "texto"}) de um documento."""
+        with self._lock:
+            self.remover_documento(documento)
+            cod_doc = self._codigo(self.documentos, self._codigos_documentos, documento)
+            for paragrafo in paragrafos:
+                for tipo, valor, trecho, entidade in extrair_valores(paragrafo["texto"]):
+                    cod_ent = self._codigo(self.entidades, self._codigos_entidades, entidade)
+                    self._pendentes.append((cod_doc, cod_ent, tipo, valor, paragrafo["id"], trecho))
+
+    def _consolidar(self):
+        if not self._pendentes:
+            return
+        docs, ents, tipos, valores, paragrafos, trechos = zip(*self._pendentes)
+        self.col_documento = np.concatenate([self.col_documento, np.array(docs, dtype=np.int32)])
+        self.col_entidade = np.concatenate([self.col_entidade, np.array(ents, dtype=np.int32)])
+        self.col_tipo = np.concatenate([self.col_tipo, np.array(tipos, dtype=np.int8)])
+        self.col_valor = np.concatenate([self.col_valor, np.array(valores, dtype=np.float64)])
+        self.col_paragrafo = np.concatenate([self.col_paragrafo, np.array(paragrafos, dtype=object)])
+        self.col_trecho = np.concatenate([self.col_trecho, np.array(trechos, dtype=object)])
+        self._pendentes = []
+
+    def consultar(self, entidade: str) -> Dict[str, List[dict]]:
+        """
+        Todos os valores cuja entidade contém o termo pesquisado, agrupados por documento.
+        A busca ignora acentos e maiúsculas ("tarifa de agua" encontra "Tarifa de Água").
+        """
+        with self._lock:
+            self._consolidar()
+            termo = normalizar(entidade)
+            codigos = [c for e, c in self._codigos_entidades.items() if termo and termo in e]
+            linhas = np.nonzero(np.isin(self.col_entidade, codigos))[0]
+            # Ordena por documento e, dentro dele, por valor
+            linhas = linhas[np.lexsort((self.col_valor[linhas], self.col_documento[linhas]))]
+
+            por_documento: Dict[str, List[dict]] = {}
+            for i in linhas:
+                tipo = int(self.col_tipo[i])
+                valor = float(self.col_valor[i])
+                if tipo == DATA:
+                    valor = date.fromordinal(int(valor) + _EPOCA).isoformat()
+                por_documento.setdefault(self.documentos[self.col_documento[i]], []).append({
+                    "entidade": self.entidades[self.col_entidade[i]],
+                    "tipo": NOMES_TIPOS[tipo],
+                    "valor": valor,
+                    "trecho": self.col_trecho[i],
+                    "paragrafo": self.col_paragrafo[i],
+                })
+            return por_documento
+
+
+# Tabela compartilhada por todas as ferramentas do processo
+TABELA_VALORES = TabelaValores()
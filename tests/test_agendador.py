@@ -0,0 +1,64 @@
+import asyncio
+
+from agendador import AgendadorAnalises
+from agentes.pool import PoolAgentes
+
+AGENTES = ["Contradicao", "OrtografiaGramatica", "Ambiguidade", "Adm_agentes"]
+
+
+class ContextoFalso:
+    def __init__(self):
+        self.logs = []
+
+    def adicionar_log(self, agente, acao, detalhes=""):
+        self.logs.append((agente, acao, detalhes))
+
+
+async def analise_falsa(documentos, agentes, antes_de_cada_agente):
+    contexto = ContextoFalso()
+    for agente in AGENTES:
+        await antes_de_cada_agente(contexto, agente)
+        await asyncio.sleep(0.01)
+    return contexto
+
+
+async def _enviar_normais_e_urgentes(maximo_pool: int, capacidade: int):
+    pool = PoolAgentes(lambda: [], maximo=maximo_pool)
+    agendador = AgendadorAnalises(analise_falsa, pool, capacidade=capacidade)
+    normais = [agendador.enviar([f"n{i}.pdf"], "normal") for i in range(capacidade)]
+    # Os trabalhos normais começam e ocupam todas as vagas antes dos urgentes chegarem
+    await asyncio.sleep(0.005)
+    urgentes = [agendador.enviar([f"u{i}.pdf"], "urgente") for i in range(capacidade)]
+    await asyncio.wait_for(asyncio.gather(*(t.tarefa for t in normais + urgentes)), timeout=5)
+    return normais, urgentes
+
+
+def test_urgentes_com_pool_do_tamanho_da_capacidade_nao_travam():
+    normais, urgentes = asyncio.run(_enviar_normais_e_urgentes(maximo_pool=4, capacidade=4))
+    assert all(t.status == "concluído" for t in normais + urgentes)
+
+
+def test_urgentes_preemptam_quando_o_pool_tem_conjuntos_sobrando():
+    normais, urgentes = asyncio.run(_enviar_normais_e_urgentes(maximo_pool=8, capacidade=4))
+    assert all(t.status == "concluído" for t in normais + urgentes)
+    assert sum(t.preempcoes for t in normais) > 0
+    assert all(t.preempcoes == 0 for t in urgentes)
+
+
+def test_falha_de_trabalho_nao_aguardado_e_registrada_e_solta_o_contexto(caplog):
+    async def analise_que_falha(documentos, agentes, antes_de_cada_agente):
+        await antes_de_cada_agente(ContextoFalso(), AGENTES[0])
+        raise RuntimeError("documento ilegível")
+
+    async def cenario():
+        agendador = AgendadorAnalises(analise_que_falha, PoolAgentes(lambda: [], maximo=2), capacidade=1)
+        trabalho = agendador.enviar(["r.pdf"])
+        # Como no monitor: ninguém aguarda a tarefa
+        await asyncio.wait([trabalho.tarefa], timeout=5)
+        await asyncio.sleep(0)
+        return trabalho
+
+    trabalho = asyncio.run(cenario())
+    assert trabalho.status == "falhou"
+    assert trabalho.contexto is None
+    assert "documento ilegível" in caplog.text
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from tools import armazem  # noqa: E402
+from tools.armazem import ArmazemParagrafos  # noqa: E402
+
+
+def _analise(prefixo, texto):
+    return {"paragrafos": [{"id": f"{prefixo}-p1", "loc": "Artigo 1", "pag": 1, "texto": texto}]}
+
+
+def test_prefixos_colididos_nao_sobrescrevem_outro_documento(tmp_path, monkeypatch):
+    # Força a colisão dos 6 primeiros dígitos do hash
+    monkeypatch.setattr(armazem, "id_documento", lambda documento: "abc123")
+    loja = ArmazemParagrafos(str(tmp_path))
+    prefixo_a, prefixo_b = loja.prefixo("a.pdf"), loja.prefixo("b.pdf")
+    assert prefixo_a == "abc123" and prefixo_b != prefixo_a
+    loja.gravar("a.pdf", _analise(prefixo_a, "Texto de A"), (1, 10))
+    loja.gravar("b.pdf", _analise(prefixo_b, "Texto de B"), (2, 10))
+
+    assert loja.fatiar("a.pdf")[0]["texto"] == "Texto de A"
+    assert loja.fatiar("b.pdf")[0]["texto"] == "Texto de B"
+    loja.fechar()
+    # A tabela de prefixos é persistida: outro processo encontra os mesmos arquivos
+    assert ArmazemParagrafos(str(tmp_path)).prefixo("b.pdf") == prefixo_b
+
+
+def test_abrir_rejeita_outra_versao_ou_outro_documento(tmp_path):
+    loja = ArmazemParagrafos(str(tmp_path))
+    prefixo = loja.prefixo("a.pdf")
+    loja.gravar("a.pdf", _analise(prefixo, "Texto"), (1, 10))
+
+    assert loja.abrir("a.pdf", (1, 10)) is not None
+    assert loja.abrir("a.pdf", (2, 10)) is None
+    # Arquivos de um prefixo que, na tabela, pertence a outro documento
+    loja.fechar()
+    loja._prefixos["c.pdf"] = prefixo
+    assert loja.abrir("c.pdf") is None
+    loja.fechar()
+
+
+def test_tamanho_texto_sem_contar_localizacoes(tmp_path):
+    loja = ArmazemParagrafos(str(tmp_path))
+    loja.gravar("a.pdf", _analise(loja.prefixo("a.pdf"), "Ação"), (1, 10))
+
+    assert loja.tamanho_texto("a.pdf") == len("Ação".encode("utf-8"))
+    assert loja.tamanho_texto("b.pdf") is None
+    loja.fechar()
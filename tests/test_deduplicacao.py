@@ -0,0 +1,44 @@
+from agentes.deduplicacao import consolidar_achados
+
+
+def _erro(tipo_erro, sugestao, justificativa="Concordância"):
+    # Sem o parágrafo indexado o trecho é o intervalo de caracteres: os dois
+    # achados abaixo citam exatamente o mesmo trecho, como no recorte pelo parágrafo inteiro
+    return {"paragrafo": "abc123-p4", "inicio": 0, "fim": 120, "tipo_erro": tipo_erro,
+            "sugestao_correcao": sugestao, "justificativa": justificativa}
+
+
+def _ortografia(*erros):
+    return {"OrtografiaGramatica": {"ortografia_gramatica": True, "documentos_analisados": ["r.pdf"],
+                                    "total_erros": len(erros), "erros": list(erros)}}
+
+
+def test_repeticao_do_mesmo_achado_e_fundida():
+    dados, relatorio = consolidar_achados(_ortografia(
+        _erro("concordância verbal", "Substituir 'foram aprovado' por 'foram aprovados'."),
+        _erro("concordância verbal", "Substituir 'foram aprovado' por 'foram aprovados'", "Retentativa"),
+    ))
+    erros = dados["OrtografiaGramatica"]["erros"]
+    assert len(erros) == 1
+    assert dados["OrtografiaGramatica"]["total_erros"] == 1
+    assert [o["indice"] for o in erros[0]["origens"]] == [0, 1]
+    assert relatorio["duplicatas_removidas"] == 1
+
+
+def test_erros_diferentes_no_mesmo_trecho_nao_sao_fundidos():
+    dados, relatorio = consolidar_achados(_ortografia(
+        _erro("concordância verbal", "Substituir 'foram aprovado' por 'foram aprovados'."),
+        _erro("ortografia", "Substituir 'excessão' por 'exceção'."),
+    ))
+    erros = dados["OrtografiaGramatica"]["erros"]
+    assert len(erros) == 2
+    assert not any("origens" in erro for erro in erros)
+    assert relatorio["duplicatas_removidas"] == 0
+
+
+def test_mesmo_tipo_com_sugestoes_diferentes_nao_sao_fundidos():
+    dados, _ = consolidar_achados(_ortografia(
+        _erro("ortografia", "Substituir 'excessão' por 'exceção'."),
+        _erro("ortografia", "Substituir 'previlégio' por 'privilégio'."),
+    ))
+    assert dados["OrtografiaGramatica"]["total_erros"] == 2
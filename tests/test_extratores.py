@@ -0,0 +1,14 @@
+from tools.extratores import extrair_html
+
+
+def test_html_separa_as_celulas_das_tabelas(tmp_path):
+    arquivo = tmp_path / "res.html"
+    arquivo.write_text(
+        "<p>Art. 1º Ficam aprovadas as tarifas:</p>"
+        "<table><tr><th>Faixa</th><th>Tarifa</th><th></th></tr>"
+        "<tr><td><p>0 a 10</p><p>m³</p></td><td>R$ 4,50</td></tr>"
+        "<tr><td>11 a 20<td><del>R$ 5,00</del></tr></table>",
+        encoding="utf-8")
+    analise = extrair_html(str(arquivo))
+    assert analise["textos_normais"] == ["Art. 1º Ficam aprovadas as tarifas:", "Faixa|Tarifa", "0 a 10 m³|R$ 4,50"]
+    assert analise["total_paragrafos"] == 4
@@ -0,0 +1,18 @@
+from agentes.hedge import PoliticaHedge
+
+
+def test_limiar_e_calculado_por_modelo():
+    politica = PoliticaHedge(percentil=0.5, min_amostras=2)
+    for segundos in (1.0, 2.0, 3.0):
+        politica.registrar_latencia("gemini-2.5-flash-lite", segundos)
+    politica.registrar_latencia("gemini-2.5-pro", 30.0)
+    assert politica.limiar("gemini-2.5-flash-lite") == 2.0
+    # Sem amostras suficientes do modelo, não há hedge para ele
+    assert politica.limiar("gemini-2.5-pro") is None
+
+
+def test_politica_e_compartilhada_pelas_instancias_do_agente(monkeypatch):
+    monkeypatch.setenv("HEDGE_ATIVO", "1")
+    politica = PoliticaHedge.do_agente("AgenteDeTesteHedge")
+    assert politica is not None
+    assert PoliticaHedge.do_agente("AgenteDeTesteHedge") is politica
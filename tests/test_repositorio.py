@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+# repositorio lê BASE_PATH de tools.ferramentas, que depende de python-docx, NumPy e pdf2docx
+pytest.importorskip("docx")
+pytest.importorskip("numpy")
+pytest.importorskip("pdf2docx")
+
+import repositorio  # noqa: E402
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    (tmp_path / "res.txt").write_text("Art. 1º Fica aprovada a tarifa.", encoding="utf-8")
+    monkeypatch.setattr(repositorio, "BASE_PATH", str(tmp_path))
+    instancia = repositorio.RepositorioResultados(str(tmp_path / "resultados.db"))
+    yield instancia
+    instancia.fechar()
+
+
+def _ortografia(*erros):
+    return {"ortografia_gramatica": bool(erros), "documentos_analisados": ["res.txt"],
+            "total_erros": len(erros), "erros": list(erros)}
+
+
+def test_exportar_json_gera_os_arquivos_da_execucao(repo, tmp_path):
+    execucao = repo.iniciar_execucao(["res.txt"])
+    repo.registrar_log(execucao, {"timestamp": "2026-01-01T10:00:00", "agente": "Sistema",
+                                  "acao": "Verificação Inicial", "detalhes": "1 documento"})
+    repo.registrar_log(execucao, {"timestamp": "2026-01-01T10:00:01", "agente": "OrtografiaGramatica",
+                                  "acao": "análise concluída", "detalhes": "Resultados armazenados"})
+    erro = {"documento": "res.txt", "localizacao": "Artigo 1", "trecho_original": "aprovada",
+            "sugestao_correcao": "aprovado", "tipo_erro": "concordância", "justificativa": "x"}
+    repo.registrar_resultado(execucao, "OrtografiaGramatica", json.dumps(_ortografia(erro)))
+    repo.finalizar_execucao(execucao, "concluido")
+
+    arquivo_logs, arquivo_resultados = tmp_path / "logs.json", tmp_path / "resultados.json"
+    repo.exportar_json(execucao, str(arquivo_logs), str(arquivo_resultados))
+
+    logs = json.loads(arquivo_logs.read_text(encoding="utf-8"))
+    assert [(log["agente"], log["acao"]) for log in logs] == [
+        ("Sistema", "Verificação Inicial"), ("OrtografiaGramatica", "análise concluída")]
+    resultados = json.loads(arquivo_resultados.read_text(encoding="utf-8"))
+    assert resultados == {"OrtografiaGramatica": _ortografia(erro)}
+    assert repo.execucoes("res.txt")[0]["status"] == "concluido"
+
+
+def test_novo_resultado_do_agente_substitui_o_anterior_no_historico(repo, tmp_path):
+    execucao = repo.iniciar_execucao(["res.txt"])
+    erro_1 = {"documento": "res.txt", "trecho_original": "aprovada", "tipo_erro": "concordância"}
+    erro_2 = {"documento": "res.txt", "trecho_original": "tarifa", "tipo_erro": "ortografia"}
+    # Resultado de um lote de frases e, depois, o consolidado do agente
+    repo.registrar_resultado(execucao, "OrtografiaGramatica", _ortografia(erro_1))
+    repo.registrar_resultado(execucao, "OrtografiaGramatica", _ortografia(erro_1, erro_2))
+
+    historico = repo.historico("res.txt", "OrtografiaGramatica")
+    assert [item["achado"]["tipo_erro"] for item in historico] == ["concordância", "ortografia"]
+    assert historico[0]["hash_documento"] == repositorio.hash_arquivo(str(tmp_path / "res.txt"))
+    assert repo.resultados(execucao)["OrtografiaGramatica"]["total_erros"] == 2
+
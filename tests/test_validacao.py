@@ -0,0 +1,30 @@
+import pytest
+
+from agentes.validacao import reparar_json, interpretar_json
+
+
+@pytest.mark.parametrize("texto, esperado, reparos", [
+    ('{"erros": []}', {"erros": []}, []),
+    ('```json\n{"erros": [1, 2,],}\n```', {"erros": [1, 2]}, ["cerca markdown", "vírgula sobrando"]),
+    ('Segue a análise:\n```json\n{"erros": []}', {"erros": []}, ["cerca markdown"]),
+    ('Resultado: {"total": 0} conforme pedido.', {"total": 0}, ["texto antes do JSON", "texto após o JSON"]),
+    ('{"explicacao": "linha\ncrua"}', {"explicacao": "linha\ncrua"}, []),
+])
+def test_reparos_de_formato(texto, esperado, reparos):
+    assert reparar_json(texto) == (esperado, reparos)
+
+
+def test_truncado_descarta_o_item_incompleto_da_lista():
+    texto = '{"total_erros": 2, "erros": [{"paragrafo": "a-p1", "inicio": 0}, {"paragrafo": "a-p2", "ini'
+    obj, reparos = reparar_json(texto)
+    assert obj == {"total_erros": 2, "erros": [{"paragrafo": "a-p1", "inicio": 0}]}
+    assert reparos == ["JSON truncado"]
+
+
+def test_truncado_no_meio_de_uma_string_fecha_a_string():
+    assert reparar_json('{"observacao": "sem ach') == ({"observacao": "sem ach"}, ["JSON truncado"])
+
+
+def test_texto_sem_json_nao_e_reparado():
+    assert reparar_json("Desculpe, não consegui analisar os documentos.") == (None, [])
+    assert interpretar_json("Desculpe, não consegui analisar os documentos.") is None